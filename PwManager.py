@@ -1,97 +1,417 @@
-import os
-import sys
-import json
-from functools import partial
+import time
+
+IMPORT_START = time.perf_counter()
+
+import argparse  # noqa: E402
+import os  # noqa: E402
+import sys  # noqa: E402
+from functools import partial  # noqa: E402
 
-import pandas as pd
 from PyQt5.QtWidgets import (
     QApplication, QMessageBox, QDialog, QLabel, QLineEdit, QVBoxLayout, QHBoxLayout, QPushButton, QFileDialog,
-    QComboBox, QMenu, QAction, QInputDialog, QListWidgetItem, QToolButton, QListWidget
+    QComboBox, QMenu, QAction, QInputDialog, QToolButton, QListWidget, QProgressDialog, QShortcut, QWidget
 )
-from PyQt5.QtGui import QIcon, QCursor
-from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QCursor, QKeySequence
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
 from cryptography.fernet import Fernet
-from ui import PasswordManagerUI
+from crypto_pool import BatchCipher
+from entry_model import ENTRY_NAME_ROLE, VAULT_ROLE
+from live_search import LiveSearch
+from master_key import WrongPassword
+from password_health import HEALTH_CATEGORY
+from profiling import TRACER, StartupProfile, timed
+from save_worker import SaveWorker
+from storage import BACKENDS, CATEGORY_CHANGED, ENTRY_ADDED, ENTRY_CHANGED, ENTRY_REMOVED
+from tasks import BackgroundTask
+from ui import PasswordManagerUI, icon
+from vault_manager import REGISTRY_PATH, VaultManager
+
+EXPORT_FILTERS = "Excel Files (*.xlsx);;CSV Files (*.csv);;JSON Lines (*.jsonl)"
+IMPORT_FILTERS = "支持的文件 (*.csv *.xlsx *.jsonl);;CSV Files (*.csv);;Excel Files (*.xlsx);;JSON Lines (*.jsonl)"
 
 
 class PasswordManagerApp(PasswordManagerUI):
-    def __init__(self):
-        super().__init__()
-
-        self.entries = {}
-        self.categories = {"全部": [],
-                           "未分组": []}
-        self.key = self.load_key()
-        self.cipher = Fernet(self.key)
+    vault_loaded = pyqtSignal()
+    remote_call = pyqtSignal(object)  # 代理进程的推送在读取线程中到达，经此交给 GUI 线程执行
+
+    # 当前保险库的状态（见 vault_manager.Vault），切换保险库时随之切换
+    entries = property(lambda self: self.vault.entries)
+    categories = property(lambda self: self.vault.categories)
+    header = property(lambda self: self.vault.header)
+    key_cache = property(lambda self: self.vault.key_cache)
+    crypto = property(lambda self: self.vault.crypto)
+    storage = property(lambda self: self.vault.storage)
+    save_worker = property(lambda self: self.vault.save_worker)
+
+    def __init__(self, profile=None, backend=None, key_timeout=300, registry=REGISTRY_PATH, idle_timeout=900,
+                 breach_corpus=None, agent=None):
+        self.profile = profile or StartupProfile()
+        with self.profile.phase("ui build"):
+            super().__init__()
+
+        self.vault_ready = False  # 当前保险库已加载并显示
+        # 已登记的保险库，切换过去时才解锁；backend 只作用于默认保险库，省略时按已有的文件自动选择；
+        # agent 不为 None 时第一个保险库通过代理进程（agent.py）访问，多个窗口共用同一个已解锁的保险库
+        self.vaults = VaultManager(registry, backend, key_timeout, idle_timeout, agent)
+        self.vault = next(iter(self.vaults))
+        self.previous_vault = None  # 解锁时取消则回到这个保险库
+        self.search_all = False
+        self.breach_corpus_path = breach_corpus  # 泄露密码库的路径，省略时在第一次检查时选择
+        self.breach_corpus = None  # breach_check.BreachCorpus，第一次检查时打开
+        self.health_task = None
+        self.health_vault = None  # 正在分析的保险库
+        self.health_pending = []  # 分析期间发生的修改，分析完成后补上
         self.name_identifiers = {}
 
-        self.load_entries()
+        # 边输入边搜索：防抖后在后台线程查询，结果由 entry_model 分批加载
+        self.live_search = LiveSearch(self.search_names, parent=self)
+        self.live_search.results_ready.connect(self.show_search_results)
+        self.explicit_search_generation = None
+
+        # 定期清理缓存中过期的明文密码
+        self.cache_timer = QTimer(self)
+        self.cache_timer.timeout.connect(self.purge_caches)
+        self.remote_call.connect(self.run_remote_call)
 
         self.add_account_button.clicked.connect(self.add_account)
+        self.import_button.clicked.connect(self.import_entries)
         self.export_button.clicked.connect(self.export_entries)
         self.search_button.clicked.connect(self.search_entry)
+        self.search_input.returnPressed.connect(self.search_entry)
+        self.search_input.textChanged.connect(self.on_search_text_changed)
         self.add_category_button.clicked.connect(self.add_category)
+        self.change_password_action.triggered.connect(self.change_master_password)
+        self.rotate_key_action.triggered.connect(self.rotate_data_key)
+        self.vault_combo.addItems(self.vaults.names())
+        self.vault_combo.activated[str].connect(self.switch_vault)
+        self.add_vault_action.triggered.connect(self.add_vault)
+        self.remove_vault_action.triggered.connect(self.remove_vault)
+        self.lock_vault_action.triggered.connect(self.lock_vault)
+        self.search_all_checkbox.toggled.connect(self.on_search_all_toggled)
+        self.breach_check_action.triggered.connect(self.check_breaches)
+        self.breach_filter_checkbox.toggled.connect(lambda checked: self.update_all_category())
         self.category_list.itemClicked.connect(self.show_category_entries)
         # self.category_list.setSelectionMode(QListWidget.MultiSelection)  # 设置为多选模式
         # self.category_list.setSortingEnabled(False)  # 禁用自动排序
         self.category_list.setContextMenuPolicy(Qt.CustomContextMenu)
         self.category_list.customContextMenuRequested.connect(self.show_category_menu)
 
-        self.entry_list.itemClicked.connect(self.show_entry_details)
-        # self.entry_list.setSelectionMode(QListWidget.MultiSelection)  # 设置为多选模式
-        # self.entry_list.setSortingEnabled(False)  # 禁用自动排序
-        self.entry_list.itemDoubleClicked.connect(self.edit_entry_dialog)
+        # 行中保存条目名称（ENTRY_NAME_ROLE），不再从显示文本中解析；其他保险库的搜索结果先切换过去
+        self.entry_list.clicked.connect(lambda index: self.open_result(index, self.show_entry_details))
+        self.entry_list.doubleClicked.connect(lambda index: self.open_result(index, self.edit_entry))
         self.entry_list.setContextMenuPolicy(Qt.CustomContextMenu)
         self.entry_list.customContextMenuRequested.connect(self.show_entry_menu)
 
-        self.setWindowIcon(QIcon('ico/icon.ico'))
+        # 隐藏的调试面板：计数器、延迟分布，可开启追踪并保存 trace
+        self.debug_panel = None
+        QShortcut(QKeySequence("Ctrl+Shift+D"), self, self.show_debug_panel)
+
+        # 先显示窗口，事件循环开始后再读取图标、在后台解密保险库
+        self.set_loading(True)
+        QTimer.singleShot(0, self.start_loading)
+
+    def set_loading(self, loading, header="正在加载…"):
+        for widget in (self.add_account_button, self.search_input, self.search_button, self.import_button,
+                       self.export_button, self.add_category_button, self.category_list, self.security_button,
+                       self.search_all_checkbox):
+            widget.setEnabled(not loading)
+        if loading:
+            self.category_list.clear()
+            self.entry_model.set_names([], header=header)
+
+    def ask_master_password(self):
+        # 已有头部时输入主密码解锁，否则设置新的主密码（输入两次）；取消时返回 None
+        if self.header.exists():
+            password, ok = QInputDialog.getText(self, '解锁', '请输入主密码：', QLineEdit.Password)
+            return password if ok else None
+        return self.ask_new_password('设置主密码')
+
+    def ask_new_password(self, title):
+        while True:
+            password, ok = QInputDialog.getText(self, title, '请输入新的主密码：', QLineEdit.Password)
+            if not ok:
+                return None
+            confirm, ok = QInputDialog.getText(self, title, '请再次输入主密码：', QLineEdit.Password)
+            if not ok:
+                return None
+            if password and password == confirm:
+                return password
+            QMessageBox.warning(self, '警告', '两次输入的主密码不一致或为空，请重新输入。')
+
+    def unlock_vault(self, password, vault=None):
+        # 在后台线程执行：派生密钥并读取保险库，返回 Vault
+        return (vault or self.vault).unlock(password, self.profile)
+
+    def confirm_master_password(self, reason):
+        # 导出、修改主密码等操作前确认主密码；派生密钥仍在缓存中时直接通过
+        kek = self.key_cache.get()
+        if kek is not None:
+            return kek
+        password, ok = QInputDialog.getText(self, '确认主密码', f'{reason}，请输入主密码：', QLineEdit.Password)
+        if not ok:
+            return None
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            kek, data_key = self.header.unlock(password)
+        except WrongPassword:
+            QMessageBox.warning(self, '警告', '主密码错误。')
+            return None
+        finally:
+            QApplication.restoreOverrideCursor()
+        self.key_cache.put(kek)
+        return kek
+
+    def change_master_password(self):
+        if self.confirm_master_password('修改主密码') is None:
+            return
+        password = self.ask_new_password('修改主密码')
+        if password is None:
+            return
+        # 只重新加密数据密钥；标定新的派生参数需要几次派生，放到后台执行
+        self.run_key_task('正在修改主密码…', lambda: self.header.create(password, self.crypto.key),
+                          '主密码已修改。')
+
+    def rotate_data_key(self):
+        kek = self.confirm_master_password('更换数据密钥')
+        if kek is None:
+            return
+        new_crypto = BatchCipher(Fernet.generate_key())
+
+        def rotate():
+            # 条目由 storage.rekey 分批解密、用新密钥批量加密
+            self.header.rotate(kek, self.storage, new_crypto)
+            return kek
+
+        self.run_key_task('正在重新加密全部条目…', rotate, '数据密钥已更换。', new_crypto)
+
+    def run_key_task(self, label, func, message, new_crypto=None):
+        # 期间显示模态对话框，不允许修改条目
+        self.key_progress = QProgressDialog(label, '', 0, 0, self)
+        self.key_progress.setCancelButton(None)
+        self.key_progress.setWindowTitle('安全')
+        self.key_progress.setWindowModality(Qt.WindowModal)
+        self.key_progress.setMinimumDuration(0)
+        self.key_task = BackgroundTask(lambda progress, cancelled: func(), self)
+        self.key_task.succeeded.connect(lambda kek: self.on_key_task_finished(kek, message, new_crypto))
+        self.key_task.failed.connect(self.on_key_task_failed)
+        self.key_task.start()
+
+    def on_key_task_finished(self, kek, message, new_crypto):
+        self.key_progress.reset()
+        self.key_cache.put(kek)
+        if new_crypto is not None:
+            old_crypto, self.vault.crypto = self.crypto, new_crypto
+            old_crypto.shutdown()
+        QMessageBox.information(self, '完成', message)
+
+    def on_key_task_failed(self, error):
+        self.key_progress.reset()
+        QMessageBox.critical(self, '错误', f'操作失败：{str(error)}')
+
+    def purge_caches(self):
+        # 定期清理缓存中过期的明文密码和空闲过久的派生密钥，卸载空闲过久的其他保险库
+        self.vault.touch()
+        self.vaults.purge_caches()
+        unloaded = self.vaults.unload_idle(active=self.vault)
+        if unloaded:
+            self.status_label.setText(f"已锁定空闲的保险库：{'、'.join(unloaded)}")
+
+    def save_entries(self):
+        # 日常修改只追加日志，这里把日志合并为完整快照
+        self.storage.compact()
+
+    def start_loading(self):
+        self.load_icons()
+        if self.vault_ready:
+            return
+        vault = self.vault
+        password = None
+        if vault.needs_password():
+            password = self.ask_master_password()
+            if password is None:
+                self.on_unlock_cancelled()
+                return
+        self.entry_model.set_names([], header="正在解锁…")
+        self.load_task = BackgroundTask(lambda progress, cancelled: self.unlock_vault(password, vault), self)
+        self.load_task.succeeded.connect(self.on_vault_read)
+        self.load_task.failed.connect(self.on_unlock_failed)
+        self.load_task.start()
+
+    def on_unlock_cancelled(self):
+        # 切换保险库时取消则回到原来的保险库；一个保险库都没有解锁时退出
+        if self.previous_vault is not None and self.previous_vault.loaded:
+            self.switch_vault(self.previous_vault.name)
+        elif not self.vaults.loaded():
+            self.close()
+        else:
+            self.set_loading(True, "已锁定，在保险库列表中选择以解锁")
 
+    def on_unlock_failed(self, error):
+        if isinstance(error, WrongPassword):
+            QMessageBox.warning(self, '警告', '主密码错误，请重新输入。')
+            self.start_loading()
+        else:
+            QMessageBox.critical(self, '错误', f'读取账户信息时出现错误：{str(error)}')
+
+    def load_entries(self, password):
+        # 同步解锁并加载当前保险库，供脚本和测试使用
+        self.on_vault_read(self.unlock_vault(password))
+
+    def on_vault_read(self, vault):
+        if vault is not self.vault or self.vault_ready:
+            return  # 解锁期间已切换到其他保险库
+        with self.profile.phase("populate"):
+            if vault.save_worker is None:
+                # 之后的修改只改内存，由保存线程合并写入
+                vault.save_worker = SaveWorker(vault.storage, parent=self)
+                vault.save_worker.status_changed.connect(self.on_save_status)
+                vault.save_worker.failed.connect(self.on_save_failed)
+                vault.save_worker.start()
+                vault.storage.on_change = lambda changes, vault=vault: self.on_vault_changed(vault, changes)
+            if vault.remote:
+                vault.dispatch = self.remote_call.emit
+                vault.on_locked = self.on_remote_locked
+            self.show_vault()
+        self.vault_loaded.emit()
+
+    def show_vault(self, show_entries=True):
+        # 显示已加载的当前保险库的分组；show_entries 为 False 时保留列表中的跨保险库搜索结果
+        self.entry_model.set_store(self.entries, self.categories)
+        self.category_list.clear()
+        for category in self.categories.keys():
+            self.category_list.addItem(category)
+        if not self.vault.remote:
+            self.category_list.insertItem(2, HEALTH_CATEGORY)  # 虚拟分组，紧跟在 "全部" 和 "未分组" 之后
+        # 通过代理进程访问时本进程没有密钥
+        for action in (self.change_password_action, self.rotate_key_action, self.breach_check_action):
+            action.setEnabled(not self.vault.remote)
+        self.vault_ready = True
+        self.set_loading(False)
+        self.cache_timer.start(30 * 1000)
+        if self.vault.breached is None:
+            self.breach_filter_checkbox.setChecked(False)
+        self.breach_filter_checkbox.setVisible(self.vault.breached is not None)
         default_category_item = self.category_list.findItems("全部", Qt.MatchExactly)[0]
         self.category_list.setCurrentItem(default_category_item)
-        self.show_category_entries(default_category_item)
+        if show_entries:
+            self.update_all_category()
 
-    def load_key(self):
-        try:
-            with open(r"secret.key", "rb") as key_file:
-                key = key_file.read()
-        except FileNotFoundError:
-            key = Fernet.generate_key()
-            with open(r"secret.key", "wb") as key_file:
-                key_file.write(key)
-        return key
+    def switch_vault(self, name, show_entries=True):
+        vault = self.vaults[name]
+        self.vault_combo.setCurrentText(name)
+        if vault is self.vault and (self.vault_ready or not vault.loaded):
+            self.start_loading()  # 当前保险库已锁定时重新解锁
+            return
+        self.live_search.cancel()
+        self.vault.touch()  # 从现在起开始计算空闲时间
+        self.previous_vault, self.vault = self.vault, vault
+        vault.touch()
+        self.vault_ready = False
+        if vault.loaded:
+            self.show_vault(show_entries)
+        else:
+            self.set_loading(True)
+            self.start_loading()
 
-    def save_entries(self):
-        encrypted_entries = {name: self.cipher.encrypt(json.dumps(info).encode()).decode() for name, info in
-                             self.entries.items()}
-        with open("entries.dat", "w") as f:
-            json.dump(encrypted_entries, f)
-        with open("categories.dat", "w") as f:
-            json.dump(self.categories, f)
-
-    def load_entries(self):
+    def add_vault(self):
+        directory = QFileDialog.getExistingDirectory(self, "选择保险库所在的文件夹")
+        if not directory:
+            return
+        name, ok = QInputDialog.getText(self, '添加保险库', '保险库名称：', QLineEdit.Normal,
+                                        os.path.basename(os.path.normpath(directory)))
+        if not ok:
+            return
         try:
-            with open("entries.dat", "r") as f:
-                encrypted_entries = json.load(f)
-                self.entries = {name: json.loads(self.cipher.decrypt(info.encode()).decode()) for name, info in
-                                encrypted_entries.items()}
-        except FileNotFoundError:
-            pass
+            self.vaults.register(name.strip(), directory)
+        except ValueError as e:
+            QMessageBox.warning(self, '警告', str(e))
+            return
+        self.vault_combo.addItem(name.strip())
+        self.switch_vault(name.strip())
+
+    def remove_vault(self):
+        if len(self.vaults) <= 1:
+            QMessageBox.warning(self, '警告', '至少要保留一个保险库。')
+            return
+        name = self.vault.name
+        reply = QMessageBox.question(self, '移除保险库', f'从列表中移除保险库 "{name}"？文件不会被删除。',
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+        if reply != QMessageBox.Yes:
+            return
         try:
-            with open("categories.dat", "r") as f:
-                self.categories = json.load(f)
-                for category in self.categories.keys():
-                    self.category_list.addItem(category)
-        except FileNotFoundError:
-            self.category_list.addItem("全部")
-            self.category_list.addItem("未分组")
+            self.vaults.unregister(name)
+        except Exception as e:
+            QMessageBox.critical(self, '错误', f'保存账户信息时出现错误：{str(e)}')
+            return
+        self.vault_combo.removeItem(self.vault_combo.findText(name))
+        self.previous_vault = None
+        self.vault_ready = False
+        self.switch_vault(next(iter(self.vaults)).name)
 
-        self.update_all_category()
+    def lock_vault(self):
+        # 卸载当前保险库并丢弃密钥，然后要求重新输入主密码；通过代理进程访问时锁定代理进程中的保险库
+        try:
+            self.vault.lock()
+        except Exception as e:
+            QMessageBox.critical(self, '错误', f'保存账户信息时出现错误：{str(e)}')
+            return
+        self.live_search.cancel()
+        self.vault_ready = False
+        self.previous_vault = None
+        self.set_loading(True, "已锁定")
+        self.start_loading()
+
+    def run_remote_call(self, func):
+        func()
+
+    def on_remote_locked(self, vault):
+        # 代理进程空闲锁定、被其他客户端锁定或退出：与锁定当前保险库相同，但不立即要求输入主密码
+        if vault is not self.vault:
+            return
+        self.live_search.cancel()
+        self.vault_ready = False
+        self.set_loading(True, "代理进程已锁定，在保险库列表中选择以解锁")
 
     def update_all_category(self):
-        self.categories["全部"] = list(self.entries.keys())
-        # print(self.categories["全部"])
+        # "全部" 是虚拟分组，无需重建成员列表
         self.show_category_entries(self.category_list.currentItem())
 
+    def on_vault_changed(self, vault, changes):
+        # 存储的修改通知：分组列表和条目列表只更新受影响的项
+        if vault is not self.vault:
+            return  # 只有当前保险库会在界面上被修改
+        if vault.breached is not None:
+            changes = changes + self.recheck_breaches(vault, changes)
+        self.update_health(vault, changes)
+        for change in changes:
+            if change[0] == CATEGORY_CHANGED:
+                self.on_category_changed(*change[1:])
+        if self.showing_health():
+            self.show_health()  # 一个条目的修改可能改变同组其他条目的问题，按报告重新列出（只含有问题的条目）
+        elif len(changes) > self.entry_model.batch_size:
+            self.update_all_category()  # 导入等大批量修改直接重新显示当前分组
+        else:
+            self.entry_model.apply_changes(changes, vault.name)
+
+    def on_category_changed(self, old, new):
+        if old is None:
+            self.category_list.addItem(new)
+            return
+        item = next(iter(self.category_list.findItems(old, Qt.MatchExactly)), None)
+        if item is None:
+            return
+        if new is not None:
+            item.setText(new)
+            return
+        # 删除分组：其中的条目已移入 "未分组"，正在显示这两个分组之一时改为显示 "未分组"
+        current = self.category_list.currentItem()
+        showing = current is not None and current.text() in (old, "未分组")
+        self.category_list.takeItem(self.category_list.row(item))
+        if showing:
+            ungrouped = self.category_list.findItems("未分组", Qt.MatchExactly)[0]
+            self.category_list.setCurrentItem(ungrouped)
+            self.show_category_entries(ungrouped)
+
     def add_account(self):
         dialog = QDialog(self)
         dialog.setWindowTitle('添加账号')
@@ -132,56 +452,33 @@ class PasswordManagerApp(PasswordManagerUI):
         dialog_layout.addWidget(save_button)
 
         dialog.setLayout(dialog_layout)
+        self.count_widgets(dialog)
         dialog.exec_()
 
     def save_new_entry(self, name, account, password, category, new_category, dialog):
-        name = self.generate_unique_name(name)
-
         if name and account and password:
-            if new_category:
-                category = new_category
-                if category not in self.categories:
-                    self.categories[category] = []
-                    self.category_list.addItem(category)
-            elif not category or category == "全部":
+            if new_category == HEALTH_CATEGORY:
+                QMessageBox.warning(self, '警告', '分组名不能与虚拟分组相同！')
+                return
+            category = new_category or category
+            if not category or category == "全部":
                 category = "未分组"  # 默认归类为未分类
-                if category not in self.categories:
-                    self.categories[category] = []
-                    self.category_list.addItem(category)
 
-            self.entries[name] = (account, password)
-            self.categories[category].append(name)
-            self.update_all_category()
-            self.save_entries()
-
-            # 切换到新条目所属的分组
-            for i in range(self.category_list.count()):
-                item = self.category_list.item(i)
-                if item.text() == category:
-                    if item.text() != "未分组":
-                        self.category_list.setCurrentItem(item)
-                        self.show_category_entries(item)
-                        break
-                    else:
-                        default_category_item = self.category_list.findItems("全部", Qt.MatchExactly)[0]
-                        self.category_list.setCurrentItem(default_category_item)
-                        self.show_category_entries(default_category_item)
+            # 重名时自动加后缀；分组列表和当前显示的条目列表由修改通知更新（见 on_vault_changed）
+            self.vault.add(name, account, password, category)
+
+            # 当前显示的分组不包含新条目时切换到它所属的分组，"未分组" 的条目显示在 "全部" 中
+            current = self.category_list.currentItem()
+            if current is None or current.text() not in ("全部", category):
+                target = "全部" if category == "未分组" else category
+                item = self.category_list.findItems(target, Qt.MatchExactly)[0]
+                self.category_list.setCurrentItem(item)
+                self.show_category_entries(item)
 
             dialog.accept()
         else:
             QMessageBox.warning(self, '警告', '请填写所有字段！')
 
-    def generate_unique_name(self, name):
-        # Generate a unique identifier for the name
-        if name not in self.entries:
-            return name
-
-        index = 1
-        while f"{name}_{index}" in self.entries:
-            index += 1
-
-        return f"{name}_{index}"
-
     def add_category(self):
         dialog = QDialog(self)
         dialog.setWindowTitle('添加分组')
@@ -198,121 +495,325 @@ class PasswordManagerApp(PasswordManagerUI):
         dialog_layout.addWidget(save_button)
 
         dialog.setLayout(dialog_layout)
+        self.count_widgets(dialog)
         dialog.exec_()
 
     def save_new_category(self, category, dialog):
-        if category and category not in self.categories:
-            self.categories[category] = []
-            self.category_list.addItem(category)
-            self.save_entries()
+        if category and category not in self.categories and category != HEALTH_CATEGORY:
+            self.storage.add_category(category)
             dialog.accept()
         else:
             QMessageBox.warning(self, '警告', '请填写分组名，且不能重复！')
 
-    def update_category_list(self):
-        self.category_list.clear()
-        self.category_list.addItem("全部")
-        self.category_list.addItem("未分组")
-        for category in sorted(self.categories.keys()):
-            if category not in ["全部", "未分组"]:
-                self.category_list.addItem(category)
-
     def show_category_entries(self, item):
-        self.entry_list.clear()
         if item is None:
+            self.entry_model.clear()
             return
 
-        self.entry_list.clear()
         selected_category = item.text()
+        if selected_category == HEALTH_CATEGORY:
+            self.show_health()
+            return
+        # 只交给模型名称列表，显示文本在滚动到对应行时才生成
+        with TRACER.span("view.show_category"):
+            names = self.categories[selected_category]
+            breached = self.vault.breached
+            if self.breach_filter_checkbox.isChecked() and breached is not None:
+                # 过滤后的列表只跟随改名和删除，新加入的泄露条目在重新显示分组时出现
+                names = [name for name in names if name in breached]
+                self.entry_model.set_names(names, header="已泄露的密码")
+            else:
+                self.entry_model.set_names(names, category=selected_category)  # 分组成员的键视图，不复制
+
+    def showing_health(self):
+        item = self.category_list.currentItem()
+        return item is not None and item.text() == HEALTH_CATEGORY
 
-        if selected_category == "全部":
-            entries_to_show = list(self.entries.keys())
+    def show_health(self):
+        # 密码健康报告：第一次打开时在后台分析整个保险库，之后随修改只重新计算变化的条目
+        health = self.vault.health
+        if health is None:
+            self.start_health_analysis()
+            return
+        summary = health.summary()
+        header = f"重复使用 {summary['reused']}  弱密码 {summary['weak']}  疑似重复账号 {summary['duplicates']}"
+        self.entry_model.set_names(health.flagged(), header=header, describe=health.issues)
+
+    def start_health_analysis(self):
+        if self.health_task is not None:
+            return
+        from password_health import PasswordHealth
+
+        vault, health = self.vault, PasswordHealth(self.entries)
+        names = list(self.entries)
+        self.health_vault, self.health_pending = vault, []
+        self.health_task = BackgroundTask(
+            lambda progress, cancelled: health.analyze(names, progress, cancelled), self)
+        self.entry_model.set_names([], header="正在分析密码…")
+        self.health_progress = QProgressDialog('正在分析密码…', '取消', 0, len(names), self)
+        self.health_progress.setWindowTitle('密码健康')
+        self.health_progress.setMinimumDuration(300)
+        self.health_progress.canceled.connect(self.health_task.cancel)
+        self.health_task.progress.connect(lambda done, total: self.health_progress.setValue(done))
+        self.health_task.succeeded.connect(lambda health: self.on_health_analyzed(vault, health))
+        self.health_task.failed.connect(self.on_health_failed)
+        self.health_task.start()
+
+    def on_health_analyzed(self, vault, health):
+        self.health_task = self.health_vault = None
+        self.health_progress.reset()
+        pending, self.health_pending = self.health_pending, []
+        if health.entries is not vault.entries:
+            return  # 分析期间保险库已被锁定
+        health.update(pending)
+        vault.health = health
+        if vault is self.vault and self.showing_health():
+            self.show_health()
+
+    def on_health_failed(self, error):
+        from password_health import HealthCancelled
+
+        self.health_task = self.health_vault = None
+        self.health_pending = []
+        self.health_progress.reset()
+        if self.showing_health():
+            self.entry_model.set_names([], header="已取消分析" if isinstance(error, HealthCancelled) else "分析失败")
+        if not isinstance(error, HealthCancelled):
+            QMessageBox.critical(self, '错误', f'分析密码时出现错误：{str(error)}')
+
+    def update_health(self, vault, changes, limit=256):
+        # 只重新计算修改的条目；导入等大批量修改后报告作废，下次打开时重新分析
+        if self.health_task is not None and vault is self.health_vault:
+            self.health_pending.extend(changes)
+        if vault.health is None:
+            return
+        if sum(change[0] != CATEGORY_CHANGED for change in changes) > limit:
+            vault.health = None
+        else:
+            vault.health.update(changes)
+
+    def check_breaches(self):
+        # 在后台线程中打开泄露密码库（第一次打开时建立前缀索引）并检查当前保险库的全部密码
+        path = self.breach_corpus_path
+        if path is None:
+            path, _ = QFileDialog.getOpenFileName(self, "选择泄露密码库（SHA-1，按哈希排序）", "",
+                                                  "Text Files (*.txt);;All Files (*)")
+            if not path:
+                return
+        from breach_check import BreachCorpus, check_entries
+
+        corpus = self.breach_corpus if self.breach_corpus is not None and self.breach_corpus.path == path else None
+        vault, entries = self.vault, self.entries
+        names = list(entries)
+
+        def check(progress, cancelled):
+            opened = corpus or BreachCorpus(path)
+            return opened, check_entries(entries, opened, names, progress, cancelled)
+
+        self.breach_task = BackgroundTask(check, self)
+        self.breach_progress = QProgressDialog('正在检查泄露的密码…', '取消', 0, len(names), self)
+        self.breach_progress.setWindowTitle('检查泄露的密码')
+        self.breach_progress.setWindowModality(Qt.WindowModal)
+        self.breach_progress.setMinimumDuration(300)
+        self.breach_progress.canceled.connect(self.breach_task.cancel)
+        self.breach_task.progress.connect(lambda done, total: self.breach_progress.setValue(done))
+        self.breach_task.succeeded.connect(lambda result: self.on_breach_check_finished(vault, path, *result))
+        self.breach_task.failed.connect(self.on_breach_check_failed)
+        self.breach_task.start()
+
+    def on_breach_check_finished(self, vault, path, corpus, breached):
+        self.breach_progress.reset()
+        if corpus is not self.breach_corpus:
+            if self.breach_corpus is not None:
+                self.breach_corpus.close()
+            self.breach_corpus, self.breach_corpus_path = corpus, path
+        vault.breached = breached
+        if vault is not self.vault or not vault.loaded:
+            return
+        self.breach_filter_checkbox.setVisible(True)
+        if breached:
+            QMessageBox.warning(self, '检查完成', f'有 {len(breached)} 个密码出现在泄露数据中，请尽快修改。')
+            if self.breach_filter_checkbox.isChecked():
+                self.update_all_category()
+            else:
+                self.breach_filter_checkbox.setChecked(True)
         else:
-            entries_to_show = self.categories[selected_category]
+            QMessageBox.information(self, '检查完成', '没有密码出现在泄露数据中。')
+            self.update_all_category()
 
-        for name in entries_to_show:
-            if name in self.entries:
-                account, password = self.entries[name]
-                item = QListWidgetItem(f"{name}  {account}")  # 调整显示格式
-                # item = QListWidgetItem(f"名称：{name}  账号：{account}")  # 调整显示格式
-                self.entry_list.addItem(item)
+    def on_breach_check_failed(self, error):
+        from breach_check import BreachCheckCancelled
+
+        self.breach_progress.reset()
+        if not isinstance(error, BreachCheckCancelled):
+            QMessageBox.critical(self, '错误', f'检查泄露的密码时出现错误：{str(error)}')
+
+    def recheck_breaches(self, vault, changes, limit=256):
+        """
+        修改后更新泄露检查的结果：新增或修改的条目单独检查。过滤列表中不再泄露的条目返回为
+        ENTRY_REMOVED 事件交给模型；大批量修改（导入）不逐条检查，结果作废，需要重新检查。
+        """
+        from breach_check import check_entries
+
+        names = []
+        for change in changes:
+            if change[0] == ENTRY_ADDED:
+                names.append(change[1])
+            elif change[0] == ENTRY_CHANGED:
+                vault.breached.pop(change[3], None)
+                names.append(change[1])
+            elif change[0] == ENTRY_REMOVED:
+                vault.breached.pop(change[1], None)
+        if not names:
+            return []
+        if len(names) > limit or self.breach_corpus is None:
+            vault.breached = None
+            self.breach_filter_checkbox.setChecked(False)
+            self.breach_filter_checkbox.setVisible(False)
+            return []
+        vault.breached.update(check_entries(vault.entries, self.breach_corpus, names))
+        if not self.breach_filter_checkbox.isChecked():
+            return []
+        return [(ENTRY_REMOVED, name, None) for name in names if name not in vault.breached]
 
     def export_entries(self):
-        try:
-            path, _ = QFileDialog.getSaveFileName(self, "导出账户信息", "PassWords.xlsx", "Excel Files (*.xlsx)")
-            if path:
-                # all_data = []
-                data = []
-
-                for category, names in self.categories.items():
-                    for name in names:
-                        account, password = self.entries.get(name, ('', ''))
-                        # if category == "全部":
-                        #     all_data.append((category, name, account, password))
-                        # else:
-                        #     other_data.append((category, name, account, password))
-                        if category != "全部":
-                            data.append((category, name, account, password))
-                            # all_data.append((category, name, account, password))
-
-                with pd.ExcelWriter(path) as writer:
-                    df_all = pd.DataFrame(data, columns=['分组', '名称', '账号', '密码'])
-                    df_all.to_excel(writer, sheet_name='账号列表', index=False)
-
-                    # if all_data:
-                        # df_other = pd.DataFrame(all_data, columns=['分组', '名称', '账号', '密码'])
-                        # df_other.to_excel(writer, sheet_name='全部账号', index=False)
-
-                QMessageBox.information(self, '导出成功', f'账户信息已成功导出到 {path}')
-        except Exception as e:
-            QMessageBox.critical(self, '错误', f'导出过程中出现错误：{str(e)}')
+        path, selected_filter = QFileDialog.getSaveFileName(self, "导出账户信息", "PassWords.xlsx", EXPORT_FILTERS)
+        if not path or self.confirm_master_password('导出的文件包含明文密码') is None:
+            return
+        # 导出相关模块（包括 openpyxl）只在导出时才导入
+        from exporter import EXPORT_FORMATS, export_rows
+
+        if os.path.splitext(path)[1].lower() not in EXPORT_FORMATS:
+            path += next((ext for ext, name in EXPORT_FORMATS.items() if name == selected_filter), ".xlsx")
+
+        # 在后台线程中边解密边写文件，行由生成器逐批产生，不在内存中拼出整张表
+        rows, total = self.vault.export_rows()
+        self.export_task = BackgroundTask(
+            lambda progress, cancelled: export_rows(path, rows, total, progress, cancelled), self)
+
+        self.export_progress = QProgressDialog('正在导出账户信息…', '取消', 0, total, self)
+        self.export_progress.setWindowTitle('导出')
+        self.export_progress.setWindowModality(Qt.WindowModal)
+        self.export_progress.setMinimumDuration(300)
+        self.export_progress.canceled.connect(self.export_task.cancel)
+        self.export_task.progress.connect(lambda done, total: self.export_progress.setValue(done))
+        self.export_task.succeeded.connect(lambda result: self.on_export_finished(path))
+        self.export_task.failed.connect(self.on_export_failed)
+        self.export_task.start()
+
+    def on_export_finished(self, path):
+        self.export_progress.reset()
+        QMessageBox.information(self, '导出成功', f'账户信息已成功导出到 {path}')
+
+    def on_export_failed(self, error):
+        from exporter import ExportCancelled
+
+        self.export_progress.reset()
+        if isinstance(error, ExportCancelled):
+            QMessageBox.information(self, '导出取消', '已取消导出。')
+        else:
+            QMessageBox.critical(self, '错误', f'导出过程中出现错误：{str(error)}')
+
+    def import_entries(self):
+        path, _ = QFileDialog.getOpenFileName(self, "导入账户信息", "", IMPORT_FILTERS)
+        if not path:
+            return
+        # 后台线程解析文件并批量加密密码，完成后在界面线程一次性写入
+        vault = self.vault
+        self.import_task = BackgroundTask(lambda progress, cancelled: vault.read_import(path, progress, cancelled), self)
+
+        self.import_progress = QProgressDialog('正在导入账户信息…', '取消', 0, 0, self)
+        self.import_progress.setWindowTitle('导入')
+        self.import_progress.setWindowModality(Qt.WindowModal)
+        self.import_progress.setMinimumDuration(300)
+        self.import_progress.canceled.connect(self.import_task.cancel)
+        self.import_task.progress.connect(
+            lambda done, total: self.import_progress.setLabelText(f'正在导入账户信息… 已读取 {done} 条'))
+        self.import_task.succeeded.connect(lambda items: self.on_import_read(vault, items))
+        self.import_task.failed.connect(self.on_import_failed)
+        self.import_task.start()
+
+    def on_import_read(self, vault, items):
+        self.import_progress.reset()
+        if not vault.loaded:
+            QMessageBox.warning(self, '警告', '保险库已被锁定，未导入任何数据。')
+            return
+        count = vault.import_items(items)
+        QMessageBox.information(self, '导入成功', f'已导入 {count} 条账户信息')
+
+    def on_import_failed(self, error):
+        from importer import ImportCancelled
+
+        self.import_progress.reset()
+        if isinstance(error, ImportCancelled):
+            QMessageBox.information(self, '导入取消', '已取消导入，未写入任何数据。')
+        else:
+            QMessageBox.critical(self, '错误', f'导入过程中出现错误：{str(error)}')
+
+    @timed("search.query")
+    def search_names(self, query, cancelled):
+        # 在搜索线程中执行，通过 SearchIndex 查询，结果已按相关度排序；
+        # 勾选“全部保险库”时并行搜索所有已解锁的保险库，返回 [(保险库名称, 条目名称)]
+        if self.search_all:
+            return self.vaults.search(query, cancelled=cancelled)
+        return self.entries.index.search(query, cancelled=cancelled)
+
+    def on_search_all_toggled(self, checked):
+        self.search_all = checked
+        query = self.search_input.text().strip()
+        if query:
+            self.live_search.schedule(query)
+
+    def on_search_text_changed(self, text):
+        if text.strip():
+            self.live_search.schedule(text)
+        else:
+            # 清空搜索框时回到当前分组
+            self.live_search.cancel()
+            self.show_category_entries(self.category_list.currentItem())
 
     def search_entry(self):
         query = self.search_input.text().strip()
         if query:
-            found_entries = []
-            for name, (account, password) in self.entries.items():
-                if query.lower() in name.lower() or query.lower() in account.lower():
-                    found_entries.append((name, account, password))
-
-            if found_entries:
-                self.entry_list.clear()
-
-                # 添加不可点击的“查询结果”项目
-                result_item = QListWidgetItem("查询结果")
-                result_item.setFlags(result_item.flags() & ~Qt.ItemIsSelectable & ~Qt.ItemIsEnabled)
-                result_item.setTextAlignment(Qt.AlignCenter)
-                self.entry_list.addItem(result_item)
-
-                for name, account, password in found_entries:
-                    category = self.get_key(name)
-                    item = QListWidgetItem(f"{category}  {name}  {account}")  # 调整显示格式
-                    self.entry_list.addItem(item)
-            else:
-                QMessageBox.warning(self, '未找到', '未找到包含查询字符串的账户信息')
+            # 点击搜索按钮或回车时立即查询，找不到时给出提示
+            self.live_search.search_now(query)
+            self.explicit_search_generation = self.live_search.generation
         else:
             QMessageBox.warning(self, '警告', '请输入查询字符串')
 
+    def show_search_results(self, generation, query, names):
+        if not self.live_search.is_current(generation):
+            return  # 已有更新的查询
+        if not names and generation == self.explicit_search_generation:
+            QMessageBox.warning(self, '未找到', '未找到包含查询字符串的账户信息')
+            return
+
+        # 第一行为不可点击的“查询结果”，结果行随滚动分批加载
+        if names and isinstance(names[0], tuple):
+            self.entry_model.set_names(names, header="查询结果", show_category=True, vaults=self.vaults.vaults)
+        else:
+            self.entry_model.set_names(names, header="查询结果", show_category=True)
+
+    def open_result(self, index, action):
+        # 跨保险库搜索结果中其他保险库的条目：先切换过去（保留结果列表），再显示或编辑
+        vault_name = index.data(VAULT_ROLE)
+        if vault_name is not None and vault_name != self.vault.name:
+            if vault_name not in self.vaults.vaults or not self.vaults[vault_name].loaded:
+                return  # 结果显示之后该保险库已被移除或锁定
+            self.switch_vault(vault_name, show_entries=False)
+        action(index.data(ENTRY_NAME_ROLE))
+
     def copy_to_clipboard(self, text):
         clipboard = QApplication.clipboard()
         clipboard.setText(text)
 
     def get_key(self, value):
-        for dic in self.categories:
-            if value in self.categories[dic] and dic != "全部":
-                return dic
-        return "未分组"
+        return self.categories.category_of(value)
 
-    def show_entry_details(self, item):
+    def show_entry_details(self, name):
         try:
-            if not (item.flags() & Qt.ItemIsSelectable):
-                return
-            # 从 item 中提取名称和账号
-            name_account = item.text().split('  ')  # 根据两个空格分割
-            if len(name_account) == 2:
-                name = name_account[0]
-            elif len(name_account) == 3:
-                name = name_account[1]
+            if name is None:
+                return  # 标题行
 
             category = self.get_key(name)
 
@@ -337,7 +838,7 @@ class PasswordManagerApp(PasswordManagerUI):
                 layouth2.addWidget(password_label)
                 # layoutv.addWidget(password_label)
                 copy_account_button = QToolButton()
-                copy_account_button.setIcon(QIcon('ico/copy.ico'))  # 设置复制图标
+                copy_account_button.setIcon(icon('copy.ico'))  # 设置复制图标
                 copy_account_button.setToolTip('复制账号')
                 copy_account_button.setCursor(QCursor(Qt.PointingHandCursor))
                 copy_account_button.clicked.connect(lambda: self.copy_to_clipboard(account))
@@ -345,7 +846,7 @@ class PasswordManagerApp(PasswordManagerUI):
                 layoutv.addLayout(layouth1)
 
                 copy_password_button = QToolButton()
-                copy_password_button.setIcon(QIcon('ico/copy.ico'))  # 设置复制图标
+                copy_password_button.setIcon(icon('copy.ico'))  # 设置复制图标
                 copy_password_button.setToolTip('复制密码')
                 copy_password_button.setCursor(QCursor(Qt.PointingHandCursor))
                 copy_password_button.clicked.connect(lambda: self.copy_to_clipboard(password))
@@ -366,6 +867,7 @@ class PasswordManagerApp(PasswordManagerUI):
                 container.addLayout(layouth)
 
                 dialog.setLayout(container)
+                self.count_widgets(dialog)
                 dialog.exec_()
             else:
                 QMessageBox.warning(self, '警告', '信息不存在！')
@@ -415,62 +917,37 @@ class PasswordManagerApp(PasswordManagerUI):
         dialog_layout.addWidget(save_button)
 
         dialog.setLayout(dialog_layout)
+        self.count_widgets(dialog)
         dialog.exec_()
 
     def update_entry(self, original_name, name, account, password, category, new_category, dialog):
         if name and account and password:
-            if new_category:
-                category = new_category
-                if category not in self.categories:
-                    self.categories[category] = []
-                    self.category_list.addItem(category)
-            elif not category or category == "全部":
-                category = "未分组"
-                if category not in self.categories:
-                    self.categories[category] = []
-                    self.category_list.addItem(category)
-
-            if original_name != name:
-                del self.entries[original_name]
-                self.remove_entry_from_categories(original_name)
-
-            self.entries[name] = (account, password)
-            old_category = self.get_key(original_name)
-
-            if old_category:
-                self.categories[old_category].remove(original_name)
-
-            self.categories[category].append(name)
-
-            self.update_all_category()
-            self.save_entries()
+            if new_category == HEALTH_CATEGORY:
+                QMessageBox.warning(self, '警告', '分组名不能与虚拟分组相同！')
+                return
+            # 改名时旧条目与分组归属在同一条日志记录里移除；列表中的这一行由修改通知更新
+            self.vault.update(original_name, name, account, password, new_category or category)
 
-            for widget in QApplication.topLevelWidgets():
-                if isinstance(widget, QDialog) and widget != self and widget.windowTitle() != "添加账号" and widget.windowTitle() != "添加分组":
-                    widget.close()
+            # 关闭编辑对话框和打开它的详情对话框
+            details = dialog.parentWidget()
+            dialog.accept()
+            if isinstance(details, QDialog):
+                details.accept()
 
             # 显示更新后的条目详情页
-            # if dialog and dialog.isVisible():
-            item = QListWidgetItem(f"{category}  {name}  {account}")
-            self.show_entry_details(item)
+            self.show_entry_details(name)
 
         else:
             QMessageBox.warning(self, '警告', '请填写所有字段！')
 
-    def remove_entry_from_categories(self, name, category):
-        if category in self.categories and name in self.categories[category]:
-            self.categories[category].remove(name)
-
     def show_entry_menu(self, pos):
-        item = self.entry_list.itemAt(pos)
-        if isinstance(item, QListWidgetItem):
+        name = self.entry_list.indexAt(pos).data(ENTRY_NAME_ROLE)
+        if name is not None:
             menu = QMenu()
-            edit_action = QAction(QIcon(r"ico\edit.ico"), '编辑', self)
-            delete_action = QAction(QIcon(r"ico\delete.ico"), '删除', self)
+            edit_action = QAction(icon("edit.ico"), '编辑', self)
+            delete_action = QAction(icon("delete.ico"), '删除', self)
 
-            name = item.text().split(' ')[0]
-
-            edit_action.triggered.connect(lambda: self.edit_entry(item))
+            edit_action.triggered.connect(lambda: self.edit_entry(name))
             delete_action.triggered.connect(lambda: self.delete_entry(name))
 
             menu.addAction(edit_action)
@@ -478,9 +955,8 @@ class PasswordManagerApp(PasswordManagerUI):
 
             menu.exec_(self.entry_list.mapToGlobal(pos))
 
-    def edit_entry(self, item):
-        if isinstance(item, QListWidgetItem):
-            name = item.text().split(' ')[0]
+    def edit_entry(self, name):
+        if name in self.entries:
             account, password = self.entries[name]
             self.edit_entry_dialog(name, account, password)
 
@@ -493,26 +969,14 @@ class PasswordManagerApp(PasswordManagerUI):
         reply = QMessageBox.question(self, '确认', f'确认删除账号信息 "{name}"？',
                                      QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
         if reply == QMessageBox.Yes:
-            categories_to_update = []
-            for category, entries in self.categories.items():
-                while name in entries:
-                    entries.remove(name)
-                    categories_to_update.append(category)
-
-            for category in categories_to_update:
-                self.remove_entry_from_categories(name, category)
-
-            del self.entries[name]  # 删除条目信息
-
-            self.update_all_category()  # 更新所有分类列表
-            self.save_entries()  # 保存更新后的条目信息
+            self.vault.delete(name)  # 删除条目信息及其分组归属，列表中的这一行由修改通知移除
             if dialog and dialog.isVisible():
                 dialog.accept()
 
     def show_category_menu(self, pos):
         menu = QMenu()
-        rename_action = QAction(QIcon(r"ico\rename.ico"), '重命名', self)
-        delete_action = QAction(QIcon(r"ico\delete.ico"), '删除', self)
+        rename_action = QAction(icon("rename.ico"), '重命名', self)
+        delete_action = QAction(icon("delete.ico"), '删除', self)
 
         rename_action.triggered.connect(self.rename_category)
         delete_action.triggered.connect(self.delete_category)
@@ -528,10 +992,10 @@ class PasswordManagerApp(PasswordManagerUI):
             current_text = current_item.text()
             new_text, ok = QInputDialog.getText(self, '重命名分组', '添加新的分组名:', QLineEdit.Normal, current_text)
             if ok and new_text:
-                if new_text != current_text and new_text not in self.categories:
-                    self.categories[new_text] = self.categories.pop(current_text)
-                    current_item.setText(new_text)
-                    self.save_entries()
+                if current_text in ["全部", "未分组", HEALTH_CATEGORY]:
+                    QMessageBox.warning(self, '警告', '不能重命名默认分组。')
+                elif new_text != current_text and new_text not in self.categories and new_text != HEALTH_CATEGORY:
+                    self.storage.rename_category(current_text, new_text)
                 else:
                     QMessageBox.warning(self, '警告', '分组名不能为空且不能重复！')
 
@@ -545,20 +1009,78 @@ class PasswordManagerApp(PasswordManagerUI):
                                              QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
                 if reply == QMessageBox.Yes:
                     # 将分组下的所有账户信息移动到 "未分组"
-                    for name in self.categories[selected_category]:
-                        self.categories["未分组"].append(name)
-                    del self.categories[selected_category]
-                    self.update_category_list()
-                    self.save_entries()
-                    self.show_category_entries(self.category_list.currentItem())
+                    self.storage.delete_category(selected_category)
             else:
                 QMessageBox.warning(self, '警告', '不能删除默认分组或无效的分组。')
         else:
             QMessageBox.warning(self, '警告', '未选择分组。')
 
+    def count_widgets(self, dialog):
+        if TRACER.enabled:
+            TRACER.count("widgets created", len(dialog.findChildren(QWidget)) + 1)
+
+    def show_debug_panel(self):
+        from debug_panel import DebugPanel
+
+        if self.debug_panel is None:
+            self.debug_panel = DebugPanel(TRACER, self)
+        self.debug_panel.show()
+        self.debug_panel.raise_()
+
+    def on_save_status(self, status):
+        self.status_label.setText({"saving": "正在保存…", "saved": "已保存"}.get(status, status))
+
+    def on_save_failed(self, error):
+        self.status_label.setText("保存失败")
+        QMessageBox.critical(self, '错误', f'保存账户信息时出现错误：{str(error)}\n修改仍保留在内存中，将在下次修改或退出时重试。')
+
+    def closeEvent(self, event):
+        # 退出前等待每个已解锁保险库的保存线程写完，再把失败后留在队列中的修改重试一次
+        for vault in self.vaults.loaded():
+            try:
+                vault.unload()
+            except Exception as e:
+                reply = QMessageBox.question(self, '保存失败', f'保存保险库 "{vault.name}" 时出现错误：{str(e)}\n'
+                                             f'仍然退出吗？未保存的修改将会丢失。',
+                                             QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+                if reply != QMessageBox.Yes:
+                    event.ignore()
+                    return
+                vault.unload(flush=False)
+        self.live_search.shutdown()
+        self.vaults.close()
+        if self.breach_corpus is not None:
+            self.breach_corpus.close()
+        super().closeEvent(event)
+
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
-    ex = PasswordManagerApp()
-    ex.show()
-    sys.exit(app.exec_())
+    # --profile-startup：打印导入、读取密钥、构建界面、解密等阶段的耗时后退出
+    # --backend：指定存储格式（json、sqlite、chunked），其他格式中已有数据时会自动转换
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profile-startup', action='store_true')
+    parser.add_argument('--backend', choices=BACKENDS)
+    parser.add_argument('--trace', metavar='FILE', help='记录热点路径的耗时，退出时写出 Chrome trace（JSON）')
+    parser.add_argument('--key-timeout', type=float, default=300, help='派生密钥空闲多少秒后需要重新输入主密码')
+    parser.add_argument('--vaults', metavar='FILE', default=REGISTRY_PATH, help='已登记的保险库列表')
+    parser.add_argument('--idle-timeout', type=float, default=900, help='非当前的保险库空闲多少秒后自动锁定')
+    parser.add_argument('--breach-corpus', metavar='FILE', help='本地泄露密码库（Have I Been Pwned 格式，按哈希排序）')
+    parser.add_argument('--agent', action='store_true', help='通过代理进程（agent.py）访问第一个保险库')
+    parser.add_argument('--agent-socket', metavar='FILE', help='代理进程的套接字路径，默认按保险库目录确定')
+    args, qt_args = parser.parse_known_args()
+    TRACER.enable(bool(args.trace))
+    profile = StartupProfile(enabled=args.profile_startup, start=IMPORT_START)
+    profile.add("import", time.perf_counter() - IMPORT_START)
+    with profile.phase("qt init"):
+        app = QApplication(sys.argv[:1] + qt_args)
+    ex = PasswordManagerApp(profile, args.backend, args.key_timeout, args.vaults, args.idle_timeout,
+                            args.breach_corpus, args.agent_socket or ('' if args.agent else None))
+    app.aboutToQuit.connect(ex.close)  # 不经过关闭窗口退出时也要写完排队的修改
+    with profile.phase("show"):
+        ex.show()
+    if profile.enabled:
+        ex.vault_loaded.connect(lambda: (profile.report(), app.quit()))
+    status = app.exec_()
+    if args.trace:
+        TRACER.dump(args.trace)
+    sys.exit(status)
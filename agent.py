@@ -0,0 +1,291 @@
+"""
+代理进程：解锁一次保险库并常驻内存，通过只允许本用户访问的 Unix 域套接字回答请求，
+脚本（cli.py --agent）和多个图形界面窗口（PwManager.py --agent）共用同一个已解锁的保险库。
+
+    python agent.py --dir ~/vault                  # 启动时输入主密码；--locked 则等第一个客户端解锁
+    python cli.py --dir ~/vault --agent get mail
+    python PwManager.py --agent
+
+协议为每行一个 JSON：请求 {"id": 1, "cmd": "get", "name": "mail"}，命令与 cli.py 的子命令相同，另有
+status / unlock / lock / watch 等（见 AGENT_COMMANDS）；结果 {"id": 1, "ok": true, "result": ...}。
+修改产生的事件（storage.ENTRY_ADDED 等）按序号推送给 watch 的连接，客户端（agent_client.AgentVault）
+据此更新本地的名称和分组副本。
+空闲超过 --idle-lock 秒后卸载保险库并丢弃密钥，之后的请求返回 code 为 "locked" 的错误，需要重新 unlock。
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import struct
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from agent_client import AgentError, default_socket_path, encode
+from cli import COMMANDS, CommandError, add_vault_arguments, execute, find_vault, master_password
+from master_key import WrongPassword
+from storage import ENTRY_ADDED, ENTRY_CHANGED
+
+IDLE_LOCK = 900
+LINE_LIMIT = 16 * 1024 * 1024  # 一行请求的上限，导入的路径等都很短
+EXPORT_BATCH = 1024  # export_rows 每次回复的行数，一次回复中的明文最多这么多行
+EXPORT_CURSORS = 8  # 同时进行的导出上限，客户端中途断开留下的游标超出时丢弃最早的
+
+
+def prepare_socket_path(path, private=True):
+    # private 为 True 时套接字所在目录必须只属于本用户（默认路径）；已有代理进程在监听时不覆盖
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    stat = os.stat(directory)
+    if private and (stat.st_uid != os.getuid() or stat.st_mode & 0o077):
+        raise AgentError(f"套接字目录不是只属于当前用户：{directory}")
+    if os.path.exists(path):
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except OSError:
+            os.unlink(path)  # 上次异常退出留下的套接字
+        else:
+            raise AgentError(f"已有代理进程在监听：{path}")
+        finally:
+            probe.close()
+
+
+def peer_allowed(sock):
+    # Linux 上核对对端进程的用户；其他平台只依赖套接字文件的权限（0600）
+    if sock is None or not hasattr(socket, "SO_PEERCRED"):
+        return True
+    pid, uid, gid = struct.unpack("3i", sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")))
+    return uid == os.getuid()
+
+
+def cmd_snapshot(vault):
+    # 本地副本需要的名称、账号和分组，不含密码
+    return {"accounts": vault.entries.iter_accounts(), "categories": vault.categories.to_json()}
+
+
+AGENT_COMMANDS = {
+    **COMMANDS,
+    "snapshot": cmd_snapshot,
+    "add_category": lambda vault, category: vault.storage.add_category(category),
+    "rename_category": lambda vault, old, new: vault.storage.rename_category(old, new),
+    "delete_category": lambda vault, category: vault.storage.delete_category(category),
+    "compact": lambda vault: vault.storage.compact(),
+}
+
+
+class AgentServer:
+    """
+    在一个 asyncio 事件循环中服务任意多个连接；保险库不是线程安全的，所有操作排队在同一个工作线程中执行，
+    一个慢请求（导出等）不会阻塞其他连接的读写。每次提交的修改编一个序号，连同新账号推送给所有 watch 的连接，
+    也随结果返回给发起的客户端，客户端按序号顺序应用。
+    """
+
+    def __init__(self, vault, socket_path, idle_lock=IDLE_LOCK):
+        self.vault = vault
+        self.socket_path = socket_path
+        self.idle_lock = idle_lock
+        self.last_used = time.monotonic()
+        self.seq = 0  # 最近一次修改的序号
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="agent-vault")
+        self._watchers = set()
+        self._changes = []  # 当前请求产生的事件，由 storage.on_change 收集
+        self._exports = {}  # 导出游标 -> 逐批解密的行，只在保险库线程中使用
+        self._next_export = 0
+        if vault.loaded:
+            vault.storage.on_change = self._changes.extend
+
+    def _unlock(self, password):
+        if not self.vault.loaded:
+            self.vault.unlock(password)
+            self.vault.storage.on_change = self._changes.extend
+        self.last_used = time.monotonic()
+        return True
+
+    def _execute(self, cmd, params):
+        # 在保险库线程中执行，返回 (结果, 要推送的消息)
+        vault = self.vault
+        if cmd == "status":
+            return {"unlocked": vault.loaded, "name": vault.name, "directory": os.path.abspath(vault.directory),
+                    "entries": len(vault.entries), "seq": self.seq}, None
+        if cmd == "unlock":
+            return self._unlock(**params), None
+        if not vault.loaded:
+            raise AgentError("代理进程已锁定", "locked")
+        self.last_used = time.monotonic()
+        if cmd == "lock":
+            self._exports.clear()
+            vault.unload()
+            return True, {"locked": True}
+        if cmd == "watch":
+            return {**cmd_snapshot(vault), "seq": self.seq}, None
+        if cmd == "export_rows":
+            return self._export_rows(**params), None
+        del self._changes[:]
+        try:
+            result = execute(vault, cmd, params) if cmd in COMMANDS else self._agent_command(cmd, params)
+        finally:
+            changes, self._changes[:] = list(self._changes), []
+        if not changes:
+            return result, None
+        self.seq += 1
+        # 新增和修改的条目附上账号，客户端的副本不必再逐个查询
+        names = [change[1] for change in changes if change[0] in (ENTRY_ADDED, ENTRY_CHANGED)]
+        accounts = {name: vault.entries.account(name) for name in names if name in vault.entries}
+        return result, {"seq": self.seq, "changes": changes, "accounts": accounts}
+
+    def _export_rows(self, cursor=None):
+        # 不带 cursor 时开始一次导出；每次回复最多 EXPORT_BATCH 行，done 为 True 时游标失效
+        if cursor is None:
+            rows, total = self.vault.export_rows()
+            self._next_export += 1
+            cursor = self._next_export
+            self._exports[cursor] = rows
+            while len(self._exports) > EXPORT_CURSORS:
+                del self._exports[next(iter(self._exports))]
+        rows = self._exports.get(cursor)
+        if rows is None:
+            raise AgentError("导出已失效，请重新开始", "export_expired")
+        batch = [list(row) for row in islice(rows, EXPORT_BATCH)]
+        done = len(batch) < EXPORT_BATCH
+        if done:
+            del self._exports[cursor]
+        return {"cursor": cursor, "rows": batch, "done": done}
+
+    def _agent_command(self, cmd, params):
+        command = AGENT_COMMANDS.get(cmd)
+        if command is None:
+            raise CommandError(f"未知的命令：{cmd}")
+        return command(self.vault, **params)
+
+    def _lock_if_idle(self):
+        if self.vault.loaded and time.monotonic() - self.last_used >= self.idle_lock:
+            self._exports.clear()
+            self.vault.unload()
+            return True
+        self.vault.purge_caches()
+        return False
+
+    def _broadcast(self, message):
+        data = encode(message)
+        for writer in list(self._watchers):
+            if writer.is_closing():
+                self._watchers.discard(writer)
+            else:
+                writer.write(data)
+
+    async def respond(self, line, writer):
+        request_id = cmd = None
+        try:
+            request = json.loads(line)
+            request_id = request.pop("id", None)
+            cmd = request.pop("cmd", None)
+            if cmd == "watch":
+                # 先登记再取快照：之后的修改一定会推送到，快照之前的由客户端按序号跳过
+                self._watchers.add(writer)
+            loop = asyncio.get_running_loop()
+            result, message = await loop.run_in_executor(self._executor, self._execute, cmd, request)
+        except WrongPassword:
+            response = {"ok": False, "error": "主密码错误", "code": "wrong_password"}
+        except AgentError as e:
+            response = {"ok": False, "error": str(e), "code": e.code}
+        except (CommandError, ValueError, TypeError, KeyError, OSError) as e:
+            response = {"ok": False, "error": str(e)}
+        except Exception as e:
+            # 其他意外错误也只让这一个请求失败，连接和其他请求照常处理
+            print(f"处理请求 {cmd!r} 时出错：{e!r}", file=sys.stderr)
+            response = {"ok": False, "error": f"代理内部错误：{type(e).__name__}: {e}", "code": "internal"}
+        else:
+            response = {"ok": True, "result": result}
+            if message is not None:
+                self._broadcast(message)
+                if "seq" in message:
+                    response["seq"] = message["seq"]
+        if not response["ok"]:
+            self._watchers.discard(writer)  # watch 失败（已锁定）时不推送
+        if request_id is not None:
+            response["id"] = request_id
+        return response
+
+    async def handle(self, reader, writer):
+        if not peer_allowed(writer.get_extra_info("socket")):
+            writer.close()
+            return
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                writer.write(encode(await self.respond(line, writer)))
+                await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            self._watchers.discard(writer)
+            writer.close()
+
+    async def lock_when_idle(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(min(self.idle_lock, 30))
+            if await loop.run_in_executor(self._executor, self._lock_if_idle):
+                self._broadcast({"locked": True})
+
+    async def serve(self, private=True):
+        prepare_socket_path(self.socket_path, private)
+        previous = os.umask(0o177)  # 套接字文件从创建起就只有本用户可读写
+        try:
+            server = await asyncio.start_unix_server(self.handle, path=self.socket_path, limit=LINE_LIMIT)
+        finally:
+            os.umask(previous)
+        os.chmod(self.socket_path, 0o600)
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        idle = asyncio.ensure_future(self.lock_when_idle())
+        try:
+            await stop.wait()
+        finally:
+            idle.cancel()
+            server.close()
+            await server.wait_closed()
+            try:
+                os.unlink(self.socket_path)
+            except FileNotFoundError:
+                pass
+            await loop.run_in_executor(self._executor, self.vault.unload)
+            self._executor.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="pwmanager-agent", description="PwManager 代理进程")
+    add_vault_arguments(parser)
+    parser.add_argument("--socket", help="Unix 域套接字的路径，默认按保险库目录放在本用户的运行时目录中")
+    parser.add_argument("--idle-lock", type=float, default=IDLE_LOCK, help="空闲多少秒后锁定并丢弃密钥")
+    parser.add_argument("--locked", action="store_true", help="启动时不解锁，由第一个客户端用主密码解锁")
+    args = parser.parse_args(argv)
+    try:
+        vault = find_vault(args)
+        if not args.locked:
+            vault.unlock(master_password(args))
+    except WrongPassword:
+        print("主密码错误", file=sys.stderr)
+        return 3
+    except (CommandError, OSError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    server = AgentServer(vault, args.socket or default_socket_path(vault.directory), args.idle_lock)
+    try:
+        asyncio.run(server.serve(private=args.socket is None))
+    except AgentError as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,363 @@
+import hashlib
+import json
+import os
+import queue
+import socket
+import tempfile
+import threading
+
+from categories import CategoryStore
+from master_key import WrongPassword
+from storage import CATEGORY_CHANGED, ENTRY_ADDED, ENTRY_CHANGED, ENTRY_REMOVED
+from vault_manager import Vault
+
+
+class AgentError(Exception):
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code  # "locked"：代理进程已锁定，需要先 unlock
+
+
+def default_socket_path(directory="."):
+    # 每个保险库目录一个套接字，放在本用户的运行时目录中
+    base = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    digest = hashlib.sha1(os.path.abspath(directory).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(base, f"pwmanager-{os.getuid()}", f"agent-{digest}.sock")
+
+
+def encode(message):
+    return (json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+class AgentClient:
+    """
+    同步客户端，可在多个线程中共用（请求依次发送）。request 返回结果，call 返回完整的回复（含修改的序号）；
+    watch 另开一个连接，在后台线程中把推送的消息交给回调，返回当时的快照。
+    """
+
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self._lock = threading.Lock()
+        self._sock = None
+        self._file = None
+        self._next_id = 0
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+        except OSError as e:
+            sock.close()
+            raise AgentError(f"无法连接代理进程（{self.socket_path}）：{e}")
+        return sock
+
+    def call(self, cmd, **params):
+        with self._lock:
+            if self._sock is None:
+                self._sock = self._connect()
+                self._file = self._sock.makefile("rb")
+            self._next_id += 1
+            try:
+                self._sock.sendall(encode({"id": self._next_id, "cmd": cmd, **params}))
+                line = self._file.readline()
+            except OSError as e:
+                self._close()
+                raise AgentError(f"与代理进程的连接中断：{e}")
+            if not line:
+                self._close()
+                raise AgentError("代理进程已断开连接")
+        return check(json.loads(line))
+
+    def request(self, cmd, **params):
+        return self.call(cmd, **params)["result"]
+
+    def watch(self, callback):
+        # 返回 (快照, 关闭连接的函数)；连接断开时回调收到 {"disconnected": True}
+        sock = self._connect()
+        reader = sock.makefile("rb")
+        sock.sendall(encode({"id": 0, "cmd": "watch"}))
+        while True:
+            message = json.loads(reader.readline() or b'{"disconnected": true}')
+            if message.get("id") == 0 or message.get("disconnected"):
+                break
+            callback(message)  # 快照之前登记后就可能收到推送
+        try:
+            snapshot = check(message)["result"]
+        except AgentError:
+            sock.close()
+            raise
+
+        def read():
+            try:
+                for line in reader:
+                    callback(json.loads(line))
+            except (OSError, ValueError):
+                pass
+            callback({"disconnected": True})
+
+        threading.Thread(target=read, name="agent-watch", daemon=True).start()
+
+        def close():
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+
+        return snapshot, close
+
+    def _close(self):
+        if self._sock is not None:
+            self._file.close()
+            self._sock.close()
+            self._sock = self._file = None
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+
+def check(response):
+    if response.get("disconnected"):
+        raise AgentError("代理进程已断开连接")
+    if not response["ok"]:
+        if response.get("code") == "wrong_password":
+            raise WrongPassword()
+        raise AgentError(response["error"], response.get("code"))
+    return response
+
+
+class RemoteEntries:
+    """代理进程中条目的本地副本：名称和账号，密码在读取时向代理进程请求，不缓存"""
+
+    def __init__(self, vault, accounts):
+        self._vault = vault
+        self._accounts = dict(accounts)
+
+    def __contains__(self, name):
+        return name in self._accounts
+
+    def __iter__(self):
+        return iter(list(self._accounts))
+
+    def __len__(self):
+        return len(self._accounts)
+
+    def __getitem__(self, name):
+        if name not in self._accounts:
+            raise KeyError(name)
+        info = self._vault.client.request("get", name=name)
+        return info["account"], info["password"]
+
+    def account(self, name):
+        return self._accounts[name]
+
+    def iter_accounts(self):
+        return list(self._accounts.items())
+
+    @property
+    def index(self):
+        return self  # 与 SearchIndex 的 search 接口相同，由代理进程的索引查询
+
+    def search(self, query, limit=None, cancelled=None):
+        return [item["name"] for item in self._vault.client.request("search", query=query, limit=limit)]
+
+
+class AgentStorage:
+    """代替存储后端交给界面：修改转发给代理进程，由代理进程写入，本地没有待写的队列"""
+
+    def __init__(self, vault, close):
+        self.vault = vault
+        self.on_dirty = None
+        self.on_change = None
+        self._close = close
+
+    def add_category(self, category):
+        self.vault.call("add_category", category=category)
+
+    def rename_category(self, old, new):
+        self.vault.call("rename_category", old=old, new=new)
+
+    def delete_category(self, category):
+        self.vault.call("delete_category", category=category)
+
+    def compact(self):
+        self.vault.call("compact")
+
+    def has_pending(self):
+        return False
+
+    def flush(self):
+        return 0
+
+    def close(self):
+        self._close()
+
+
+class AgentVault(Vault):
+    """
+    通过代理进程访问的保险库：本地只保留条目名称、账号和分组的副本，密码在需要时向代理进程请求。
+    修改由代理进程执行；所有修改（包括其他客户端的）按序号顺序应用到副本，再像本地存储一样通过 storage.on_change 通知。
+    推送在读取线程中到达，由 dispatch 交给使用副本的线程（界面设为 GUI 线程），本客户端的修改在返回前同步应用。
+    密钥只在代理进程中，需要密钥的功能（密码健康、泄露检查、修改主密码、更换数据密钥）不可用。
+    """
+    remote = True
+
+    def __init__(self, name, directory=".", socket_path=None, key_timeout=300):
+        super().__init__(name, directory, None, key_timeout)
+        self.client = AgentClient(socket_path or default_socket_path(directory))
+        self.dispatch = lambda func: func()
+        self.on_locked = None  # 代理进程锁定或退出后在 dispatch 的线程中调用 on_locked(vault)
+        self._inbox = queue.Queue()
+        self._held = {}  # 序号 -> 还不能应用的消息
+        self._seq = 0  # 副本已应用到的序号
+        self._apply_lock = threading.RLock()
+        self._session = 0
+
+    def needs_password(self):
+        try:
+            return not self.client.request("status")["unlocked"]
+        except AgentError:
+            return True
+
+    def unlock(self, password=None, profile=None):
+        # 可在后台线程执行：代理进程已解锁时 password 可以为 None
+        if password is not None and self.needs_password():
+            self.client.request("unlock", password=password)
+        self._session += 1
+        session = self._session
+        self._inbox = queue.Queue()
+        snapshot, close = self.client.watch(lambda message: self._receive(session, message))
+        self._held, self._seq = {}, snapshot["seq"]
+        self.entries = RemoteEntries(self, snapshot["accounts"])
+        self.categories = CategoryStore.from_json(snapshot["categories"])
+        self.storage = AgentStorage(self, close)
+        self._drain()  # 取快照期间到达的推送
+        self.touch()
+        return self
+
+    def _receive(self, session, message):
+        # 读取线程：消息先排队，按序号在 dispatch 的线程中应用
+        if session != self._session:
+            return
+        self._inbox.put(message)
+        self.dispatch(self._drain)
+
+    def _drain(self, until=None):
+        # 应用已到达的消息；until 为本客户端某次修改的序号时等到它应用完为止
+        with self._apply_lock:
+            if self.storage is None:
+                return  # 还在取快照，消息留到副本建立之后
+            while True:
+                try:
+                    message = self._inbox.get(block=until is not None and self._seq < until, timeout=5)
+                except queue.Empty:
+                    if until is not None and self._seq < until:
+                        raise AgentError("等待代理进程推送修改超时")
+                    return
+                if message.get("locked") or message.get("disconnected"):
+                    self._locked()
+                    return
+                if "seq" in message and message["seq"] > self._seq:
+                    self._held[message["seq"]] = message
+                while self._seq + 1 in self._held:
+                    self._seq += 1
+                    self._apply(self._held.pop(self._seq))
+
+    def _apply(self, message):
+        changes = [tuple(change) for change in message["changes"]]
+        accounts = self.entries._accounts
+        for change in changes:
+            kind = change[0]
+            if kind in (ENTRY_ADDED, ENTRY_CHANGED):
+                name, category = change[1:3]
+                old_name = change[3] if kind == ENTRY_CHANGED else name
+                if old_name != name:
+                    accounts.pop(old_name, None)
+                    self.categories.remove(old_name)
+                accounts[name] = message["accounts"].get(name, "")
+                self.categories.assign(name, category)
+            elif kind == ENTRY_REMOVED:
+                accounts.pop(change[1], None)
+                self.categories.remove(change[1])
+            elif kind == CATEGORY_CHANGED:
+                old, new = change[1:]
+                if old is None:
+                    self.categories.add_category(new)
+                elif new is None:
+                    self.categories.delete_category(old)
+                else:
+                    self.categories.rename_category(old, new)
+        if self.storage.on_change is not None:
+            self.storage.on_change(changes)
+
+    def _locked(self):
+        if self.storage is None:
+            return
+        self.unload()
+        if self.on_locked is not None:
+            self.on_locked(self)
+
+    def call(self, cmd, **params):
+        response = self.client.call(cmd, **params)
+        if "seq" in response:
+            self._drain(response["seq"])
+        return response["result"]
+
+    def get(self, name):
+        info = self.client.request("get", name=name)
+        return info["account"], info["password"], info["category"]
+
+    def search(self, query, limit=None, cancelled=None):
+        return self.entries.search(query, limit, cancelled)
+
+    def add(self, name, account, password, category=None):
+        return self.call("add", name=name, account=account, password=password, category=category)
+
+    def update(self, original_name, name, account, password, category=None):
+        self.call("update", name=original_name, new_name=name, account=account, password=password,
+                  category=category)
+
+    def delete(self, name):
+        self.call("delete", name=name)
+
+    def read_import(self, path, progress=None, cancelled=None):
+        # 代理进程读取文件并写入；返回的回复交给 import_items 在使用副本的线程中同步修改
+        return self.client.call("import", path=os.path.abspath(path))
+
+    def import_items(self, response):
+        self._drain(response.get("seq"))
+        return response["result"]
+
+    def export_rows(self):
+        def rows():
+            # 代理进程每次只回复一批明文，按游标逐批取回
+            reply = self.client.request("export_rows")
+            while True:
+                for row in reply["rows"]:
+                    yield tuple(row)
+                if reply["done"]:
+                    return
+                reply = self.client.request("export_rows", cursor=reply["cursor"])
+
+        return rows(), len(self.entries)
+
+    def export(self, path, progress=None, cancelled=None):
+        return self.client.request("export", path=os.path.abspath(path))
+
+    def purge_caches(self):
+        self.key_cache.purge_expired()
+
+    def lock(self):
+        # 锁定代理进程中的保险库，连接的其他客户端也一起锁定
+        try:
+            self.client.request("lock")
+        except AgentError:
+            pass  # 代理进程已退出或已锁定
+        self.unload()
+
+    def unload(self, flush=True):
+        # 只断开本客户端，代理进程中的保险库保持解锁
+        self._session += 1
+        super().unload(flush)
+        self.client.close()
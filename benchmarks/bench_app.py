@@ -0,0 +1,187 @@
+"""
+PasswordManagerApp 主要操作的基准测试，无需显示器（自动使用 offscreen 平台）。
+
+    python benchmarks/bench_app.py                                  # 1k / 10k / 100k 条，JSON 后端
+    python benchmarks/bench_app.py --sizes 1000 1000000 --backend sqlite --json result.json
+    python benchmarks/bench_app.py --compare old.json new.json      # 对比两次结果
+
+每个规模先用 synth_vault 生成保险库，再通过真实的界面方法计时：
+load_entries / save_entries、search_entry、show_category_entries、get_key、export_entries，
+以及 save_new_entry / update_entry / delete_entry（另计保存线程写盘的 flush 时间）。
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PyQt5.QtCore import QEventLoop, QTimer  # noqa: E402
+from PyQt5.QtWidgets import QApplication, QDialog, QFileDialog, QMessageBox  # noqa: E402
+
+from storage import BACKENDS  # noqa: E402
+from synth_vault import DEFAULT_PASSWORD, generate  # noqa: E402
+
+QUERIES = ["mail", "bank-00", "0012345", "example.org", "zzzz"]
+
+
+def silence_dialogs():
+    # 基准测试中不弹出任何对话框：确认一律为“是”，提示直接忽略
+    QMessageBox.question = staticmethod(lambda *args, **kwargs: QMessageBox.Yes)
+    QMessageBox.information = staticmethod(lambda *args, **kwargs: QMessageBox.Ok)
+    QMessageBox.warning = staticmethod(lambda *args, **kwargs: QMessageBox.Ok)
+    QDialog.exec_ = lambda self: QDialog.Rejected
+
+
+def run_and_wait(func, signal, timeout=600):
+    # 先连接再调用 func：信号可能在后台线程中很快发出，晚连接会错过
+    loop = QEventLoop()
+    signal.connect(loop.quit)
+    QTimer.singleShot(int(timeout * 1000), loop.quit)
+    func()
+    loop.exec_()
+    signal.disconnect(loop.quit)
+
+
+class Recorder:
+    def __init__(self, size, backend):
+        self.size = size
+        self.backend = backend
+        self.results = []
+
+    def add(self, op, seconds, count=1):
+        self.results.append({"entries": self.size, "backend": self.backend, "op": op, "count": count,
+                             "seconds": round(seconds, 6), "per_op_us": round(seconds / count * 1e6, 2)})
+        print(f"{self.size:>9} {self.backend:<6} {op:<24} {seconds:10.4f}s  {seconds / count * 1e6:12.1f}us/op",
+              flush=True)
+
+    def time(self, op, func, count=1):
+        start = time.perf_counter()
+        result = func()
+        self.add(op, time.perf_counter() - start, count)
+        return result
+
+
+def bench_size(app, size, backend, categories, ops, workdir):
+    import PwManager
+
+    directory = os.path.join(workdir, f"{backend}-{size}")
+    start = time.perf_counter()
+    generate(directory, size, categories, backend)
+    print(f"generated {size} entries in {time.perf_counter() - start:.2f}s", flush=True)
+
+    recorder = Recorder(size, backend)
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        window = PwManager.PasswordManagerApp(backend=backend)
+        recorder.time("load_entries", lambda: window.load_entries(DEFAULT_PASSWORD))
+        recorder.time("save_entries", window.save_entries)
+
+        names = list(window.entries)
+        rng = random.Random(0)
+        sample = [rng.choice(names) for _ in range(ops)]
+
+        # 第一次搜索包含建立搜索索引的时间，单独记录
+        for index, query in enumerate(QUERIES):
+            window.search_input.setText(query)
+            start = time.perf_counter()
+            run_and_wait(window.search_entry, window.live_search.results_ready)
+            app.processEvents()
+            recorder.add("search_entry" + (" (first)" if index == 0 else f" {query!r}"), time.perf_counter() - start)
+
+        items = [window.category_list.item(i) for i in range(window.category_list.count())]
+        recorder.time("show_category_entries", lambda: [window.show_category_entries(item) for item in items],
+                      len(items))
+        recorder.time("get_key", lambda: [window.get_key(name) for name in sample], len(sample))
+
+        path = os.path.join(directory, "export.csv")
+        QFileDialog.getSaveFileName = staticmethod(lambda *args, **kwargs: (path, ""))
+        start = time.perf_counter()
+        window.export_entries()
+        window.export_task.wait()
+        app.processEvents()
+        recorder.add("export_entries (csv)", time.perf_counter() - start, size)
+
+        dialog = QDialog()
+        category = items[-1].text()
+        recorder.time("save_new_entry", lambda: [
+            window.save_new_entry(f"bench-new-{i}", "user", "password", category, "", dialog) for i in range(ops)], ops)
+        recorder.time("update_entry", lambda: [
+            window.update_entry(f"bench-new-{i}", f"bench-edit-{i}", "user2", "password2", category, "", dialog)
+            for i in range(ops)], ops)
+        recorder.time("delete_entry", lambda: [window.delete_entry(f"bench-edit-{i}") for i in range(ops)], ops)
+        recorder.time("flush", window.storage.flush)
+
+        window.close()
+        app.processEvents()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory, ignore_errors=True)
+    return recorder.results
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old_path, new_path):
+    # 按 (规模, 后端, 操作) 对齐，打印新旧耗时之比，大于 1 表示变慢
+    with open(old_path) as f:
+        old = {(r["entries"], r["backend"], r["op"]): r for r in json.load(f)["results"]}
+    with open(new_path) as f:
+        new = json.load(f)["results"]
+    for result in new:
+        before = old.get((result["entries"], result["backend"], result["op"]))
+        if before is None or not before["seconds"]:
+            continue
+        ratio = result["seconds"] / before["seconds"]
+        print(f"{result['entries']:>9} {result['backend']:<6} {result['op']:<24} "
+              f"{before['seconds']:10.4f}s -> {result['seconds']:10.4f}s  x{ratio:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PasswordManagerApp 基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--backend", choices=BACKENDS, default="json")
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--ops", type=int, default=200, help="增删改和 get_key 的操作次数")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="对比两个结果文件后退出")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    app = QApplication(sys.argv[:1])
+    silence_dialogs()
+    workdir = tempfile.mkdtemp(prefix="pwmanager-bench-")
+    results = []
+    try:
+        for size in args.sizes:
+            results.extend(bench_size(app, size, args.backend, args.categories, args.ops, workdir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"revision": git_revision(), "python": platform.python_version(),
+                       "platform": platform.platform(), "cpu_count": os.cpu_count(), "results": results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
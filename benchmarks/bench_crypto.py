@@ -0,0 +1,70 @@
+"""
+批量加解密在不同核数下的扩展性测试。
+
+    python benchmarks/bench_crypto.py                       # 10k / 100k / 1M 条，1..CPU 核
+    python benchmarks/bench_crypto.py --sizes 10000 --workers 1 2 4 --processes --json result.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cryptography.fernet import Fernet  # noqa: E402
+
+from crypto_pool import BatchCipher  # noqa: E402
+
+
+def default_workers():
+    count = os.cpu_count() or 1
+    workers = [1]
+    while workers[-1] * 2 <= count:
+        workers.append(workers[-1] * 2)
+    if workers[-1] != count:
+        workers.append(count)
+    return workers
+
+
+def run(sizes, workers_list, use_processes):
+    key = Fernet.generate_key()
+    results = []
+    for size in sizes:
+        passwords = [f"password-{i:08d}" for i in range(size)]
+        tokens = None
+        for workers in workers_list:
+            crypto = BatchCipher(key, workers=workers, use_processes=use_processes)
+            start = time.perf_counter()
+            tokens = crypto.encrypt_many(passwords)
+            encrypt_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            crypto.decrypt_many(tokens)
+            decrypt_time = time.perf_counter() - start
+            crypto.shutdown()
+
+            results.append({"entries": size, "workers": workers,
+                            "executor": "process" if use_processes else "thread",
+                            "encrypt_s": round(encrypt_time, 4), "decrypt_s": round(decrypt_time, 4)})
+            print(f"{size:>9} entries  {workers:>3} workers  "
+                  f"encrypt {encrypt_time:8.3f}s  decrypt {decrypt_time:8.3f}s", flush=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BatchCipher 扩展性测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--workers", type=int, nargs="+", default=default_workers())
+    parser.add_argument("--processes", action="store_true", help="使用进程池而不是线程池")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.workers, args.processes)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"cpu_count": os.cpu_count(), "results": results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+加载后保险库在内存中的占用（条目、分组和搜索索引），按每个条目的字节数报告。
+
+    python benchmarks/bench_memory.py --sizes 10000 100000 --backend json --json memory.json
+"""
+import argparse
+import gc
+import json
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from crypto_pool import BatchCipher  # noqa: E402
+from master_key import VaultHeader  # noqa: E402
+from storage import BACKENDS, open_backend  # noqa: E402
+from synth_vault import DEFAULT_PASSWORD, generate  # noqa: E402
+
+
+def measure(directory, backend):
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        kek, data_key = VaultHeader().load().unlock(DEFAULT_PASSWORD)
+        storage, _ = open_backend(BatchCipher(data_key), backend)
+        gc.collect()
+        tracemalloc.start()
+        entries, categories = storage.load()
+        gc.collect()
+        loaded = tracemalloc.get_traced_memory()[0]
+        entries.index  # 建立搜索索引
+        gc.collect()
+        indexed = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        storage.close()
+        return loaded, indexed
+    finally:
+        os.chdir(cwd)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="保险库内存占用")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--backend", choices=BACKENDS, default="json")
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="pwmanager-memory-")
+    results = []
+    try:
+        for size in args.sizes:
+            directory = os.path.join(workdir, str(size))
+            generate(directory, size, args.categories, args.backend)
+            loaded, indexed = measure(directory, args.backend)
+            results.append({"entries": size, "backend": args.backend, "loaded_bytes": loaded,
+                            "loaded_bytes_per_entry": round(loaded / size, 1),
+                            "indexed_bytes_per_entry": round(indexed / size, 1)})
+            print(f"{size:>9} {args.backend:<6} loaded {loaded / size:8.1f} B/entry  "
+                  f"with search index {indexed / size:8.1f} B/entry", flush=True)
+            shutil.rmtree(directory, ignore_errors=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"results": results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
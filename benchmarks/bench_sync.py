@@ -0,0 +1,92 @@
+"""
+两个副本之间同步的基准测试：生成合成保险库，复制成两个目录，两边各修改少量条目后直接同步。
+
+    python benchmarks/bench_sync.py                         # 10k / 100k 条，每边修改 10 条
+    python benchmarks/bench_sync.py --sizes 100000 --changes 100 --backend sqlite
+
+记录第一次建立同步状态（解密全部密码）、之后只处理变化条目的耗时，以及 Merkle 摘要比较过的节点数。
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from storage import BACKENDS  # noqa: E402
+from synth_vault import DEFAULT_PASSWORD, generate  # noqa: E402
+from vault_manager import Vault  # noqa: E402
+from vault_sync import VaultSync, export_bundle, import_bundle, sync_vaults  # noqa: E402
+
+
+def edit(vault, names, rng, changes, tag):
+    # 修改、删除、新增各约三分之一
+    for index, name in enumerate(rng.sample(names, changes)):
+        if index % 3 == 0:
+            account, password, category = vault.get(name)
+            vault.update(name, name, account, f"{tag}-{index}", category)
+        elif index % 3 == 1:
+            vault.delete(name)
+        else:
+            vault.add(f"{tag}-new-{index}", "bench", f"{tag}-{index}")
+
+
+def bench_size(size, changes, backend, workdir):
+    a_dir, b_dir = os.path.join(workdir, f"a-{size}"), os.path.join(workdir, f"b-{size}")
+    generate(a_dir, size, backend=backend)
+    vault = Vault("a", a_dir, backend).unlock(DEFAULT_PASSWORD)
+    start = time.perf_counter()
+    state = VaultSync(vault)
+    state.refresh()
+    state.save()
+    first = time.perf_counter() - start
+    vault.unload()
+    shutil.copytree(a_dir, b_dir)
+
+    a = Vault("a", a_dir, backend).unlock(DEFAULT_PASSWORD)
+    b = Vault("b", b_dir, backend).unlock(DEFAULT_PASSWORD)
+    names = sorted(a.entries)
+    rng = random.Random(size)
+    edit(a, names, rng, changes, "a")
+    edit(b, names, rng, changes, "b")
+    start = time.perf_counter()
+    report = sync_vaults(a, b)
+    elapsed = time.perf_counter() - start
+    print(f"{size:>8} entries  first refresh {first:6.2f}s  sync {elapsed:6.3f}s  "
+          f"nodes {report['examined_nodes']:>5}  compared {report['compared']:>4}  "
+          f"written {report['written']}  conflicts {len(report['conflicts'])}", flush=True)
+
+    edit(a, sorted(a.entries), rng, changes, "a2")
+    bundle = os.path.join(workdir, f"a-{size}.sync")
+    start = time.perf_counter()
+    exported = export_bundle(a, bundle)
+    imported = import_bundle(b, bundle)
+    elapsed = time.perf_counter() - start
+    print(f"{'':>8}          bundle {os.path.getsize(bundle)} bytes ({exported['changed']} changed, "
+          f"{exported['deleted']} deleted)  export + import {elapsed:6.3f}s  written {imported['written']}",
+          flush=True)
+    a.unload()
+    b.unload()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="副本同步基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--changes", type=int, default=10, help="每边修改的条目数")
+    parser.add_argument("--backend", choices=BACKENDS, default="json")
+    args = parser.parse_args()
+    workdir = tempfile.mkdtemp(prefix="pwmanager-sync-")
+    try:
+        for size in args.sizes:
+            bench_size(size, args.changes, args.backend, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
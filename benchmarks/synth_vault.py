@@ -0,0 +1,86 @@
+"""
+生成合成保险库，供基准测试使用。
+
+    python benchmarks/synth_vault.py /tmp/vault-100k --size 100000 --categories 50 --backend sqlite
+
+目录中会写出 vault.header 和所选后端的文件，主密码默认为 "bench"。
+"""
+import argparse
+import os
+import random
+import string
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cryptography.fernet import Fernet  # noqa: E402
+
+from crypto_pool import BatchCipher  # noqa: E402
+from master_key import VaultHeader  # noqa: E402
+from storage import BACKENDS, open_backend  # noqa: E402
+
+WORDS = ["mail", "bank", "cloud", "shop", "forum", "game", "news", "work", "wiki", "git", "vpn", "router",
+         "music", "video", "photo", "travel", "health", "school", "tax", "insurance"]
+DOMAINS = ["example.com", "example.org", "example.net", "test.cn", "demo.io"]
+DEFAULT_PASSWORD = "bench"
+
+
+def synthetic_entries(size, categories=50, seed=0):
+    # 产生 [(名称, 账号, 密码, 分组)]，名称不重复，分组大小大致服从长尾分布
+    rng = random.Random(seed)
+    category_names = [f"分组{index:03d}" for index in range(categories)]
+    weights = [1 / (rank + 1) for rank in range(categories)]
+    alphabet = string.ascii_letters + string.digits + string.punctuation
+    result = []
+    for index in range(size):
+        word = rng.choice(WORDS)
+        domain = rng.choice(DOMAINS)
+        name = f"{word}-{index:07d}.{domain}"
+        account = f"{rng.choice(WORDS)}{rng.randrange(10000)}@{domain}"
+        password = "".join(rng.choice(alphabet) for _ in range(16))
+        result.append((name, account, password, rng.choices(category_names, weights)[0]))
+    return result
+
+
+def generate(directory, size, categories=50, backend="json", password=DEFAULT_PASSWORD, seed=0):
+    """在 directory 中写出合成保险库，返回条目数量"""
+    os.makedirs(directory, exist_ok=True)
+    if os.path.exists(os.path.join(directory, "vault.header")):
+        raise FileExistsError(f"{directory} 中已有保险库")
+    cwd = os.getcwd()
+    os.chdir(directory)  # 各后端和头部使用相对于当前目录的默认文件名，与应用一致
+    try:
+        data_key = Fernet.generate_key()
+        # 基准测试只关心保险库本身的操作，派生参数取最低强度
+        VaultHeader().create(password, data_key, target=0)
+        crypto = BatchCipher(data_key)
+        storage, _ = open_backend(crypto, backend)
+        storage.load()
+        entries = synthetic_entries(size, categories, seed)
+        for category in sorted({category for name, account, secret, category in entries}):
+            storage.add_category(category)
+        secrets = crypto.encrypt_many(secret for name, account, secret, category in entries)
+        storage.put_many([(name, account, secret, category)
+                          for (name, account, _, category), secret in zip(entries, secrets)])
+        storage.compact()
+        storage.close()
+        crypto.shutdown()
+    finally:
+        os.chdir(cwd)
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成合成保险库")
+    parser.add_argument("directory")
+    parser.add_argument("--size", type=int, default=10_000)
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--backend", choices=BACKENDS, default="json")
+    parser.add_argument("--password", default=DEFAULT_PASSWORD)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate(args.directory, args.size, args.categories, args.backend, args.password, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+import array
+import hashlib
+import mmap
+import os
+import struct
+
+from profiling import TRACER, timed
+
+INDEX_MAGIC = b"PWBI"
+INDEX_HEADER = struct.Struct("<4sBxxxQQ")  # 魔数、前缀的十六进制位数、语料文件大小、修改时间（纳秒）
+PREFIX_DIGITS = 4  # 按哈希前 4 位十六进制（65536 段）建立偏移索引
+DIGEST_LENGTH = 40
+
+
+class BreachCheckCancelled(Exception):
+    pass
+
+
+def sha1_hex(data):
+    # 明文（bytes）-> 大写十六进制 SHA-1（bytes），与语料中每行开头的格式一致
+    return hashlib.sha1(data).hexdigest().upper().encode()
+
+
+class BreachCorpus:
+    """
+    本地的泄露密码库：Have I Been Pwned 格式的文本文件，每行 "SHA-1（大写十六进制）:出现次数"，按哈希排序，
+    可达数十 GB。文件用 mmap 只读映射，不读入内存；查询时先按哈希前缀从偏移索引中取出所在的一段，
+    再在段内按行二分查找。偏移索引第一次打开时用二分查找建立（每个前缀一次，不扫描整个文件），
+    保存在 path + ".idx" 中，语料文件的大小或修改时间变化时重建。
+    """
+
+    def __init__(self, path, index_path=None):
+        self.path = path
+        self.index_path = index_path or path + ".idx"
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else b""
+        self.size = stat.st_size
+        self._stamp = (stat.st_size, stat.st_mtime_ns)
+        self.offsets = self._load_index()
+        if self.offsets is None:
+            self.offsets = self._build_index()
+            self._save_index()
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, "rb") as f:
+                magic, digits, size, mtime = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+                if magic != INDEX_MAGIC or digits != PREFIX_DIGITS or (size, mtime) != self._stamp:
+                    return None
+                offsets = array.array("Q")
+                offsets.fromfile(f, 16 ** PREFIX_DIGITS + 1)
+                return offsets
+        except (OSError, EOFError, struct.error):
+            return None
+
+    @timed("breach.build_index")
+    def _build_index(self):
+        # offsets[p] 为第一个前缀不小于 p 的行的起始位置，offsets[-1] 为文件大小
+        offsets = array.array("Q")
+        lo = 0
+        for prefix in range(16 ** PREFIX_DIGITS):
+            lo = self._lower_bound(b"%0*X" % (PREFIX_DIGITS, prefix), lo, self.size)
+            offsets.append(lo)
+        offsets.append(self.size)
+        return offsets
+
+    def _save_index(self):
+        # 语料所在目录不可写时只在内存中使用索引
+        try:
+            with open(self.index_path, "wb") as f:
+                f.write(INDEX_HEADER.pack(INDEX_MAGIC, PREFIX_DIGITS, *self._stamp))
+                self.offsets.tofile(f)
+        except OSError:
+            pass
+
+    def _line(self, lo, hi, mid):
+        # 返回 [lo, hi) 中包含 mid 的行的 (起始, 结束)，lo 必须是行首
+        start = self._map.rfind(b"\n", lo, mid) + 1 or lo
+        end = self._map.find(b"\n", start, hi)
+        return start, hi if end < 0 else end
+
+    def _lower_bound(self, prefix, lo, hi):
+        length = len(prefix)
+        while lo < hi:
+            start, end = self._line(lo, hi, (lo + hi) // 2)
+            if self._map[start:start + length] < prefix:
+                lo = end + 1
+            else:
+                hi = start
+        return min(lo, self.size)
+
+    def count(self, digest):
+        # digest 为 sha1_hex 的结果，返回在泄露数据中出现的次数，未出现时为 0
+        prefix = int(digest[:PREFIX_DIGITS], 16)
+        lo, hi = self.offsets[prefix], self.offsets[prefix + 1]
+        while lo < hi:
+            start, end = self._line(lo, hi, (lo + hi) // 2)
+            key = self._map[start:start + DIGEST_LENGTH]
+            if key < digest:
+                lo = end + 1
+            elif key > digest:
+                hi = start
+            else:
+                return int(self._map[start + DIGEST_LENGTH + 1:end].rstrip(b"\r") or 1)
+        return 0
+
+    @timed("breach.lookup_many")
+    def lookup_many(self, digests):
+        # 返回 {哈希: 次数}，只含出现过的；按哈希排序后查询，相邻的查询落在同一段文件页上
+        found = {}
+        for digest in sorted(set(digests)):
+            count = self.count(digest)
+            if count:
+                found[digest] = count
+        TRACER.count("breach lookups", len(digests))
+        return found
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+
+
+def check_entries(entries, corpus, names=None, progress=None, cancelled=None, batch_size=4096):
+    """
+    检查条目的密码是否出现在泄露数据中，返回 {名称: 出现次数}，只含出现过的。
+    每批密码在加解密线程池中解密并立即计算 SHA-1（见 BatchCipher.decrypt_map），明文不返回、不进入缓存。
+    """
+    names = list(entries if names is None else names)
+    result = {}
+    for start in range(0, len(names), batch_size):
+        if cancelled is not None and cancelled():
+            raise BreachCheckCancelled()
+        batch = entries.secrets(names[start:start + batch_size])
+        digests = entries.crypto.decrypt_map(sha1_hex, (secret for name, secret in batch))
+        found = corpus.lookup_many(digests)
+        for (name, secret), digest in zip(batch, digests):
+            if digest in found:
+                result[name] = found[digest]
+        if progress is not None:
+            progress(min(start + batch_size, len(names)), len(names))
+    return result
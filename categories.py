@@ -0,0 +1,126 @@
+import sys
+
+ALL_CATEGORY = "全部"
+UNGROUPED_CATEGORY = "未分组"
+HEALTH_CATEGORY = "密码健康"  # 分组列表中的虚拟分组（密码健康报告），不保存在 CategoryStore 中
+RESERVED_SUFFIX = "（分组）"
+
+
+def category_name(category):
+    # 与虚拟分组同名的真实分组（导入、命令行、同步合并带来的）改名保存，界面中不会出现两个同名的分组
+    return category + RESERVED_SUFFIX if category == HEALTH_CATEGORY else category
+
+
+class CategoryStore:
+    """
+    分组数据模型：分组按编号保存（_titles[编号] 为分组名，_ids 为反查表，其顺序即显示顺序），
+    每个分组的成员用有序集合（dict 的键）保存，另有 名称 -> 分组编号 的反向索引，
+    查询条目所在分组、移动、删除都是 O(1)，重命名分组只改编号对应的名称，不再逐个更新成员。
+    每个条目只属于一个分组；"全部" 是虚拟分组，成员即所有已分组的条目，不单独保存。
+    "密码健康" 也是界面中的虚拟分组，同名的分组按 category_name 改名。
+    """
+
+    def __init__(self):
+        self._ids = {ALL_CATEGORY: 0, UNGROUPED_CATEGORY: 1}  # 分组名 -> 编号
+        self._titles = [ALL_CATEGORY, UNGROUPED_CATEGORY]  # 编号 -> 分组名，已删除的为 None
+        self._members = [{}, {}]  # 编号 -> 成员
+        self._owner = {}  # 名称 -> 分组编号
+
+    @classmethod
+    def from_json(cls, data):
+        # 兼容旧版 categories.dat：忽略 "全部" 列表，条目出现在多个分组时以第一个为准
+        store = cls()
+        for category, names in data.items():
+            store.add_category(category)
+            if category == ALL_CATEGORY:
+                continue
+            for name in names:
+                if name not in store._owner:
+                    store.assign(name, category)
+        return store
+
+    def to_json(self):
+        return {category: [] if category == ALL_CATEGORY else list(self._members[category_id])
+                for category, category_id in self._ids.items()}
+
+    def __contains__(self, category):
+        return category in self._ids
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __getitem__(self, category):
+        if category == ALL_CATEGORY:
+            return self._owner.keys()
+        return self._members[self._ids[category]].keys()
+
+    def keys(self):
+        return list(self._ids)
+
+    def items(self):
+        for category in self._ids:
+            yield category, self[category]
+
+    def category_of(self, name):
+        category_id = self._owner.get(name)
+        return UNGROUPED_CATEGORY if category_id is None else self._titles[category_id]
+
+    def contains_name(self, name):
+        return name in self._owner
+
+    def add_category(self, category):
+        category = category_name(category)
+        category_id = self._ids.get(category)
+        if category_id is None:
+            category_id = self._ids[category] = len(self._titles)
+            self._titles.append(category)
+            self._members.append({})
+        return category_id
+
+    def assign(self, name, category):
+        # 把条目放入 category，如已在其他分组则移过去
+        if category == ALL_CATEGORY:
+            category = UNGROUPED_CATEGORY
+        category_id = self.add_category(category)
+        name = sys.intern(name)  # 与 LazyEntries 中的名称共用同一个对象
+        old = self._owner.get(name)
+        if old == category_id:
+            return  # 留在原位，分组视图中的顺序不变
+        if old is not None:
+            del self._members[old][name]
+        self._members[category_id][name] = None
+        self._owner[name] = category_id
+
+    def remove(self, name):
+        category_id = self._owner.pop(name, None)
+        if category_id is not None:
+            del self._members[category_id][name]
+
+    def rename_category(self, old, new):
+        old, new = category_name(old), category_name(new)
+        if old not in self._ids or new in self._ids or old in (ALL_CATEGORY, UNGROUPED_CATEGORY):
+            return False
+        # 成员和反向索引中保存的是编号，不需要改；重建反查表以保持分组在列表中的位置
+        category_id = self._ids[old]
+        self._titles[category_id] = new
+        self._ids = {new if category == old else category: i for category, i in self._ids.items()}
+        return True
+
+    def delete_category(self, category):
+        # 删除分组，其下的条目移入 "未分组"
+        category = category_name(category)
+        if category not in self._ids or category in (ALL_CATEGORY, UNGROUPED_CATEGORY):
+            return False
+        category_id = self._ids.pop(category)
+        ungrouped_id = self._ids[UNGROUPED_CATEGORY]
+        names = self._members[category_id]
+        self._members[category_id] = {}
+        self._titles[category_id] = None
+        ungrouped = self._members[ungrouped_id]
+        for name in names:
+            ungrouped[name] = None
+            self._owner[name] = ungrouped_id
+        return True
@@ -0,0 +1,354 @@
+"""
+命令行工具，与图形界面共用保险库（vault_manager.Vault），不导入 Qt，供脚本和自动化调用。
+
+    python cli.py get mail                         # 输出密码
+    python cli.py --json get mail                  # 输出 {"name", "account", "password", "category"}
+    python cli.py search bank --limit 20
+    python cli.py search git --prefix              # 名称以 git 开头的条目，按名称排序
+    python cli.py add mail --account me@x.com --category 邮箱   # 省略 --password 时在终端输入
+    python cli.py export out.csv                   # 格式由扩展名决定：.xlsx / .csv / .jsonl
+    python cli.py import in.csv
+    python cli.py batch < requests.jsonl           # 只解锁一次，每行一个 JSON 请求，逐行输出 JSON 结果
+    python cli.py --agent get mail                 # 由已解锁的代理进程（agent.py）执行，不派生密钥
+    python cli.py sync /mnt/usb/vault              # 与另一个目录中的副本直接合并（见 vault_sync.py）
+    python cli.py sync-export changes.sync         # 导出上次同步以来变化的条目，在另一台机器上 sync-import
+
+主密码依次取自 --password-file、环境变量 PWMANAGER_PASSWORD，否则在终端提示输入。
+每次调用都要从主密码派生密钥（约 0.5 秒），高频调用请用 batch 模式或代理进程。
+batch 的请求形如 {"id": 1, "cmd": "get", "name": "mail"}，参数名与子命令的选项相同；
+结果为 {"id": 1, "ok": true, "result": ...} 或 {"id": 1, "ok": false, "error": "..."}。
+退出码：0 成功，1 出错（例如条目不存在），2 参数错误，3 主密码错误。
+"""
+import argparse
+import getpass
+import json
+import os
+import sys
+from functools import partial
+
+from cryptography.fernet import InvalidToken
+
+from master_key import WrongPassword
+from storage import BACKENDS
+from vault_manager import REGISTRY_PATH, Vault, VaultManager
+from vault_sync import PREFER, SyncError, export_bundle, import_bundle, sync_vaults
+from vault_sync import status as sync_status
+
+PASSWORD_ENV = "PWMANAGER_PASSWORD"
+EXIT_ERROR = 1
+EXIT_WRONG_PASSWORD = 3
+UNREADABLE = "数据无法用当前密钥解密（密钥不对或文件已损坏）"  # InvalidToken 没有说明文字
+GLOBAL_OPTIONS = ("vault", "vaults", "dir", "backend", "password_file", "create", "json", "agent", "socket", "cmd")
+
+
+class CommandError(Exception):
+    pass
+
+
+def entry_info(vault, name):
+    account, password, category = vault.get(name)
+    return {"name": name, "account": account, "password": password, "category": category}
+
+
+def cmd_get(vault, name, field=None):
+    try:
+        info = entry_info(vault, name)
+    except KeyError:
+        raise CommandError(f"条目不存在：{name}")
+    return info if field is None else info[field]
+
+
+def cmd_search(vault, query, limit=None, prefix=False):
+    names = vault.entries.prefix(query, limit) if prefix else vault.search(query, limit)
+    return [{"name": name, "account": vault.entries.account(name), "category": vault.categories.category_of(name)}
+            for name in names]
+
+
+def cmd_add(vault, name, account, password, category=None):
+    return vault.add(name, account, password, category)
+
+
+def cmd_update(vault, name, account=None, password=None, category=None, new_name=None):
+    # 省略的字段保持不变
+    try:
+        info = entry_info(vault, name)
+    except KeyError:
+        raise CommandError(f"条目不存在：{name}")
+    vault.update(name, new_name or name, info["account"] if account is None else account,
+                 info["password"] if password is None else password, category or info["category"])
+    return new_name or name
+
+
+def cmd_delete(vault, name):
+    try:
+        vault.delete(name)
+    except KeyError:
+        raise CommandError(f"条目不存在：{name}")
+    return name
+
+
+def cmd_export(vault, path):
+    return vault.export(path)
+
+
+def cmd_import(vault, path):
+    return vault.import_items(vault.read_import(path))
+
+
+def cmd_sync(vault, path, password, prefer="newer"):
+    # 与另一个目录中同一个保险库的副本直接同步，双方都写入合并结果
+    other = Vault(os.path.basename(os.path.abspath(path)), path)
+    if not other.header.exists():
+        raise CommandError(f"{path} 中没有保险库")
+    other.unlock(password)
+    try:
+        return sync_vaults(vault, other, prefer)
+    except SyncError as e:
+        raise CommandError(str(e))
+    finally:
+        other.unload()
+
+
+def cmd_sync_export(vault, path, peer=None, full=False):
+    try:
+        return export_bundle(vault, path, peer, full)
+    except SyncError as e:
+        raise CommandError(str(e))
+
+
+def cmd_sync_import(vault, path, prefer="newer"):
+    try:
+        return import_bundle(vault, path, prefer)
+    except SyncError as e:
+        raise CommandError(str(e))
+
+
+def cmd_sync_status(vault):
+    try:
+        return sync_status(vault)
+    except SyncError as e:
+        raise CommandError(str(e))
+
+
+COMMANDS = {"get": cmd_get, "search": cmd_search, "add": cmd_add, "update": cmd_update, "delete": cmd_delete,
+            "export": cmd_export, "import": cmd_import, "sync": cmd_sync, "sync-export": cmd_sync_export,
+            "sync-import": cmd_sync_import, "sync-status": cmd_sync_status}
+
+
+def execute(vault, cmd, params):
+    command = COMMANDS.get(cmd)
+    if command is None:
+        raise CommandError(f"未知的命令：{cmd}")
+    return command(vault, **params)
+
+
+def run_batch(handle, lines, out):
+    # 每行一个请求，由 handle(命令, 参数) 执行；出错只影响这一行，每个结果立即输出，调用方可以逐行交互
+    for line in lines:
+        if not line.strip():
+            continue
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.pop("id", None)
+            response = {"ok": True, "result": handle(request.pop("cmd", None), request)}
+        except WrongPassword:
+            response = {"ok": False, "error": "主密码错误", "code": "wrong_password"}
+        except InvalidToken:
+            response = {"ok": False, "error": UNREADABLE}
+        except (CommandError, ValueError, TypeError, KeyError, OSError) as e:
+            response = {"ok": False, "error": str(e)}
+        if request_id is not None:
+            response = {"id": request_id, **response}
+        out.write(json.dumps(response, ensure_ascii=False) + "\n")
+        out.flush()
+
+
+def read_password_file(path):
+    with open(path, encoding="utf-8") as f:
+        return f.readline().rstrip("\r\n")
+
+
+def master_password(args):
+    if args.password_file:
+        return read_password_file(args.password_file)
+    if os.environ.get(PASSWORD_ENV):
+        return os.environ[PASSWORD_ENV]
+    return getpass.getpass("主密码：")
+
+
+def find_vault(args):
+    # 按 --dir 或 --vault 找到保险库，不解锁
+    if args.dir:
+        if args.create:
+            os.makedirs(args.dir, exist_ok=True)
+        vault = Vault(os.path.basename(os.path.abspath(args.dir)), args.dir, args.backend)
+    else:
+        vaults = VaultManager(args.vaults, args.backend)
+        try:
+            vault = vaults[args.vault] if args.vault else next(iter(vaults))
+        except KeyError:
+            raise CommandError(f"没有登记名为 {args.vault} 的保险库")
+    if not args.create and not vault.header.exists() and not os.path.exists(vault.path("secret.key")):
+        raise CommandError(f"{vault.directory} 中没有保险库，要新建请加 --create")
+    return vault
+
+
+def open_vault(args):
+    return find_vault(args).unlock(master_password(args))
+
+
+def agent_handler(args):
+    # 转发给代理进程（见 agent.py），不在本进程中派生密钥；代理进程已锁定时用主密码解锁一次
+    from agent_client import AgentClient, AgentError, default_socket_path
+
+    client = AgentClient(args.socket or default_socket_path(find_vault(args).directory))
+
+    def request(cmd, params):
+        # 代理进程报告的错误与本地执行时一样作为 CommandError 按行报告；已锁定的留给 handle 解锁后重试
+        try:
+            return client.request(cmd, **params)
+        except AgentError as e:
+            if e.code == "locked":
+                raise
+            raise CommandError(str(e))
+
+    def handle(cmd, params):
+        if "path" in params:
+            params["path"] = os.path.abspath(params["path"])  # 代理进程的工作目录可能不同
+        try:
+            return request(cmd, params)
+        except AgentError:
+            request("unlock", {"password": master_password(args)})
+        return request(cmd, params)
+
+    return handle, client.close
+
+
+def print_result(result, as_json):
+    if as_json:
+        print(json.dumps(result, ensure_ascii=False))
+    elif isinstance(result, list):
+        for item in result:
+            print(item["name"] if isinstance(item, dict) else item)
+    elif isinstance(result, dict):
+        for key, value in result.items():
+            print(f"{key}\t{value}")
+    else:
+        print(result)
+
+
+def add_vault_arguments(parser):
+    # 选择保险库和提供主密码的选项，agent.py 也使用
+    parser.add_argument("--vault", help="已登记的保险库名称，默认为列表中的第一个")
+    parser.add_argument("--vaults", default=REGISTRY_PATH, help="已登记的保险库列表")
+    parser.add_argument("--dir", help="直接打开此目录中的保险库")
+    parser.add_argument("--backend", choices=BACKENDS)
+    parser.add_argument("--password-file", help="从文件的第一行读取主密码")
+    parser.add_argument("--create", action="store_true", help="保险库不存在时以此主密码新建")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="pwmanager", description="PwManager 命令行工具")
+    add_vault_arguments(parser)
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    parser.add_argument("--agent", action="store_true", help="通过已在运行的代理进程（agent.py）访问")
+    parser.add_argument("--socket", help="代理进程的套接字路径，默认按保险库目录确定")
+    commands = parser.add_subparsers(dest="cmd", required=True)
+
+    get = commands.add_parser("get", help="读取条目，默认只输出密码")
+    get.add_argument("name")
+    get.add_argument("--field", choices=("account", "password", "category", "all"), default=None)
+
+    search = commands.add_parser("search", help="按名称和账号搜索")
+    search.add_argument("query")
+    search.add_argument("--limit", type=int)
+    search.add_argument("--prefix", action="store_true", help="只查名称以 query 开头的条目，按名称排序")
+
+    add = commands.add_parser("add", help="添加条目，名称重复时自动加后缀，输出实际使用的名称")
+    add.add_argument("name")
+    add.add_argument("--account", required=True)
+    add.add_argument("--password", help="省略时在终端输入")
+    add.add_argument("--category")
+
+    update = commands.add_parser("update", help="修改条目，省略的字段保持不变")
+    update.add_argument("name")
+    update.add_argument("--new-name")
+    update.add_argument("--account")
+    update.add_argument("--password")
+    update.add_argument("--category")
+
+    delete = commands.add_parser("delete", help="删除条目")
+    delete.add_argument("name")
+
+    export = commands.add_parser("export", help="导出全部条目（包含明文密码）")
+    export.add_argument("path")
+
+    import_ = commands.add_parser("import", help="从 .xlsx / .csv / .jsonl 导入")
+    import_.add_argument("path")
+
+    sync = commands.add_parser("sync", help="与另一个目录中同一个保险库的副本合并")
+    sync.add_argument("path")
+    sync.add_argument("--prefer", choices=PREFER, default="newer", help="同一字段双方改得不同时取哪一方，newer 为写入时间较晚的一方")
+    sync.add_argument("--other-password-file", help="另一个副本的主密码，默认与本保险库相同")
+
+    sync_export = commands.add_parser("sync-export", help="导出与对端上次同步以来变化的条目")
+    sync_export.add_argument("path")
+    sync_export.add_argument("--peer", help="对端副本的编号（见 sync-status），默认为唯一同步过的对端")
+    sync_export.add_argument("--full", action="store_true", help="导出全部条目")
+
+    sync_import = commands.add_parser("sync-import", help="导入同步包并合并")
+    sync_import.add_argument("path")
+    sync_import.add_argument("--prefer", choices=PREFER, default="newer")
+
+    commands.add_parser("sync-status", help="本副本的编号、摘要和同步过的对端")
+    commands.add_parser("batch", help="从标准输入逐行读取 JSON 请求")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    options = {key: value for key, value in vars(args).items() if key not in GLOBAL_OPTIONS}
+    if args.cmd == "get":
+        # 文本输出默认只输出密码，方便管道使用
+        options["field"] = None if options["field"] == "all" or (args.json and not options["field"]) \
+            else options["field"] or "password"
+    if args.cmd == "add" and options["password"] is None:
+        options["password"] = getpass.getpass("条目的密码：")
+
+    try:
+        if args.agent or args.socket:
+            handle, close = agent_handler(args)
+        else:
+            vault = open_vault(args)
+            handle, close = partial(execute, vault), vault.unload
+    except WrongPassword:
+        print("主密码错误", file=sys.stderr)
+        return EXIT_WRONG_PASSWORD
+    except (CommandError, OSError) as e:
+        print(e, file=sys.stderr)
+        return EXIT_ERROR
+    try:
+        if args.cmd == "batch":
+            run_batch(handle, sys.stdin, sys.stdout)
+            return 0
+        if args.cmd == "sync":
+            password_file = options.pop("other_password_file")
+            options["password"] = read_password_file(password_file) if password_file else master_password(args)
+        print_result(handle(args.cmd, options), args.json)
+        return 0
+    except WrongPassword:
+        print("主密码错误", file=sys.stderr)
+        return EXIT_WRONG_PASSWORD
+    except InvalidToken:
+        print(UNREADABLE, file=sys.stderr)
+        return EXIT_ERROR
+    except (CommandError, ValueError, OSError) as e:
+        print(e, file=sys.stderr)
+        return EXIT_ERROR
+    finally:
+        close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from cryptography.fernet import Fernet, InvalidToken
+
+from profiling import TRACER, timed
+
+_worker_cipher = None
+
+
+def _init_worker(key):
+    global _worker_cipher
+    _worker_cipher = Fernet(key)
+
+
+def _encrypt_chunk(cipher, values):
+    return [cipher.encrypt(value.encode()).decode() for value in values]
+
+
+def _decrypt_chunk(cipher, tokens, strict):
+    result = []
+    for token in tokens:
+        try:
+            result.append(cipher.decrypt(token.encode() if isinstance(token, str) else token).decode())
+        except InvalidToken:
+            if strict:
+                raise
+            result.append(None)
+    return result
+
+
+def _decrypt_map_chunk(cipher, tokens, func):
+    return [func(cipher.decrypt(token.encode() if isinstance(token, str) else token)) for token in tokens]
+
+
+def _process_encrypt_chunk(values):
+    return _encrypt_chunk(_worker_cipher, values)
+
+
+def _process_decrypt_chunk(tokens, strict):
+    return _decrypt_chunk(_worker_cipher, tokens, strict)
+
+
+def _process_decrypt_map_chunk(tokens, func):
+    return _decrypt_map_chunk(_worker_cipher, tokens, func)
+
+
+class BatchCipher:
+    """
+    批量加解密：把条目切成块后交给线程池（cryptography 在 OpenSSL 中运算时会释放 GIL）或进程池并行处理，
+    数量少于 serial_threshold 时直接在当前线程串行处理，省去调度开销。
+    """
+
+    def __init__(self, key, workers=None, chunk_size=1024, serial_threshold=2048, use_processes=False):
+        self.key = key
+        self.cipher = Fernet(key)
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.serial_threshold = serial_threshold
+        self.use_processes = use_processes
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.use_processes:
+                # 进程池依赖 multiprocessing，导入较慢，用到时才导入
+                from concurrent.futures import ProcessPoolExecutor
+                self._executor = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                                     initargs=(self.key,))
+            else:
+                self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="crypto")
+        return self._executor
+
+    def _run(self, serial_func, process_func, items, *args):
+        items = list(items)
+        if len(items) < self.serial_threshold or self.workers <= 1:
+            return serial_func(self.cipher, items, *args)
+
+        chunks = [items[i:i + self.chunk_size] for i in range(0, len(items), self.chunk_size)]
+        executor = self._get_executor()
+        if self.use_processes:
+            futures = [executor.submit(process_func, chunk, *args) for chunk in chunks]
+        else:
+            futures = [executor.submit(serial_func, self.cipher, chunk, *args) for chunk in chunks]
+
+        result = []
+        for future in futures:
+            result.extend(future.result())
+        return result
+
+    @timed("crypto.encrypt_many")
+    def encrypt_many(self, values):
+        # 输入明文字符串，按原顺序返回 Fernet 密文字符串
+        result = self._run(_encrypt_chunk, _process_encrypt_chunk, values)
+        TRACER.count("entries encrypted", len(result))
+        return result
+
+    @timed("crypto.decrypt_many")
+    def decrypt_many(self, tokens, strict=True):
+        # strict=False 时无法解密的记录返回 None，而不是抛出 InvalidToken
+        result = self._run(_decrypt_chunk, _process_decrypt_chunk, tokens, strict)
+        TRACER.count("entries decrypted", len(result))
+        return result
+
+    @timed("crypto.decrypt_map")
+    def decrypt_map(self, func, tokens):
+        # 在工作线程中解密后立即交给 func（参数为明文 bytes），只返回 func 的结果，明文不离开工作线程；
+        # 使用进程池时 func 必须是模块级函数
+        result = self._run(_decrypt_map_chunk, _process_decrypt_map_chunk, tokens, func)
+        TRACER.count("entries decrypted", len(result))
+        return result
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
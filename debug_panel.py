@@ -0,0 +1,86 @@
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import (
+    QDialog, QFileDialog, QHBoxLayout, QHeaderView, QMessageBox, QPushButton, QTableWidget, QTableWidgetItem,
+    QVBoxLayout
+)
+
+LATENCY_COLUMNS = ["名称", "次数", "p50 ms", "p90 ms", "p99 ms", "最大 ms"]
+
+
+class DebugPanel(QDialog):
+    """调试面板（Ctrl+Shift+D）：开关追踪，查看计数器和各段耗时分布，保存 Chrome trace"""
+
+    def __init__(self, tracer, parent=None):
+        super().__init__(parent)
+        self.tracer = tracer
+        self.setWindowTitle('性能调试')
+        self.resize(560, 420)
+
+        self.counter_table = QTableWidget(0, 2, self)
+        self.counter_table.setHorizontalHeaderLabels(["计数器", "值"])
+        self.latency_table = QTableWidget(0, len(LATENCY_COLUMNS), self)
+        self.latency_table.setHorizontalHeaderLabels(LATENCY_COLUMNS)
+        for table in (self.counter_table, self.latency_table):
+            table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+            table.setEditTriggers(QTableWidget.NoEditTriggers)
+
+        self.toggle_button = QPushButton(self)
+        self.toggle_button.clicked.connect(self.toggle)
+        reset_button = QPushButton('清空', self)
+        reset_button.clicked.connect(self.reset)
+        save_button = QPushButton('保存 trace…', self)
+        save_button.clicked.connect(self.save_trace)
+
+        buttons = QHBoxLayout()
+        buttons.addWidget(self.toggle_button)
+        buttons.addWidget(reset_button)
+        buttons.addWidget(save_button)
+        layout = QVBoxLayout()
+        layout.addLayout(buttons)
+        layout.addWidget(self.counter_table)
+        layout.addWidget(self.latency_table, 1)
+        self.setLayout(layout)
+
+        # 只在面板可见时刷新
+        self.timer = QTimer(self)
+        self.timer.setInterval(1000)
+        self.timer.timeout.connect(self.refresh)
+        self.refresh()
+
+    def showEvent(self, event):
+        self.timer.start()
+        self.refresh()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
+
+    def toggle(self):
+        self.tracer.enable(not self.tracer.enabled)
+        self.refresh()
+
+    def reset(self):
+        self.tracer.reset()
+        self.refresh()
+
+    def refresh(self):
+        self.toggle_button.setText('停止追踪' if self.tracer.enabled else '开始追踪')
+        summary = self.tracer.summary()
+        counters = sorted(summary["counters"].items())
+        self.counter_table.setRowCount(len(counters))
+        for row, (name, value) in enumerate(counters):
+            self.counter_table.setItem(row, 0, QTableWidgetItem(name))
+            self.counter_table.setItem(row, 1, QTableWidgetItem(str(value)))
+        latency = list(summary["latency"].items())
+        self.latency_table.setRowCount(len(latency))
+        for row, (name, stats) in enumerate(latency):
+            values = [name, stats["count"], stats["p50_ms"], stats["p90_ms"], stats["p99_ms"], stats["max_ms"]]
+            for column, value in enumerate(values):
+                self.latency_table.setItem(row, column, QTableWidgetItem(str(value)))
+
+    def save_trace(self):
+        path, _ = QFileDialog.getSaveFileName(self, "保存 trace", "pwmanager-trace.json", "JSON Files (*.json)")
+        if path:
+            self.tracer.dump(path)
+            QMessageBox.information(self, '已保存', f'可在 chrome://tracing 或 Perfetto 中打开 {path}')
@@ -0,0 +1,237 @@
+from itertools import islice
+
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, Qt
+
+from categories import ALL_CATEGORY
+from profiling import TRACER, timed
+from storage import CATEGORY_CHANGED, ENTRY_ADDED, ENTRY_CHANGED, ENTRY_REMOVED
+
+ENTRY_NAME_ROLE = Qt.UserRole  # 行对应的条目名称，标题行为 None
+VAULT_ROLE = Qt.UserRole + 1  # 跨保险库搜索结果中行所属的保险库名称，其他情况为 None
+
+
+class EntryListModel(QAbstractListModel):
+    """
+    条目列表的模型：只保存要显示的名称列表，显示文本在 data() 中按需生成，
+    行通过 canFetchMore/fetchMore 分批加载，切换分组不再为每个条目创建 Qt 对象。
+    跨保险库的搜索结果由 set_names(..., vaults=...) 设置，这时每行是 (保险库名称, 条目名称)。
+    修改后由 apply_changes 按存储的修改通知只插入、删除或刷新受影响的行，不再重置整个列表。
+    显示分组时直接引用 CategoryStore 中该分组的成员（键视图），只取出已加载的行，不复制整个分组。
+    """
+
+    def __init__(self, parent=None, batch_size=256):
+        super().__init__(parent)
+        self.batch_size = batch_size
+        self.entries = {}
+        self.categories = None
+        self._names = []
+        self._loaded = 0
+        self._rows = {}  # 名称 -> 在 _names 中的位置，只有小于 _rows_valid 的位置是准确的
+        self._rows_valid = 0
+        self._source = None  # 显示分组时为该分组成员的键视图，_names 只是其中已加载的前一部分
+        self._complete = True  # 分组成员是否已全部加载
+        self._header = None  # 不可选中的标题行，例如 "查询结果"
+        self._show_category = False
+        self._vaults = None  # 保险库名称 -> vault_manager.Vault
+        self._category = None  # 正在显示的分组，搜索结果为 None
+        self._describe = None  # 名称 -> 附加在行末的说明，例如密码健康报告中的问题
+
+    def set_store(self, entries, categories):
+        self.entries = entries
+        self.categories = categories
+
+    @timed("view.set_names")
+    def set_names(self, names, header=None, show_category=False, vaults=None, category=None, describe=None):
+        self.beginResetModel()
+        if category is None:
+            self._source = None
+            self._names = names
+        else:
+            self._source = names
+            self._names = list(islice(names, self.batch_size))
+        self._loaded = min(len(names), self.batch_size)
+        self._complete = self._loaded >= len(names)
+        self._rows = {}
+        self._rows_valid = 0
+        self._header = header
+        self._show_category = show_category
+        self._vaults = vaults
+        self._category = category
+        self._describe = describe
+        self.endResetModel()
+
+    def clear(self):
+        self.set_names([])
+
+    def _offset(self):
+        return 1 if self._header is not None else 0
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._offset() + self._loaded
+
+    def _total(self):
+        return len(self._names) if self._source is None else len(self._source)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._loaded < self._total()
+
+    @timed("view.fetch_more")
+    def fetchMore(self, parent=QModelIndex()):
+        self._fetch(self.batch_size)
+
+    def _fetch(self, count):
+        count = min(count, self._total() - self._loaded)
+        if count <= 0:
+            return
+        TRACER.count("rows fetched", count)
+        first = self._offset() + self._loaded
+        self.beginInsertRows(QModelIndex(), first, first + count - 1)
+        if self._source is not None:
+            # 已加载的行与分组成员的顺序一致，接着取出后面的名称
+            self._names.extend(islice(self._source, self._loaded, self._loaded + count))
+        self._loaded += count
+        self._complete = self._loaded >= self._total()
+        self.endInsertRows()
+
+    @timed("view.apply_changes")
+    def apply_changes(self, changes, vault_name=None):
+        """
+        按修改通知（见 storage.ENTRY_ADDED 等）更新行。显示分组时条目按是否属于该分组插入或移除；
+        搜索结果只跟随改名和删除，不会因修改而加入新的结果。vault_name 为发生修改的保险库，
+        跨保险库的搜索结果中只处理该保险库的行。
+        显示分组时存储已经更新了分组成员，新加入的条目在成员末尾：之前已全部加载时直接取出，否则随滚动加载。
+        """
+        for change in changes:
+            kind = change[0]
+            if kind == ENTRY_ADDED:
+                if self._shows(change[2]):
+                    self._append(self._key(change[1], vault_name))
+            elif kind == ENTRY_CHANGED:
+                name, category, old_name = change[1:4]
+                self._change(self._key(name, vault_name), self._key(old_name, vault_name), self._shows(category))
+            elif kind == ENTRY_REMOVED:
+                self._remove(self._key(change[1], vault_name))
+            elif kind == CATEGORY_CHANGED and self._show_category:
+                self._refresh()  # 搜索结果中显示的分组名可能变了
+        if self._source is not None:
+            if self._complete:
+                self._fetch(len(self._source) - self._loaded)
+            self._complete = self._loaded >= len(self._source)
+        TRACER.count("rows changed", len(changes))
+
+    def _key(self, name, vault_name):
+        return name if self._vaults is None else (vault_name, name)
+
+    def _shows(self, category):
+        # 分组视图中该分组的条目是否应该显示；搜索结果不按分组加入
+        if self._category is None:
+            return None
+        return self._category == ALL_CATEGORY or self._category == category
+
+    def _row_of(self, key):
+        # 位置查字典；删除一行会使其后各行的位置失效，查到失效部分时才从那里补建，
+        # 修改和追加都是 O(1)，连续删除的补建摊还到各次删除上
+        row = self._rows.get(key)
+        if row is not None and row < self._rows_valid:
+            return row
+        rows, names = self._rows, self._names
+        for row in range(self._rows_valid, len(names)):
+            rows[names[row]] = row
+        self._rows_valid = len(names)
+        return rows.get(key)
+
+    def _append(self, key):
+        if self._source is not None:
+            return  # 已在分组成员末尾，由 apply_changes 最后统一取出
+        if self._rows_valid == len(self._names):
+            self._rows[key] = len(self._names)
+            self._rows_valid += 1
+        self._names.append(key)
+        if self._loaded == len(self._names) - 1:
+            row = self._offset() + self._loaded
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._loaded += 1
+            self.endInsertRows()
+
+    def _remove(self, key):
+        position = self._row_of(key)
+        if position is None:
+            return
+        del self._rows[key]
+        self._rows_valid = position
+        if position < self._loaded:
+            row = self._offset() + position
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self._names[position]
+            self._loaded -= 1
+            self.endRemoveRows()
+        else:
+            del self._names[position]
+
+    def _change(self, key, old_key, shown):
+        position = self._row_of(old_key)
+        if position is None:
+            if shown:
+                self._append(key)
+            return
+        if shown is False:
+            self._remove(old_key)  # 移到了其他分组
+            return
+        if key != old_key and self._source is not None:
+            self._remove(old_key)  # 存储中改名后的条目排在分组末尾，与之保持一致
+            return
+        self._names[position] = key
+        if key != old_key:
+            del self._rows[old_key]
+            self._rows[key] = position
+        if position < self._loaded:
+            index = self.index(self._offset() + position)
+            self.dataChanged.emit(index, index)
+
+    def _refresh(self):
+        if self._loaded:
+            self.dataChanged.emit(self.index(self._offset()), self.index(self._offset() + self._loaded - 1))
+
+    def name_at(self, row):
+        row -= self._offset()
+        if 0 <= row < self._loaded:
+            return self._names[row]
+        return None
+
+    def flags(self, index):
+        if self._header is not None and index.row() == 0:
+            return Qt.NoItemFlags
+        return super().flags(index)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if self._header is not None and index.row() == 0:
+            if role == Qt.DisplayRole:
+                return self._header
+            if role == Qt.TextAlignmentRole:
+                return Qt.AlignCenter
+            return None
+
+        name = self.name_at(index.row())
+        if name is None:
+            return None
+        vault_name = None
+        entries, categories = self.entries, self.categories
+        if self._vaults is not None:
+            vault_name, name = name
+            vault = self._vaults[vault_name]
+            entries, categories = vault.entries, vault.categories
+        if role == ENTRY_NAME_ROLE:
+            return name
+        if role == VAULT_ROLE:
+            return vault_name
+        if role == Qt.DisplayRole:
+            account = entries.account(name) if name in entries else ""
+            text = f"{categories.category_of(name)}  {name}  {account}" if self._show_category else f"{name}  {account}"
+            if self._describe is not None:
+                text = f"{text}  —  {self._describe(name)}"
+            return text if vault_name is None else f"[{vault_name}]  {text}"
+        return None
@@ -0,0 +1,263 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+from profiling import TRACER
+from search_index import SearchIndex, scan
+
+
+class PlaintextCache:
+    """
+    有容量上限的 LRU 缓存，条目超过 ttl 秒未被访问即失效，避免明文长期留在内存中。
+    导出、泄露检查等后台线程和 GUI 线程会同时读写，各操作在 _lock 内进行。
+    """
+
+    def __init__(self, maxsize=256, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            now = time.monotonic()
+            if expires < now:
+                del self._items[key]
+                return None
+            self._items[key] = (value, now + self.ttl)
+            self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = (value, time.monotonic() + self.ttl)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def purge_expired(self):
+        now = time.monotonic()
+        with self._lock:
+            # 按访问顺序排列，最早过期的在前面
+            while self._items:
+                key, (value, expires) = next(iter(self._items.items()))
+                if expires >= now:
+                    break
+                del self._items[key]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class EntryRecord:
+    """一个条目：账号明文、加密的密码和写入时间（time.time()，旧数据中没有记录的为 None）。用 __slots__ 省去每个对象的 __dict__"""
+
+    __slots__ = ("account", "secret", "mtime")
+
+    def __init__(self, account, secret, mtime=None):
+        self.account = account
+        self.secret = secret
+        self.mtime = mtime
+
+
+class LazyEntries(MutableMapping):
+    """
+    名称 -> (账号, 密码) 的映射，每个条目在 records 中只有一个 EntryRecord，名称经过 sys.intern，
+    与分组、搜索索引共用同一个字符串对象。
+    名称和账号常驻内存用于列表和搜索，密码保持密文，首次读取时才解密并放入 PlaintextCache。
+    搜索索引 index（SearchIndex）在第一次使用时才建立，之后随每次增删改同步更新。
+    重名时的后缀计数器也一样，第一次分配名称时由已有名称建立。
+    """
+
+    def __init__(self, crypto, cache=None):
+        self.crypto = crypto  # crypto_pool.BatchCipher
+        self.cache = cache if cache is not None else PlaintextCache()
+        self.records = {}  # 名称 -> EntryRecord
+        self._index = None
+        self._index_lock = threading.RLock()  # 分块文件的条目在建立索引时会在锁内读块（见 vault_file）
+        self._next_suffix = None  # 基础名称 -> 下一个可用的 _N 后缀
+
+    @property
+    def index(self):
+        # 可能在搜索线程里首次建立，加锁避免与 GUI 线程的修改交错
+        with self._index_lock:
+            if self._index is None:
+                with TRACER.span("search.build_index"):
+                    index = SearchIndex()
+                    for name, account in self.iter_accounts():
+                        index.add(name, account)
+                self._index = index
+            return self._index
+
+    def _note_suffix(self, name):
+        base, sep, suffix = name.rpartition("_")
+        if sep and suffix.isdigit():
+            number = int(suffix) + 1
+            if number > self._next_suffix.get(base, 1):
+                self._next_suffix[base] = number
+
+    def _build_suffixes(self):
+        self._next_suffix = {}
+        for name in self:
+            self._note_suffix(name)
+
+    def unique_names(self, names):
+        # 为一批名称分配不重复的名称（同一批内部也不重复），计数器只增不减，摊还 O(1)
+        if self._next_suffix is None:
+            self._build_suffixes()
+        reserved = set()
+        result = []
+        for name in names:
+            unique = name
+            if unique in self or unique in reserved:
+                index = self._next_suffix.get(name, 1)
+                # 计数器之后的名称可能在本批中被占用，这种情况才需要继续探测
+                while f"{name}_{index}" in self or f"{name}_{index}" in reserved:
+                    index += 1
+                unique = f"{name}_{index}"
+            self._note_suffix(unique)
+            reserved.add(unique)
+            result.append(unique)
+        return result
+
+    def unique_name(self, name):
+        return self.unique_names([name])[0]
+
+    def account(self, name):
+        return self.records[name].account
+
+    def secret(self, name):
+        return self.records[name].secret
+
+    def iter_accounts(self):
+        return [(name, record.account) for name, record in list(self.records.items())]
+
+    def iter_account_batches(self, batch_size=4096):
+        # 逐批产生 [(名称, 账号)]，供不建立索引的搜索使用
+        accounts = self.iter_accounts()
+        for start in range(0, len(accounts), batch_size):
+            yield accounts[start:start + batch_size]
+
+    def search(self, query, limit=None, cancelled=None):
+        # 已建立索引时走索引，否则逐批扫描，不为一次查询建立整个索引
+        index = self._index
+        if index is not None:
+            return index.search(query, limit, cancelled)
+        return scan(self.iter_account_batches(), query, limit, cancelled)
+
+    def prefix(self, query, limit=None):
+        # 名称前缀查询，需要索引
+        return self.index.prefix(query, limit)
+
+    def get_encrypted(self, name):
+        # 返回 (账号, 加密的密码)，条目不存在时返回 None
+        try:
+            return self.account(name), self.secret(name)
+        except KeyError:
+            return None
+
+    def secrets(self, names):
+        # 批量读取 [(名称, 加密的密码)]，跳过已被删除的条目
+        result = []
+        for name in names:
+            try:
+                result.append((name, self.secret(name)))
+            except KeyError:
+                pass
+        return result
+
+    def mtime(self, name):
+        return self.records[name].mtime
+
+    def mtimes(self):
+        # 供写快照：{名称: 写入时间}，不含没有记录时间的条目
+        return {name: record.mtime for name, record in self.records.items() if record.mtime is not None}
+
+    def snapshot(self):
+        # 供写快照：({名称: 账号}, {名称: 加密的密码})
+        accounts = {}
+        secrets = {}
+        for name, record in self.records.items():
+            accounts[name] = record.account
+            secrets[name] = record.secret
+        return accounts, secrets
+
+    def password(self, name):
+        password = self.cache.get(name)
+        if password is None:
+            with TRACER.span("crypto.decrypt"):
+                password = self.crypto.cipher.decrypt(self.secret(name).encode()).decode()
+            TRACER.count("entries decrypted")
+            self.cache.put(name, password)
+        return password
+
+    def passwords(self, names):
+        # 批量读取（导出等），未命中缓存的部分并行解密，且不写入缓存以免整库明文驻留
+        names = list(names)
+        result = [self.cache.get(name) for name in names]
+        missing = [i for i, password in enumerate(result) if password is None]
+        decrypted = self.crypto.decrypt_many(self.secret(names[i]) for i in missing)
+        for i, password in zip(missing, decrypted):
+            result[i] = password
+        return result
+
+    def encrypt_password(self, password):
+        return self.crypto.cipher.encrypt(password.encode()).decode()
+
+    def set_encrypted(self, name, account, secret, password=None, mtime=None):
+        with self._index_lock:
+            record = self.records.get(name)
+            if record is None:
+                name = sys.intern(name)
+                if self._index is not None:
+                    self._index.add(name, account)
+                if self._next_suffix is not None:
+                    self._note_suffix(name)
+                self.records[name] = EntryRecord(account, secret, mtime)
+            else:
+                if self._index is not None and record.account != account:
+                    self._index.add(name, account)
+                record.account = account
+                record.secret = secret
+                record.mtime = mtime
+        if password is None:
+            self.cache.discard(name)
+        else:
+            self.cache.put(name, password)
+
+    def __getitem__(self, name):
+        return self.account(name), self.password(name)
+
+    def __setitem__(self, name, info):
+        account, password = info
+        self.set_encrypted(name, account, self.encrypt_password(password), password)
+
+    def __delitem__(self, name):
+        with self._index_lock:
+            self.records.pop(name, None)
+            if self._index is not None:
+                self._index.remove(name)
+        self.cache.discard(name)
+
+    def __contains__(self, name):
+        return name in self.records
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __len__(self):
+        return len(self.records)
@@ -0,0 +1,89 @@
+import csv
+import json
+import os
+
+from categories import ALL_CATEGORY
+from profiling import TRACER, timed
+
+EXPORT_COLUMNS = ['分组', '名称', '账号', '密码']
+EXPORT_FORMATS = {".xlsx": "Excel Files (*.xlsx)", ".csv": "CSV Files (*.csv)", ".jsonl": "JSON Lines (*.jsonl)"}
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def snapshot_categories(categories):
+    # 在 GUI 线程中调用：只复制各分组的名称列表，后台导出时不再遍历会被修改的 dict
+    return [(category, list(names)) for category, names in categories.items() if category != ALL_CATEGORY]
+
+
+def iter_export_rows(entries, category_names, batch_size=1024):
+    # 逐批生成 (分组, 名称, 账号, 密码)，每批密码并行解密，内存中最多只有一批明文
+    for category, names in category_names:
+        for start in range(0, len(names), batch_size):
+            batch = []
+            for name in names[start:start + batch_size]:
+                encrypted = entries.get_encrypted(name)
+                if encrypted is not None:  # 导出期间可能已被删除
+                    batch.append((name, *encrypted))
+            passwords = entries.crypto.decrypt_many(secret for name, account, secret in batch)
+            for (name, account, secret), password in zip(batch, passwords):
+                yield category, name, account, password
+
+
+def _count(rows, total, progress, cancelled, step=500):
+    for done, row in enumerate(rows, 1):
+        if done % step == 0:
+            if cancelled is not None and cancelled():
+                raise ExportCancelled()
+            if progress is not None:
+                progress(done, total)
+        yield row
+
+
+def write_xlsx(path, rows):
+    # openpyxl 的 write_only 模式逐行写入，内存占用不随行数增长
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('账号列表')
+    sheet.append(EXPORT_COLUMNS)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+
+
+def write_csv(path, rows):
+    # utf-8-sig 让 Excel 正确识别中文
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_COLUMNS)
+        writer.writerows(rows)
+
+
+def write_jsonl(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False))
+            f.write("\n")
+
+
+WRITERS = {".xlsx": write_xlsx, ".csv": write_csv, ".jsonl": write_jsonl}
+
+
+@timed("io.export")
+def export_rows(path, rows, total=0, progress=None, cancelled=None):
+    # 按扩展名选择格式；取消或出错时删除写了一半的文件
+    writer = WRITERS.get(os.path.splitext(path)[1].lower())
+    if writer is None:
+        raise ValueError(f"不支持的导出格式：{path}")
+    try:
+        writer(path, _count(rows, total, progress, cancelled))
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    TRACER.count("bytes written", os.path.getsize(path))
+    if progress is not None:
+        progress(total, total)
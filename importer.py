@@ -0,0 +1,115 @@
+import csv
+import json
+import os
+from urllib.parse import urlparse
+
+# 各种导出格式的列名 -> 字段，列名比较时忽略大小写和首尾空白
+# 本程序导出：分组,名称,账号,密码
+# Chrome：name,url,username,password,note
+# Firefox：url,username,password,httpRealm,formActionOrigin,guid,...
+# Bitwarden：folder,favorite,type,name,notes,fields,reprompt,login_uri,login_username,login_password,login_totp
+COLUMN_ALIASES = {
+    "category": ("分组", "folder", "group", "grouping", "category"),
+    "name": ("名称", "name", "title"),
+    "account": ("账号", "username", "login_username", "user", "account", "email", "login"),
+    "password": ("密码", "password", "login_password"),
+    "url": ("url", "login_uri", "uri", "website", "origin"),
+}
+
+
+class ImportCancelled(Exception):
+    pass
+
+
+def read_csv_rows(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        yield from csv.reader(f)
+
+
+def read_xlsx_rows(path):
+    # read_only 模式按行读取，不把整个工作簿载入内存
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            yield ["" if value is None else str(value) for value in row]
+    finally:
+        workbook.close()
+
+
+def read_jsonl_rows(path):
+    # 每行一个对象（本程序导出的 .jsonl 即 {"分组", "名称", "账号", "密码"}），第一个对象的键作为表头
+    header = None
+    with open(path, encoding="utf-8-sig") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if header is None:
+                header = list(record)
+                yield header
+            yield ["" if record.get(key) is None else str(record.get(key)) for key in header]
+
+
+READERS = {".csv": read_csv_rows, ".xlsx": read_xlsx_rows, ".jsonl": read_jsonl_rows}
+
+
+def map_columns(header):
+    columns = {}
+    normalized = [str(title).strip().lower() for title in header]
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in normalized:
+                columns[field] = normalized.index(alias)
+                break
+    if "password" not in columns or ("name" not in columns and "url" not in columns):
+        raise ValueError("无法识别的文件格式：需要包含名称（或网址）和密码列")
+    return columns
+
+
+def name_from_url(url):
+    return urlparse(url if "://" in url else "//" + url).hostname or url
+
+
+def iter_records(path):
+    # 逐行产生 (名称, 账号, 密码, 分组)，名称为空时用网址的域名代替，缺少名称或密码的行跳过
+    reader = READERS.get(os.path.splitext(path)[1].lower())
+    if reader is None:
+        raise ValueError(f"不支持的导入格式：{path}")
+    rows = reader(path)
+    columns = map_columns(next(rows, []))
+
+    def cell(row, field):
+        i = columns.get(field)
+        return row[i].strip() if i is not None and i < len(row) and row[i] else ""
+
+    for row in rows:
+        name = cell(row, "name") or name_from_url(cell(row, "url"))
+        password = cell(row, "password")
+        if name and password:
+            yield name, cell(row, "account"), password, cell(row, "category")
+
+
+def read_import_file(path, crypto, progress=None, cancelled=None, batch_size=4096):
+    # 在后台线程执行：流式解析文件，密码按批并行加密；返回 [(名称, 账号, 密文, 分组)]
+    result = []
+    batch = []
+
+    def flush():
+        secrets = crypto.encrypt_many(password for name, account, password, category in batch)
+        result.extend((name, account, secret, category)
+                      for (name, account, password, category), secret in zip(batch, secrets))
+        batch.clear()
+
+    for record in iter_records(path):
+        batch.append(record)
+        if len(batch) >= batch_size:
+            if cancelled is not None and cancelled():
+                raise ImportCancelled()
+            flush()
+            if progress is not None:
+                progress(len(result), 0)
+    flush()
+    return result
+
@@ -0,0 +1,59 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+
+class LiveSearch(QObject):
+    """
+    边输入边搜索：输入停顿 debounce_ms 毫秒后才在后台线程查询；
+    每次新查询都会让旧查询作废（代号 generation 变化），旧查询在检查点提前退出，结果也会被丢弃。
+    """
+    results_ready = pyqtSignal(int, str, list)  # 代号, 查询串, 结果名称列表
+
+    def __init__(self, search_func, debounce_ms=250, parent=None):
+        super().__init__(parent)
+        self.search_func = search_func  # search_func(query, cancelled) -> 名称列表
+        self.generation = 0
+        self._query = ""
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search")
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(debounce_ms)
+        self._timer.timeout.connect(self._submit)
+
+    def schedule(self, query):
+        # 输入变化时调用，重新开始计时
+        self._query = query.strip()
+        self.generation += 1
+        self._timer.start()
+
+    def search_now(self, query):
+        self._query = query.strip()
+        self._timer.stop()
+        self._submit()
+
+    def cancel(self):
+        self._timer.stop()
+        self.generation += 1
+
+    def is_current(self, generation):
+        return generation == self.generation
+
+    def _submit(self):
+        self.generation += 1
+        generation, query = self.generation, self._query
+        if query:
+            self._executor.submit(self._run, generation, query)
+
+    def _run(self, generation, query):
+        if not self.is_current(generation):
+            return
+        names = self.search_func(query, lambda: not self.is_current(generation))
+        if self.is_current(generation):
+            # 跨线程发射信号，槽函数会在 GUI 线程中执行
+            self.results_ready.emit(generation, query, names)
+
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,187 @@
+import base64
+import hashlib
+import json
+import math
+import os
+import time
+
+from cryptography.fernet import Fernet, InvalidToken
+
+from storage import atomic_write
+
+KDF_NAMES = ("scrypt", "argon2id", "pbkdf2")
+DEFAULT_KDF = "scrypt"
+HEADER_VERSION = 1
+
+
+class WrongPassword(Exception):
+    pass
+
+
+def _b64(data):
+    return base64.b64encode(data).decode()
+
+
+def derive_key(password, params):
+    """按头部记录的参数从主密码派生 Fernet 密钥（32 字节，urlsafe base64 编码）"""
+    password = password.encode()
+    salt = base64.b64decode(params["salt"])
+    name = params["name"]
+    if name == "scrypt":
+        n, r, p = params["n"], params["r"], params["p"]
+        raw = hashlib.scrypt(password, salt=salt, n=n, r=r, p=p, maxmem=256 * n * r + 2 ** 20, dklen=32)
+    elif name == "argon2id":
+        # cryptography 44 起提供 Argon2id，版本较旧时只能使用 scrypt / pbkdf2
+        from cryptography.hazmat.primitives.kdf.argon2 import Argon2id
+
+        raw = Argon2id(salt=salt, length=32, iterations=params["iterations"], lanes=params["lanes"],
+                       memory_cost=params["memory_cost"]).derive(password)
+    elif name == "pbkdf2":
+        raw = hashlib.pbkdf2_hmac("sha256", password, salt, params["iterations"], dklen=32)
+    else:
+        raise ValueError(f"未知的密钥派生算法：{name}")
+    return base64.urlsafe_b64encode(raw)
+
+
+def _timed(params):
+    start = time.perf_counter()
+    derive_key("calibration", params)
+    return time.perf_counter() - start
+
+
+def calibrate(name=DEFAULT_KDF, target=0.5):
+    """
+    在本机上测量一次低成本的派生，按比例放大参数，使解锁耗时接近 target 秒。
+    返回包含新随机盐的参数，有下限，机器再快也不会低于常用的安全强度。
+    """
+    params = {"name": name, "salt": _b64(os.urandom(16))}
+    if name == "scrypt":
+        # 耗时与 n 成正比，n 必须是 2 的幂；内存为 128 * n * r 字节，上限 2**18（256 MiB）
+        params.update(n=2 ** 14, r=8, p=1)
+        scale = target / _timed(params)
+        params["n"] = 2 ** min(18, max(14, 14 + round(math.log2(max(scale, 1e-9)))))
+    elif name == "argon2id":
+        params.update(iterations=1, lanes=4, memory_cost=64 * 1024)  # 64 MiB
+        scale = target / _timed(params)
+        params["iterations"] = min(64, max(2, round(scale)))
+    elif name == "pbkdf2":
+        params.update(iterations=100_000)
+        scale = target / _timed(params)
+        params["iterations"] = max(600_000, round(100_000 * scale))
+    else:
+        raise ValueError(f"未知的密钥派生算法：{name}")
+    return params
+
+
+def rekey_file(path, old_cipher, new_cipher):
+    # 整个文件是一个 Fernet 密文，只保存可以重建的状态（例如同步状态）；不存在时跳过
+    try:
+        with open(path, "rb") as f:
+            token = f.read()
+    except FileNotFoundError:
+        return
+    try:
+        data = old_cipher.decrypt(token)
+    except InvalidToken:
+        # 已是新密钥加密的（上次更换中途退出）保持不变，两个密钥都打不开的删除
+        try:
+            new_cipher.decrypt(token)
+        except InvalidToken:
+            os.remove(path)
+        return
+    atomic_write(path, new_cipher.encrypt(data))
+
+
+class VaultHeader:
+    """
+    保险库头部 vault.header：记录密钥派生参数，以及用派生出的密钥加密的数据密钥。
+    条目始终用数据密钥加密，修改主密码只需重新加密数据密钥；更换数据密钥时才需要重新加密全部条目（见 rotate）。
+    解密数据密钥同时用于校验主密码，密码错误时抛出 WrongPassword。
+    """
+
+    def __init__(self, path="vault.header"):
+        self.path = path
+        self.data = None
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        with open(self.path, "r") as f:
+            self.data = json.load(f)
+        return self
+
+    def _save(self):
+        atomic_write(self.path, json.dumps(self.data))
+
+    def unlock(self, password):
+        # 返回 (派生密钥, 数据密钥)
+        kek = derive_key(password, self.data["kdf"])
+        try:
+            data_key = Fernet(kek).decrypt(self.data["key"].encode())
+        except InvalidToken:
+            raise WrongPassword("主密码错误") from None
+        return kek, data_key
+
+    def pending_key(self, kek):
+        # 更换数据密钥中途退出时留下的新密钥，见 rotate
+        if "next_key" not in self.data:
+            return None
+        return Fernet(kek).decrypt(self.data["next_key"].encode())
+
+    def create(self, password, data_key, kdf=DEFAULT_KDF, target=0.5):
+        # 新建或修改主密码：重新标定参数并换一个盐
+        params = calibrate(kdf, target)
+        kek = derive_key(password, params)
+        self.data = {"version": HEADER_VERSION, "kdf": params, "key": Fernet(kek).encrypt(data_key).decode()}
+        self._save()
+        return kek
+
+    def rotate(self, kek, storage, new_crypto):
+        """
+        更换数据密钥：先把新密钥记入头部（next_key），由 storage.rekey 批量重新加密全部条目，
+        storage.keyed_files 中的文件也用新密钥重新加密，完成后再把它设为正式密钥。
+        中途崩溃时解锁方可以先用 key、失败再用 next_key 打开保险库。
+        """
+        cipher = Fernet(kek)
+        self.data["next_key"] = cipher.encrypt(new_crypto.key).decode()
+        self._save()
+        old_cipher = storage.crypto.cipher
+        storage.rekey(new_crypto)
+        for path in storage.keyed_files:
+            rekey_file(path, old_cipher, new_crypto.cipher)
+        self.data["key"] = self.data.pop("next_key")
+        self._save()
+
+    def finish_rotation(self, kek, data_key):
+        # 解锁时发现用 next_key 才能打开保险库，说明上次更换已写完条目，只差头部
+        self.data["key"] = Fernet(kek).encrypt(data_key).decode()
+        self.data.pop("next_key", None)
+        self._save()
+
+
+class KeyCache:
+    """在内存中保留派生出的密钥，空闲超过 timeout 秒即丢弃；有效期内再次确认主密码不需要重新派生"""
+
+    def __init__(self, timeout=300):
+        self.timeout = timeout
+        self._key = None
+        self._expires = 0
+
+    def put(self, key):
+        self._key = key
+        self._expires = time.monotonic() + self.timeout
+
+    def get(self):
+        if self._key is not None and self._expires < time.monotonic():
+            self._key = None
+        if self._key is not None:
+            self._expires = time.monotonic() + self.timeout
+        return self._key
+
+    def purge_expired(self):
+        if self._expires < time.monotonic():
+            self._key = None
+
+    def clear(self):
+        self._key = None
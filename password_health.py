@@ -0,0 +1,185 @@
+import hashlib
+import hmac
+import math
+import os
+import re
+from collections import defaultdict
+from functools import partial
+
+from categories import HEALTH_CATEGORY  # noqa: F401  界面从这里导入
+from profiling import TRACER, timed
+from storage import ENTRY_ADDED, ENTRY_CHANGED, ENTRY_REMOVED
+
+WEAK_BITS = 40  # 估计熵低于此值的密码视为弱密码
+
+COMMON_WORDS = (
+    "password", "passwd", "qwerty", "admin", "welcome", "letmein", "iloveyou", "monkey", "dragon", "master",
+    "login", "abc123", "football", "baseball", "sunshine", "princess", "shadow", "superman", "trustno",
+    "hello", "secret", "root", "test", "guest", "user", "love", "woaini", "aini",
+)
+KEYBOARD_ROWS = ("1234567890", "qwertyuiop", "asdfghjkl", "zxcvbnm")
+_LEET = str.maketrans("@4310$5!7", "aaeiossit")
+_YEAR = re.compile(r"(19|20)\d\d")
+_WORD_RANK = {word: rank for rank, word in enumerate(COMMON_WORDS, 1)}
+_COMMON = re.compile("|".join(sorted(COMMON_WORDS, key=len, reverse=True)))
+_CHARSETS = ((re.compile(r"[a-z]"), 26), (re.compile(r"[A-Z]"), 26), (re.compile(r"[0-9]"), 10),
+             (re.compile(r"[\x20-\x2f\x3a-\x40\x5b-\x60\x7b-\x7e]"), 33), (re.compile(r"[^\x00-\x7f]"), 100))
+_NAME_NOISE = re.compile(r"[\W_]+")
+_ADJACENT = {}
+for _row in KEYBOARD_ROWS:
+    for _a, _b in zip(_row, _row[1:]):
+        _ADJACENT.setdefault(_a, set()).add(_b)
+        _ADJACENT.setdefault(_b, set()).add(_a)
+
+
+class HealthCancelled(Exception):
+    pass
+
+
+def _charset_size(password):
+    return sum(size for pattern, size in _CHARSETS if pattern.search(password)) or 26
+
+
+def estimate_bits(password):
+    """
+    粗略估计密码的熵（比特）：每个字符按字符集大小计，但延续前一个字符的重复、顺序（abc、321）
+    或键盘相邻（qwer、asdf）的字符只计 1 比特；常见弱口令（含 @→a、0→o 等替换）整体只计其在词表中的位置，
+    年份只计约 7.6 比特。
+    """
+    if not password:
+        return 0.0
+    per_char = math.log2(_charset_size(password))
+    lowered = password.lower()
+    cheap = [a == b or abs(ord(a) - ord(b)) == 1 or b in _ADJACENT.get(a, ()) for a, b in zip(lowered, lowered[1:])]
+    words = list(_COMMON.finditer(lowered.translate(_LEET)))
+    years = list(_YEAR.finditer(password))
+    if not words and not years:
+        # 大多数密码没有词表中的词和年份，不必逐字符计算
+        return per_char * (len(password) - sum(cheap)) + sum(cheap)
+    costs = [per_char] + [1.0 if flag else per_char for flag in cheap]
+    for match in words:
+        costs[match.start():match.end()] = [math.log2(_WORD_RANK[match.group()] + 1)] + [0.0] * (len(match.group()) - 1)
+    for match in years:
+        costs[match.start():match.end()] = [math.log2(200)] + [0.0] * 3
+    return sum(costs)
+
+
+def _score(key, password):
+    # 在加解密线程中执行：明文（bytes）-> (带密钥的哈希, 估计熵)，明文不返回
+    return (hmac.new(key, password, hashlib.sha256).digest()[:16],
+            estimate_bits(password.decode("utf-8", "replace")))
+
+
+def account_key(name, account):
+    # 疑似重复账号：去掉重名后缀 _N 和标点、忽略大小写后名称相同，账号也相同
+    base, sep, suffix = name.rpartition("_")
+    if sep and suffix.isdigit():
+        name = base
+    return _NAME_NOISE.sub("", name.lower()), account.strip().lower()
+
+
+class PasswordHealth:
+    """
+    保险库的密码健康报告：重复使用的密码、弱密码和疑似重复的账号。
+    每个条目记一次 (带密钥的哈希, 估计熵, 账号键)，按哈希和账号键分组，不做两两比较；
+    哈希用本次会话随机生成的密钥计算（HMAC），内存中的分组表不能用于离线猜测密码。
+    条目修改后由 update 按存储的修改通知只重新计算变化的条目。
+    """
+
+    def __init__(self, entries, weak_bits=WEAK_BITS, key=None):
+        self.entries = entries
+        self.weak_bits = weak_bits
+        self._key = key or os.urandom(32)
+        self._scores = {}  # 名称 -> (哈希, 估计熵, 账号键)
+        self._by_digest = defaultdict(set)
+        self._by_account = defaultdict(set)
+
+    @timed("health.analyze")
+    def analyze(self, names=None, progress=None, cancelled=None, batch_size=4096):
+        # 账号一次批量取出（与建立搜索索引相同），不逐条查询
+        accounts = dict(self.entries.iter_accounts())
+        names = list(accounts if names is None else names)
+        for start in range(0, len(names), batch_size):
+            if cancelled is not None and cancelled():
+                raise HealthCancelled()
+            self._score_many(names[start:start + batch_size], accounts)
+            if progress is not None:
+                progress(min(start + batch_size, len(names)), len(names))
+        return self
+
+    def _score_many(self, names, accounts=None):
+        batch = self.entries.secrets(names)
+        scores = self.entries.crypto.decrypt_map(partial(_score, self._key), (secret for name, secret in batch))
+        for (name, secret), (digest, bits) in zip(batch, scores):
+            self._discard(name)
+            account = accounts.get(name) if accounts is not None else None
+            key = account_key(name, self.entries.account(name) if account is None else account)
+            self._scores[name] = (digest, bits, key)
+            self._by_digest[digest].add(name)
+            self._by_account[key].add(name)
+        TRACER.count("entries scored", len(batch))
+
+    def _discard(self, name):
+        score = self._scores.pop(name, None)
+        if score is None:
+            return
+        digest, bits, key = score
+        for groups, group_key in ((self._by_digest, digest), (self._by_account, key)):
+            group = groups[group_key]
+            group.discard(name)
+            if not group:
+                del groups[group_key]
+
+    def update(self, changes):
+        # 按修改通知（见 storage.ENTRY_ADDED 等）只重新计算新增和修改的条目
+        names = []
+        for change in changes:
+            if change[0] == ENTRY_ADDED:
+                names.append(change[1])
+            elif change[0] == ENTRY_CHANGED:
+                self._discard(change[3])
+                names.append(change[1])
+            elif change[0] == ENTRY_REMOVED:
+                self._discard(change[1])
+        if names:
+            self._score_many(names)
+
+    def reused(self):
+        # 重复使用同一密码的条目，每组一个列表，组大的在前
+        return sorted((sorted(group) for group in self._by_digest.values() if len(group) > 1), key=len, reverse=True)
+
+    def weak(self):
+        return sorted(name for name, (digest, bits, key) in self._scores.items() if bits < self.weak_bits)
+
+    def duplicates(self):
+        return [sorted(group) for group in self._by_account.values() if len(group) > 1]
+
+    def issues(self, name):
+        # 条目的问题说明，没有问题时为空字符串
+        score = self._scores.get(name)
+        if score is None:
+            return ""
+        digest, bits, key = score
+        issues = []
+        reuse = len(self._by_digest[digest])
+        if reuse > 1:
+            issues.append(f"{reuse} 个条目使用同一密码")
+        if bits < self.weak_bits:
+            issues.append(f"弱密码（约 {bits:.0f} 比特）")
+        if len(self._by_account[key]) > 1:
+            issues.append("疑似重复账号")
+        return "，".join(issues)
+
+    def flagged(self):
+        # 有问题的条目：先按组列出重复使用的，再列出弱密码和疑似重复账号，每个条目只出现一次
+        result = {}
+        for group in self.reused():
+            result.update(dict.fromkeys(group))
+        result.update(dict.fromkeys(self.weak()))
+        for group in self.duplicates():
+            result.update(dict.fromkeys(group))
+        return list(result)
+
+    def summary(self):
+        return {"reused": sum(len(group) for group in self.reused()), "weak": len(self.weak()),
+                "duplicates": sum(len(group) for group in self.duplicates())}
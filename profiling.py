@@ -0,0 +1,173 @@
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict, deque
+from contextlib import contextmanager, nullcontext
+
+
+class StartupProfile:
+    """记录启动各阶段耗时（--profile-startup），未启用时 phase() 不做任何记录"""
+
+    def __init__(self, enabled=False, start=None):
+        self.enabled = enabled
+        self.start = start if start is not None else time.perf_counter()
+        self.phases = []
+
+    def add(self, name, seconds):
+        if self.enabled:
+            self.phases.append((name, seconds))
+
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - begin))
+
+    def report(self, file=None):
+        if not self.enabled:
+            return
+        file = file or sys.stderr
+        total = time.perf_counter() - self.start
+        print("startup profile:", file=file)
+        for name, seconds in self.phases:
+            print(f"  {name:<12} {seconds * 1000:9.1f} ms", file=file)
+        print(f"  {'total':<12} {total * 1000:9.1f} ms", file=file)
+
+
+class LatencyHistogram:
+    """最近 size 次耗时的滚动窗口：按对数分桶计数，并给出分位数"""
+
+    BOUNDS_MS = (0.01, 0.1, 1, 10, 100, 1000)
+
+    def __init__(self, size=1024):
+        self.samples = deque(maxlen=size)
+        self.total = 0  # 累计次数，不随窗口滚动
+
+    def add(self, seconds):
+        self.samples.append(seconds * 1000)
+        self.total += 1
+
+    def percentile(self, q):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+    def buckets(self):
+        # [(上界毫秒或 None, 次数)]，None 表示超过最大的上界
+        counts = [0] * (len(self.BOUNDS_MS) + 1)
+        for sample in self.samples:
+            counts[bisect_left(self.BOUNDS_MS, sample)] += 1
+        return list(zip(self.BOUNDS_MS + (None,), counts))
+
+    def summary(self):
+        return {"count": self.total, "p50_ms": round(self.percentile(50), 3), "p90_ms": round(self.percentile(90), 3),
+                "p99_ms": round(self.percentile(99), 3), "max_ms": round(max(self.samples, default=0.0), 3)}
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "begin")
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.begin = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.tracer.record(self.name, self.begin, time.perf_counter())
+
+
+class Tracer:
+    """
+    热点路径的计时和计数，通过 --trace 或调试面板（Ctrl+Shift+D）开启。
+    未开启时 span() 直接返回共享的空上下文，count() 只检查一次 enabled，几乎没有开销。
+    开启后每段计时进入按名称分开的 LatencyHistogram，并保留最近 max_events 个事件，
+    dump() 写出 Chrome 的 trace 格式（chrome://tracing 或 Perfetto 可直接打开）。
+    """
+
+    def __init__(self, max_events=100_000):
+        self.enabled = False
+        self.counters = defaultdict(int)
+        self.histograms = defaultdict(LatencyHistogram)
+        self.events = deque(maxlen=max_events)
+        self.origin = time.perf_counter()
+        self._lock = threading.Lock()  # 加解密、搜索和保存都在各自的线程中记录
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.events.clear()
+
+    def span(self, name):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def record(self, name, begin, end):
+        with self._lock:
+            self.histograms[name].add(end - begin)
+            self.events.append(("X", name, begin, end - begin, threading.get_ident()))
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] += n
+            self.events.append(("C", name, time.perf_counter(), self.counters[name], threading.get_ident()))
+
+    def summary(self):
+        with self._lock:
+            return {"counters": dict(self.counters),
+                    "latency": {name: histogram.summary() for name, histogram in sorted(self.histograms.items())}}
+
+    def trace_events(self):
+        pid = os.getpid()
+        with self._lock:
+            events = list(self.events)
+        result = []
+        for phase, name, begin, value, tid in events:
+            event = {"name": name, "ph": phase, "ts": round((begin - self.origin) * 1e6, 1), "pid": pid, "tid": tid}
+            if phase == "X":
+                event["dur"] = round(value * 1e6, 1)
+            else:
+                event["args"] = {name: value}
+            result.append(event)
+        return result
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms",
+                       "otherData": self.summary()}, f)
+
+
+_NULL_SPAN = nullcontext()
+TRACER = Tracer()
+
+
+def timed(name):
+    """装饰器：开启追踪时把函数的每次调用计为一段 name；不要用在直接连接到带参数信号的槽上"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not TRACER.enabled:
+                return func(*args, **kwargs)
+            with _Span(TRACER, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,70 @@
+import threading
+import time
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+
+class SaveWorker(QThread):
+    """
+    保存线程：修改在 GUI 线程中只应用到内存并排队，由本线程写入存储后端。
+    连续的修改会合并：最后一次修改后 delay 秒内没有新修改（或距第一次未保存的修改已过 max_delay 秒）才写一次。
+    status_changed 报告 "saving" / "saved"，写入失败时发出 failed，记录留在队列中，下次修改或 stop 时重试。
+    """
+    status_changed = pyqtSignal(str)
+    failed = pyqtSignal(object)
+
+    def __init__(self, storage, delay=0.3, max_delay=2.0, parent=None):
+        super().__init__(parent)
+        self.storage = storage
+        self.delay = delay
+        self.max_delay = max_delay
+        self._condition = threading.Condition()
+        self._dirty_since = None
+        self._last_change = None
+        self._stopping = False
+
+    def start(self):
+        self._stopping = False
+        self.storage.on_dirty = self.mark_dirty
+        super().start()
+
+    def mark_dirty(self):
+        with self._condition:
+            now = time.monotonic()
+            if self._dirty_since is None:
+                self._dirty_since = now
+            self._last_change = now
+            self._condition.notify()
+
+    def _wait_for_batch(self):
+        # 返回 False 表示应当退出
+        with self._condition:
+            while self._dirty_since is None and not self._stopping:
+                self._condition.wait()
+            while self._dirty_since is not None and not self._stopping:
+                deadline = min(self._last_change + self.delay, self._dirty_since + self.max_delay)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            if self._dirty_since is None:
+                return False
+            self._dirty_since = None
+            return True
+
+    def run(self):
+        while self._wait_for_batch():
+            self.status_changed.emit("saving")
+            try:
+                self.storage.flush()
+            except Exception as e:
+                self.failed.emit(e)
+            else:
+                self.status_changed.emit("saved")
+
+    def stop(self):
+        # 退出前调用：立即写入排队的修改并等待线程结束
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        self.wait()
@@ -0,0 +1,173 @@
+import threading
+from array import array
+from collections import defaultdict
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _lower(text):
+    # 已经是小写时复用原字符串，不再多存一份
+    lowered = text.lower()
+    return text if lowered == text else lowered
+
+
+def _new_posting():
+    return array("I")
+
+
+def rank(query, name, name_lower, account_lower):
+    # 名称完全相同 > 名称前缀 > 名称包含 > 账号前缀 > 账号包含，同级按匹配位置、名称长度排序
+    if name_lower == query:
+        return 0, 0, len(name), name
+    position = name_lower.find(query)
+    if position == 0:
+        return 1, 0, len(name), name
+    if position > 0:
+        return 2, position, len(name), name
+    position = account_lower.find(query)
+    if position == 0:
+        return 3, 0, len(name), name
+    return 4, position, len(name), name
+
+
+def scan(batches, query, limit=None, cancelled=None):
+    """
+    不建立索引的搜索：batches 逐批产生 [(名称, 账号)]，用完即丢，结果与 SearchIndex.search 的排序相同。
+    用于还没有索引的保险库（例如跨保险库搜索），不必为一次查询把全部账号留在内存中。
+    """
+    query = query.lower()
+    ranked = []
+    for batch in batches:
+        if cancelled is not None and cancelled():
+            return []
+        for name, account in batch:
+            name_lower, account_lower = name.lower(), account.lower()
+            if query in name_lower or query in account_lower:
+                ranked.append(rank(query, name, name_lower, account_lower))
+    ranked.sort()
+    if limit is not None:
+        ranked = ranked[:limit]
+    return [item[-1] for item in ranked]
+
+
+class SearchIndex:
+    """
+    名称与账号的内存搜索索引（均按小写保存）：
+    每个条目有一个整数编号，三元组倒排表是只追加的 array('I')（每项 4 字节，而不是集合中的对象引用）。
+    长度 >= 3 的查询取最短的倒排表逐个校验子串，更短的查询在预先小写的文本上扫描，前缀查询（prefix）同样如此；
+    删除只把编号标记为空，空号过多时整体重建。
+    内部加锁，可以在后台线程查询的同时由 GUI 线程更新。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = {}  # 名称 -> 编号
+        self._names = []  # 编号 -> 名称，已删除的为 None
+        self._texts = []  # 编号 -> (小写名称, 小写账号)，已删除的为 None
+        self._postings = defaultdict(_new_posting)  # 三元组 -> 编号数组
+        self._dead = 0
+
+    def add(self, name, account):
+        with self._lock:
+            self._add(name, account)
+
+    def _add(self, name, account):
+        if name in self._ids:
+            self._remove(name)
+        name_lower, account_lower = _lower(name), _lower(account)
+        entry_id = len(self._names)
+        self._ids[name] = entry_id
+        self._names.append(name)
+        self._texts.append((name_lower, account_lower))
+        for gram in trigrams(name_lower) | trigrams(account_lower):
+            self._postings[gram].append(entry_id)
+
+    def remove(self, name):
+        with self._lock:
+            self._remove(name)
+
+    def _remove(self, name):
+        entry_id = self._ids.pop(name, None)
+        if entry_id is None:
+            return
+        self._names[entry_id] = None
+        self._texts[entry_id] = None
+        self._dead += 1
+        if self._dead > max(1024, len(self._names) // 2):
+            self._rebuild()
+
+    def _rebuild(self):
+        # 去掉已删除的编号，倒排表重新生成
+        live = [(name, texts) for name, texts in zip(self._names, self._texts) if name is not None]
+        self._ids = {}
+        self._names = []
+        self._texts = []
+        self._postings = defaultdict(_new_posting)
+        self._dead = 0
+        for entry_id, (name, (name_lower, account_lower)) in enumerate(live):
+            self._ids[name] = entry_id
+            self._names.append(name)
+            self._texts.append((name_lower, account_lower))
+            for gram in trigrams(name_lower) | trigrams(account_lower):
+                self._postings[gram].append(entry_id)
+
+    def clear(self):
+        with self._lock:
+            self._ids = {}
+            self._names = []
+            self._texts = []
+            self._postings = defaultdict(_new_posting)
+            self._dead = 0
+
+    def _candidates(self, query):
+        # 候选编号：短查询为全部编号，否则为查询中各三元组里最短的倒排表（之后逐个校验子串）
+        if len(query) < 3:
+            return range(len(self._names))
+        shortest = None
+        for gram in trigrams(query):
+            posting = self._postings.get(gram)
+            if not posting:
+                return ()
+            if shortest is None or len(posting) < len(shortest):
+                shortest = posting
+        return shortest
+
+    def search(self, query, limit=None, cancelled=None):
+        # 返回名称或账号包含 query 的条目名称，按相关度排序；cancelled() 为真时提前返回空列表
+        query = query.lower()
+        ranked = []
+        with self._lock:
+            texts = self._texts
+            for i, entry_id in enumerate(self._candidates(query)):
+                if cancelled is not None and i % 4096 == 0 and cancelled():
+                    return []
+                entry = texts[entry_id]
+                if entry is None:
+                    continue
+                name_lower, account_lower = entry
+                if query in name_lower or query in account_lower:
+                    ranked.append(rank(query, self._names[entry_id], name_lower, account_lower))
+        ranked.sort()
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [item[-1] for item in ranked]
+
+    def prefix(self, query, limit=None):
+        # 名称以 query 开头的条目（不区分大小写），按名称排序；候选与 search 相同，来自倒排表
+        query = query.lower()
+        matched = []
+        with self._lock:
+            texts = self._texts
+            for entry_id in self._candidates(query):
+                entry = texts[entry_id]
+                if entry is not None and entry[0].startswith(query):
+                    matched.append((entry[0], self._names[entry_id]))
+        matched.sort()
+        if limit is not None:
+            matched = matched[:limit]
+        return [name for name_lower, name in matched]
+
+    def __len__(self):
+        return len(self._ids)
@@ -0,0 +1,267 @@
+import os
+import sqlite3
+import sys
+import threading
+
+from categories import ALL_CATEGORY, UNGROUPED_CATEGORY, CategoryStore
+from entry_store import EntryRecord, LazyEntries
+from profiling import TRACER, timed
+from storage import VaultBackend
+
+KEY_CHECK = "pwmanager"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS categories (position INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS entries (
+    name TEXT PRIMARY KEY,
+    category TEXT NOT NULL,
+    account TEXT NOT NULL,
+    secret TEXT NOT NULL,
+    mtime REAL
+);
+CREATE INDEX IF NOT EXISTS entries_category ON entries (category);
+"""
+
+
+class SqliteEntries(LazyEntries):
+    """
+    SQLite 后端的条目集合：加载时只读名称，记录中的账号为 None，第一次显示或搜索时才从数据库读出并解密；
+    密码的密文每次用到时按主键查询，只有还没写入数据库的暂存在记录中（写入后清空，见 SqliteBackend._saved）。
+    """
+
+    def __init__(self, crypto, backend, cache=None):
+        super().__init__(crypto, cache)
+        self.backend = backend
+
+    def add_name(self, name, mtime=None):
+        self.records[sys.intern(name)] = EntryRecord(None, None, mtime)
+
+    def account(self, name):
+        record = self.records[name]
+        if record.account is None:
+            row = self.backend.fetch(name)
+            if row is None:
+                raise KeyError(name)
+            record.account = self.crypto.cipher.decrypt(row[0].encode()).decode()
+            TRACER.count("entries decrypted")
+        return record.account
+
+    def secret(self, name):
+        secret = self.records[name].secret
+        if secret is None:
+            row = self.backend.fetch(name)
+            if row is None:
+                raise KeyError(name)
+            secret = row[1]
+        return secret
+
+    def iter_accounts(self):
+        # 建立搜索索引时一次性批量解密尚未解密的账号
+        records = list(self.records.items())
+        rows = self.backend.fetch_accounts([name for name, record in records if record.account is None])
+        for (name, token), account in zip(rows, self.crypto.decrypt_many(token for name, token in rows)):
+            record = self.records.get(name)
+            if record is not None and record.account is None:
+                record.account = account
+        return [(name, record.account) for name, record in records if record.account is not None]
+
+    def secrets(self, names):
+        # 还没写入数据库的密文在记录中，其余按批查询，不逐条访问数据库
+        result = {}
+        missing = []
+        for name in names:
+            record = self.records.get(name)
+            if record is None:
+                continue
+            if record.secret is not None:
+                result[name] = record.secret
+            else:
+                missing.append(name)
+        result.update(self.backend.fetch_column("secret", missing))
+        return [(name, result[name]) for name in names if name in result]
+
+    def iter_account_batches(self, batch_size=4096):
+        # 已解密的账号直接用，其余按批从数据库读出并解密，不写回记录
+        records = list(self.records.items())
+        yield [(name, record.account) for name, record in records if record.account is not None]
+        missing = [name for name, record in records if record.account is None]
+        for start in range(0, len(missing), batch_size):
+            rows = self.backend.fetch_accounts(missing[start:start + batch_size])
+            yield list(zip((name for name, token in rows), self.crypto.decrypt_many(token for name, token in rows)))
+
+
+class SqliteBackend(VaultBackend):
+    """
+    SQLite 后端（WAL 模式）：每个条目一行，名称和分组为明文并建有索引，账号和密码分别用 Fernet 加密，
+    另有写入时间 mtime（较早写入的行为 NULL）。
+    一次修改就是一个事务，不需要重写整个文件，也不需要把整个保险库读进内存。
+    """
+
+    def __init__(self, crypto, path="vault.db"):
+        super().__init__(crypto)
+        self.path = path
+        self.db = None
+        self._lock = threading.Lock()  # 连接会在加载线程、搜索线程和界面线程中使用
+
+    def new_entries(self):
+        return SqliteEntries(self.crypto, self)
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def files(self):
+        return [self.path, self.path + "-wal", self.path + "-shm"]
+
+    def _connect(self):
+        if self.db is None:
+            self.db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=FULL")
+            self.db.executescript(SCHEMA)
+            # 较早的数据库没有 mtime 列，加在最后，与 SCHEMA 中的列顺序一致
+            if "mtime" not in [row[1] for row in self.db.execute("PRAGMA table_info(entries)")]:
+                self.db.execute("ALTER TABLE entries ADD COLUMN mtime REAL")
+        return self.db
+
+    @timed("storage.load")
+    def load(self):
+        with self._lock:
+            db = self._connect()
+            row = db.execute("SELECT value FROM meta WHERE key = 'key_check'").fetchone()
+            if row is None:
+                db.execute("INSERT INTO meta VALUES ('key_check', ?)",
+                           (self.crypto.cipher.encrypt(KEY_CHECK.encode()).decode(),))
+            else:
+                # 密钥不对时在这里抛出 InvalidToken，而不是在第一次显示密码时
+                self.crypto.cipher.decrypt(row[0].encode())
+
+            self.entries = self.new_entries()
+            self.categories = CategoryStore()
+            for name, in db.execute("SELECT name FROM categories ORDER BY position"):
+                self.categories.add_category(name)
+            for name, category, mtime in db.execute("SELECT name, category, mtime FROM entries"):
+                self.entries.add_name(name, mtime)
+                self.categories.assign(name, category)
+        self._check_consistency()
+        return self.entries, self.categories
+
+    def fetch(self, name):
+        with self._lock:
+            return self.db.execute("SELECT account, secret FROM entries WHERE name = ?", (name,)).fetchone()
+
+    def fetch_accounts(self, names, chunk_size=500):
+        return self.fetch_column("account", names, chunk_size)
+
+    def fetch_column(self, column, names, chunk_size=500):
+        # 返回 [(名称, 账号或密码的密文)]，column 只能是 "account" 或 "secret"
+        assert column in ("account", "secret")
+        rows = []
+        with self._lock:
+            for start in range(0, len(names), chunk_size):
+                chunk = names[start:start + chunk_size]
+                rows.extend(self.db.execute(
+                    f"SELECT name, {column} FROM entries WHERE name IN ({','.join('?' * len(chunk))})", chunk))
+        return rows
+
+    @timed("io.sqlite_commit")
+    def _persist(self, records):
+        puts = [record for record in records if record["op"] == "put"]
+        accounts = iter(self.crypto.encrypt_many(record["account"] for record in puts))
+        with self._lock:
+            db = self.db
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                for record in records:
+                    self._write(db, record, accounts)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        TRACER.count("rows written", len(records))
+
+    def _write(self, db, record, accounts):
+        op = record["op"]
+        if op == "put":
+            category = record["category"]
+            if category == ALL_CATEGORY:
+                category = UNGROUPED_CATEGORY
+            if record.get("old") not in (None, record["name"]):
+                db.execute("DELETE FROM entries WHERE name = ?", (record["old"],))
+            db.execute("INSERT OR IGNORE INTO categories (name) VALUES (?)", (category,))
+            db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                       (record["name"], category, next(accounts), record["secret"], record.get("mtime")))
+        elif op == "delete":
+            db.execute("DELETE FROM entries WHERE name = ?", (record["name"],))
+        elif op == "add_category":
+            db.execute("INSERT OR IGNORE INTO categories (name) VALUES (?)", (record["category"],))
+        elif op == "rename_category":
+            old, new = record["old"], record["category"]
+            # 与 CategoryStore.rename_category 的规则一致；按数据库中的状态判断，内存可能已经领先
+            if (self._has_category(db, old) and not self._has_category(db, new)
+                    and old not in (ALL_CATEGORY, UNGROUPED_CATEGORY)):
+                db.execute("UPDATE categories SET name = ? WHERE name = ?", (new, old))
+                db.execute("UPDATE entries SET category = ? WHERE category = ?", (new, old))
+        elif op == "delete_category":
+            category = record["category"]
+            if self._has_category(db, category) and category not in (ALL_CATEGORY, UNGROUPED_CATEGORY):
+                db.execute("DELETE FROM categories WHERE name = ?", (category,))
+                db.execute("INSERT OR IGNORE INTO categories (name) VALUES (?)", (UNGROUPED_CATEGORY,))
+                db.execute("UPDATE entries SET category = ? WHERE category = ?", (UNGROUPED_CATEGORY, category))
+
+    @staticmethod
+    def _has_category(db, category):
+        return db.execute("SELECT 1 FROM categories WHERE name = ?", (category,)).fetchone() is not None
+
+    def _saved(self, records):
+        # 已写入数据库的密文不再暂存在内存中
+        with self.state_lock:
+            for record in records:
+                if record["op"] != "put":
+                    continue
+                entry = self.entries.records.get(record["name"])
+                if entry is not None and entry.secret == record["secret"]:
+                    entry.secret = None
+
+    def compact(self):
+        # 把 WAL 合并回主数据库文件
+        with self._lock:
+            self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def rekey(self, new_crypto, chunk_size=4096):
+        # 分批读出账号和密码密文，旧密钥批量解密、新密钥批量加密，在一个事务中写回
+        with self.flush_lock:
+            self.flush()
+            self._rekey(new_crypto, chunk_size)
+
+    def _rekey(self, new_crypto, chunk_size):
+        with self._lock:
+            db = self.db
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                # 按主键分页读取，内存中最多只有一批
+                last = None
+                while True:
+                    chunk = db.execute("SELECT name, account, secret FROM entries WHERE ?1 IS NULL OR name > ?1 "
+                                       "ORDER BY name LIMIT ?2", (last, chunk_size)).fetchall()
+                    if not chunk:
+                        break
+                    last = chunk[-1][0]
+                    accounts = new_crypto.encrypt_many(self.crypto.decrypt_many(row[1] for row in chunk))
+                    secrets = new_crypto.encrypt_many(self.crypto.decrypt_many(row[2] for row in chunk))
+                    db.executemany("UPDATE entries SET account = ?, secret = ? WHERE name = ?",
+                                   [(account, secret, row[0]) for row, account, secret in zip(chunk, accounts, secrets)])
+                db.execute("UPDATE meta SET value = ? WHERE key = 'key_check'",
+                           (new_crypto.cipher.encrypt(KEY_CHECK.encode()).decode(),))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        self.crypto = new_crypto
+        self.entries.crypto = new_crypto
+
+    def close(self):
+        with self._lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
@@ -0,0 +1,476 @@
+import os
+import json
+import threading
+import time
+
+from categories import ALL_CATEGORY, UNGROUPED_CATEGORY, CategoryStore, category_name
+from entry_store import LazyEntries
+from profiling import TRACER, timed
+
+SNAPSHOT_VERSION = 2
+
+# 修改通知（见 VaultBackend.on_change），每个事件是一个元组，第一项为类型：
+ENTRY_ADDED = "entry_added"  # (类型, 名称, 分组)
+ENTRY_CHANGED = "entry_changed"  # (类型, 名称, 分组, 原名称, 原分组)，未改名时原名称即名称
+ENTRY_REMOVED = "entry_removed"  # (类型, 名称, 分组)
+CATEGORY_CHANGED = "category_changed"  # (类型, 原分组名, 新分组名)，新增时原分组名为 None，删除时新分组名为 None
+
+
+def fsync_dir(path):
+    # Windows 不能对目录 fsync，只在 POSIX 上执行
+    if os.name != "posix":
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@timed("io.atomic_write")
+def atomic_write(path, data):
+    # 先写临时文件并 fsync，再用 os.replace 原子替换，崩溃时旧文件保持完整；data 可以是 str 或 bytes
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb" if isinstance(data, bytes) else "w") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    fsync_dir(path)
+    TRACER.count("bytes written", len(data))
+
+
+class VaultBackend:
+    """
+    保险库存储后端的公共部分：内存中的条目（LazyEntries）和分组（CategoryStore），以及各种修改记录的含义。
+    子类负责把记录持久化（_persist）并实现 load / compact / rekey。
+    所有修改都表示为幂等的记录：put（可带 old 表示改名）、delete、add_category、rename_category、delete_category。
+    记录中的分组名经过 categories.category_name，与虚拟分组同名的分组在写入时就已改名。
+    put 记录带有写入时间 mtime，随条目一起保存（LazyEntries.mtime），同步时按它判断哪一方的修改更新。
+    默认先持久化再应用到内存；设置了 on_dirty 之后改为先应用到内存、记录进入队列，
+    由保存线程调用 flush 一次写入（见 save_worker.SaveWorker）。
+    设置了 on_change 时，每次提交后在调用线程中以事件列表（ENTRY_ADDED 等）通知发生的变化，
+    界面据此只更新受影响的行；加载时重放日志不产生通知。
+    """
+
+    def __init__(self, crypto):
+        self.crypto = crypto  # crypto_pool.BatchCipher，批量加解密走线程池
+        self.entries = self.new_entries()
+        self.categories = CategoryStore()
+        self.on_dirty = None
+        self.on_change = None
+        self.keyed_files = []  # 目录中其他用数据密钥整体加密的文件（例如 sync.dat），更换数据密钥时一起重新加密
+        self._changes = None  # 提交期间收集的事件
+        self.state_lock = threading.RLock()  # 保护内存状态和待写队列，保存线程读取快照时持有
+        self.flush_lock = threading.RLock()  # 保证同一时间只有一个线程在写文件，记录按顺序落盘
+        self._pending = []
+
+    def new_entries(self):
+        return LazyEntries(self.crypto)
+
+    def load(self):
+        raise NotImplementedError
+
+    def compact(self):
+        pass
+
+    def rekey(self, new_crypto):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def files(self):
+        # 后端使用的全部文件，迁移到其他后端后改名停用
+        return []
+
+    def _persist(self, records):
+        raise NotImplementedError
+
+    def _commit(self, records, password=None):
+        changes = self._changes = [] if self.on_change is not None else None
+        try:
+            if self.on_dirty is None:
+                self._commit_now(records, password)
+            else:
+                with self.state_lock:
+                    for record in records:
+                        self._apply(record, password)
+                    self._pending.extend(records)
+        finally:
+            self._changes = None
+        if self.on_dirty is not None:
+            self.on_dirty()
+        if changes:
+            self.on_change(changes)
+
+    def _commit_now(self, records, password=None):
+        self._persist(records)
+        for record in records:
+            self._apply(record, password)
+        self._saved(records)
+
+    def _saved(self, records):
+        pass
+
+    def has_pending(self):
+        with self.state_lock:
+            return bool(self._pending)
+
+    @timed("storage.flush")
+    def flush(self):
+        # 把队列中的记录作为一批写入；失败时放回队列，下次 flush 重试
+        with self.flush_lock:
+            with self.state_lock:
+                records, self._pending = self._pending, []
+            if not records:
+                return 0
+            try:
+                self._flush_records(records)
+            except BaseException:
+                with self.state_lock:
+                    self._pending[:0] = records
+                raise
+            self._saved(records)
+            return len(records)
+
+    def _flush_records(self, records):
+        self._persist(records)
+
+    def _check_consistency(self):
+        # 每个条目恰好属于一个分组，分组里也不留已删除的名称
+        for name in [name for name in self.categories[ALL_CATEGORY] if name not in self.entries]:
+            self.categories.remove(name)
+        for name in self.entries:
+            if not self.categories.contains_name(name):
+                self.categories.assign(name, UNGROUPED_CATEGORY)
+
+    def _apply(self, record, password=None):
+        op = record["op"]
+        changes = self._changes
+        if op == "put":
+            name, category = record["name"], record["category"]
+            if changes is not None:
+                self._describe_put(name, category, record.get("old"), changes)
+            old_name = record.get("old")
+            if old_name is not None and old_name != name:
+                self._remove(old_name)
+            self.entries.set_encrypted(name, record["account"], record["secret"], password, record.get("mtime"))
+            self.categories.assign(name, category)
+        elif op == "delete":
+            if changes is not None and record["name"] in self.entries:
+                changes.append((ENTRY_REMOVED, record["name"], self.categories.category_of(record["name"])))
+            self._remove(record["name"])
+        elif op == "add_category":
+            if changes is not None and record["category"] not in self.categories:
+                changes.append((CATEGORY_CHANGED, None, record["category"]))
+            self.categories.add_category(record["category"])
+        elif op == "rename_category":
+            if self.categories.rename_category(record["old"], record["category"]) and changes is not None:
+                changes.append((CATEGORY_CHANGED, record["old"], record["category"]))
+        elif op == "delete_category":
+            if self.categories.delete_category(record["category"]) and changes is not None:
+                changes.append((CATEGORY_CHANGED, record["category"], None))
+
+    def _describe_put(self, name, category, old_name, changes):
+        # 在应用 put 之前按当前状态生成事件
+        if category == ALL_CATEGORY:
+            category = UNGROUPED_CATEGORY
+        if category not in self.categories:
+            changes.append((CATEGORY_CHANGED, None, category))
+        if old_name is None or old_name == name or old_name not in self.entries:
+            old_name = name
+        elif name in self.entries:
+            # 改名覆盖了另一个已有条目
+            changes.append((ENTRY_REMOVED, name, self.categories.category_of(name)))
+        if old_name in self.entries:
+            changes.append((ENTRY_CHANGED, name, category, old_name, self.categories.category_of(old_name)))
+        else:
+            changes.append((ENTRY_ADDED, name, category))
+
+    def _remove(self, name):
+        if name in self.entries:
+            del self.entries[name]
+        self.categories.remove(name)
+
+    def put(self, name, info, category, old_name=None):
+        account, password = info
+        record = {"op": "put", "name": name, "account": account, "secret": self.entries.encrypt_password(password),
+                  "category": category_name(category), "mtime": time.time()}
+        if old_name is not None:
+            record["old"] = old_name
+        self._commit([record], password)
+
+    def put_many(self, items):
+        # 批量写入 [(名称, 账号, 已加密的密码, 分组[, 修改时间])]，作为一次提交；
+        # 修改时间省略时为当前时间，迁移和同步时沿用条目原来的时间
+        now = time.time()
+        records = [{"op": "put", "name": item[0], "account": item[1], "secret": item[2],
+                    "category": category_name(item[3]), "mtime": item[4] if len(item) > 4 else now} for item in items]
+        if records:
+            self._commit(records)
+
+    def delete(self, name):
+        self._commit([{"op": "delete", "name": name}])
+
+    def delete_many(self, names):
+        # 批量删除，作为一次提交
+        records = [{"op": "delete", "name": name} for name in names]
+        if records:
+            self._commit(records)
+
+    def add_category(self, category):
+        self._commit([{"op": "add_category", "category": category_name(category)}])
+
+    def rename_category(self, old, new):
+        self._commit([{"op": "rename_category", "old": old, "category": category_name(new)}])
+
+    def delete_category(self, category):
+        self._commit([{"op": "delete_category", "category": category}])
+
+
+class VaultStorage(VaultBackend):
+    """
+    JSON 文件后端，追加写：
+    entries.dat / categories.dat 为快照，entries.journal 为加密的操作日志。
+    每次修改只加密并追加一条记录，日志过长时再合并进快照。
+
+    entries.dat 快照格式：{"version": 2, "index": 加密的 {名称: 账号}, "secrets": {名称: 加密的密码},
+    "mtimes": 加密的 {名称: 写入时间}}（较早的快照没有 mtimes），
+    启动时只需解密一次 index 和 mtimes，密码在首次读取时才解密。旧版的 {名称: 加密的[账号, 密码]} 会在加载后迁移。
+    """
+
+    def __init__(self, crypto, entries_path="entries.dat", categories_path="categories.dat",
+                 journal_path="entries.journal", compact_min_records=500):
+        super().__init__(crypto)
+        self.entries_path = entries_path
+        self.categories_path = categories_path
+        self.journal_path = journal_path
+        self.compact_min_records = compact_min_records
+        self.journal_records = 0
+        self.damaged_journal = None  # 日志中间有损坏的记录时，移到一旁保留的原日志路径
+
+    def exists(self):
+        return os.path.exists(self.entries_path) or os.path.exists(self.journal_path)
+
+    def files(self):
+        return [path for path in (self.entries_path, self.categories_path, self.journal_path) if path]
+
+    @timed("storage.load")
+    def load(self):
+        self.entries = self.new_entries()
+        self.categories = CategoryStore()
+        legacy = self._read_snapshot()
+        self._replay_journal()
+        self._check_consistency()
+        if legacy or self.damaged_journal or self.journal_records > self._compact_threshold():
+            self.compact()
+        return self.entries, self.categories
+
+    def _read_snapshot(self):
+        # 读入快照，返回是否为需要立即转换的旧版格式
+        legacy = False
+        try:
+            with open(self.entries_path, "r") as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            snapshot = {}
+
+        if isinstance(snapshot.get("version"), int):
+            accounts = json.loads(self.crypto.cipher.decrypt(snapshot["index"].encode()).decode())
+            mtimes = {}
+            if "mtimes" in snapshot:
+                mtimes = json.loads(self.crypto.cipher.decrypt(snapshot["mtimes"].encode()).decode())
+            for name, account in accounts.items():
+                self.entries.set_encrypted(name, account, snapshot["secrets"][name], mtime=mtimes.get(name))
+        else:
+            # 旧版格式：每个条目是一个加密的 [账号, 密码]，需要全部解密一次再按新格式保存
+            infos = [json.loads(info) for info in self.crypto.decrypt_many(snapshot.values())]
+            secrets = self.crypto.encrypt_many(password for account, password in infos)
+            for name, (account, password), secret in zip(snapshot, infos, secrets):
+                self.entries.set_encrypted(name, account, secret)
+            legacy = bool(snapshot)
+
+        try:
+            with open(self.categories_path, "r") as f:
+                self.categories = CategoryStore.from_json(json.load(f))
+        except FileNotFoundError:
+            pass
+        return legacy
+
+    def _replay_journal(self):
+        self.journal_records = 0
+        self.damaged_journal = None
+        try:
+            f = open(self.journal_path, "rb")
+        except FileNotFoundError:
+            return
+
+        with f:
+            lines = f.readlines()
+        records = self.crypto.decrypt_many((line.rstrip(b"\n") for line in lines), strict=False)
+        parsed = []
+        for record in records:
+            try:
+                parsed.append(json.loads(record))
+            except (TypeError, ValueError):
+                parsed.append(None)
+
+        # 每条记录追加后都 fsync，崩溃只会留下写了一半的最后一行，只有这种情况截掉
+        if parsed and parsed[-1] is None:
+            torn = len(lines[-1])
+            lines.pop()
+            parsed.pop()
+        else:
+            torn = 0
+        if None in parsed:
+            # 中间的记录损坏不是崩溃造成的：日志原样移到一旁保留，其余记录照常应用，加载后立即写快照
+            self.damaged_journal = f"{self.journal_path}.corrupt-{int(time.time())}"
+            os.replace(self.journal_path, self.damaged_journal)
+            TRACER.count("journal records damaged", parsed.count(None))
+        elif torn:
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(os.path.getsize(self.journal_path) - torn)
+                f.flush()
+                os.fsync(f.fileno())
+
+        for record in parsed:
+            if record is not None:
+                self._apply(record)
+                self.journal_records += 1
+
+    def _compact_threshold(self):
+        return max(self.compact_min_records, len(self.entries) // 10)
+
+    def _commit_now(self, records, password=None):
+        if len(records) > 1 and self.journal_records + len(records) > self._compact_threshold():
+            # 大批量写入（导入）反正要触发合并，直接写快照，不再逐条写日志
+            for record in records:
+                self._apply(record)
+            self.compact()
+            return
+        self._append(records)
+        for record in records:
+            self._apply(record, password)
+        self.journal_records += len(records)
+        if self.journal_records > self._compact_threshold():
+            self.compact()
+
+    def _flush_records(self, records):
+        # 记录已在内存中生效，与 _commit_now 相同的合并策略
+        if len(records) > 1 and self.journal_records + len(records) > self._compact_threshold():
+            self.compact()
+            return
+        self._append(records)
+        self.journal_records += len(records)
+        if self.journal_records > self._compact_threshold():
+            self.compact()
+
+    @timed("io.journal_append")
+    def _append(self, records):
+        # 多条记录一次写入、一次 fsync
+        lines = self.crypto.encrypt_many(json.dumps(record) for record in records)
+        data = "".join(line + "\n" for line in lines).encode()
+        is_new = not os.path.exists(self.journal_path)
+        with open(self.journal_path, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        TRACER.count("bytes written", len(data))
+        if is_new:
+            fsync_dir(self.journal_path)
+
+    @timed("storage.compact")
+    def compact(self):
+        # 先写快照，最后再清空日志；中途崩溃时日志重放到新快照上结果不变
+        with self.flush_lock:
+            with self.state_lock:
+                # 只在锁内复制，加密和写文件在锁外；快照已包含队列中尚未写入的记录
+                accounts, secrets = self.entries.snapshot()
+                mtimes = self.entries.mtimes()
+                categories = self.categories.to_json()
+                covered, self._pending = self._pending, []
+            try:
+                self._write_snapshot(accounts, secrets, categories, mtimes)
+                with open(self.journal_path, "wb") as f:
+                    f.flush()
+                    os.fsync(f.fileno())
+            except BaseException:
+                with self.state_lock:
+                    self._pending[:0] = covered
+                raise
+            self.journal_records = 0
+
+    def _write_snapshot(self, accounts, secrets, categories, mtimes):
+        index = self.crypto.cipher.encrypt(json.dumps(accounts).encode()).decode()
+        mtimes = self.crypto.cipher.encrypt(json.dumps(mtimes).encode()).decode()
+        snapshot = {"version": SNAPSHOT_VERSION, "index": index, "secrets": secrets, "mtimes": mtimes}
+        atomic_write(self.entries_path, json.dumps(snapshot))
+        atomic_write(self.categories_path, json.dumps(categories))
+
+    def rekey(self, new_crypto):
+        # 用旧密钥批量解密全部密码，再用新密钥批量加密，最后写出新快照并清空旧密钥加密的日志
+        with self.flush_lock:
+            self.flush()
+            records = list(self.entries.records.values())
+            passwords = self.crypto.decrypt_many(record.secret for record in records)
+            secrets = new_crypto.encrypt_many(passwords)
+            self.crypto = new_crypto
+            self.entries.crypto = new_crypto
+            for record, secret in zip(records, secrets):
+                record.secret = secret
+            self.compact()
+
+
+BACKENDS = ("json", "sqlite", "chunked")
+
+
+def _new_backend(crypto, kind, directory, sqlite_path, chunked_path):
+    if kind == "json":
+        return VaultStorage(crypto, os.path.join(directory, "entries.dat"), os.path.join(directory, "categories.dat"),
+                            os.path.join(directory, "entries.journal"))
+    if kind == "sqlite":
+        from sqlite_backend import SqliteBackend
+        return SqliteBackend(crypto, os.path.join(directory, sqlite_path))
+    if kind == "chunked":
+        from vault_file import ChunkedStorage
+        return ChunkedStorage(crypto, os.path.join(directory, chunked_path))
+    raise ValueError(f"未知的存储后端：{kind}")
+
+
+def open_backend(crypto, kind=None, sqlite_path="vault.db", chunked_path="vault.pwv", directory="."):
+    """
+    创建保险库目录 directory 中的存储后端，kind 为 BACKENDS 之一，省略时按 vault.pwv、vault.db、JSON 文件的顺序选择已有的格式。
+    返回 (后端, 需要迁移的旧后端或 None)：指定的后端还没有数据而其他格式中有时，加载前先用 migrate_backend 转换。
+    """
+    files = {"chunked": os.path.join(directory, chunked_path), "sqlite": os.path.join(directory, sqlite_path)}
+    if kind is None:
+        kind = next((other for other, path in files.items() if os.path.exists(path)), "json")
+    backend = _new_backend(crypto, kind, directory, sqlite_path, chunked_path)
+    if backend.exists():
+        return backend, None
+    # SQLite 和分块格式只在文件存在时才创建，免得导入用不到的模块
+    for other in ("chunked", "sqlite", "json"):
+        if other != kind and (other not in files or os.path.exists(files[other])):
+            source = _new_backend(crypto, other, directory, sqlite_path, chunked_path)
+            if source.exists():
+                return backend, source
+    return backend, None
+
+
+def migrate_backend(source, target):
+    # 密码密文直接复用（同一密钥），分组顺序和条目的修改时间保持不变。写完后旧后端的文件改名为 *.migrated 保留作为备份，
+    # 不再被当作有效的数据：以后再选择旧格式时会从新格式转换回去，而不是打开过时的副本
+    entries, categories = source.load()
+    target.load()
+    for category in categories:
+        if category not in target.categories:
+            target.add_category(category)
+    target.put_many([(name, entries.account(name), entries.secret(name), categories.category_of(name),
+                      entries.mtime(name)) for name in entries])
+    target.compact()
+    source.close()
+    for path in source.files():
+        if os.path.exists(path):
+            os.replace(path, path + ".migrated")
+    fsync_dir(target.files()[0])
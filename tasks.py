@@ -0,0 +1,30 @@
+from PyQt5.QtCore import QThread, pyqtSignal
+
+
+class BackgroundTask(QThread):
+    """
+    在后台线程执行 func(progress, cancelled)，通过信号把进度和结果交回 GUI 线程。
+    progress(done, total) 报告进度；cancelled() 在调用 cancel() 之后返回 True。
+    """
+    progress = pyqtSignal(int, int)
+    succeeded = pyqtSignal(object)
+    failed = pyqtSignal(object)
+
+    def __init__(self, func, parent=None):
+        super().__init__(parent)
+        self.func = func
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def is_cancelled(self):
+        return self._cancelled
+
+    def run(self):
+        try:
+            result = self.func(self.progress.emit, self.is_cancelled)
+        except Exception as e:
+            self.failed.emit(e)
+        else:
+            self.succeeded.emit(result)
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+from cryptography.fernet import Fernet
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crypto_pool import BatchCipher  # noqa: E402
+from storage import VaultStorage  # noqa: E402
+
+
+@pytest.fixture
+def crypto():
+    cipher = BatchCipher(Fernet.generate_key())
+    yield cipher
+    cipher.shutdown()
+
+
+def json_storage(directory, crypto):
+    return VaultStorage(crypto, os.path.join(directory, "entries.dat"), os.path.join(directory, "categories.dat"),
+                        os.path.join(directory, "entries.journal"))
@@ -0,0 +1,105 @@
+import asyncio
+import json
+import os
+import socket
+
+import pytest
+from cryptography.fernet import Fernet
+
+import agent
+from agent import AgentServer, peer_allowed
+from agent_client import AgentVault
+from master_key import VaultHeader
+from vault_manager import Vault
+
+
+@pytest.fixture
+def server(tmp_path):
+    directory = str(tmp_path)
+    VaultHeader(os.path.join(directory, "vault.header")).create("pw", Fernet.generate_key(), target=0)
+    vault = Vault("test", directory).unlock("pw")
+    for index in range(7):
+        vault.add(f"entry{index}", f"user{index}", f"secret{index}", "工作")
+    server = AgentServer(vault, os.path.join(directory, "agent.sock"))
+    yield server
+    server._executor.shutdown()
+    vault.unload()
+
+
+def request(server, cmd, **params):
+    line = json.dumps({"id": 1, "cmd": cmd, **params}).encode()
+    return asyncio.run(server.respond(line, None))
+
+
+def test_export_rows_are_sent_in_batches(server, monkeypatch):
+    monkeypatch.setattr(agent, "EXPORT_BATCH", 3)
+    reply = request(server, "export_rows")["result"]
+    rows = list(reply["rows"])
+    while not reply["done"]:
+        assert len(reply["rows"]) == 3
+        reply = request(server, "export_rows", cursor=reply["cursor"])["result"]
+        rows.extend(reply["rows"])
+    assert sorted(row[1:] for row in rows) == [[f"entry{i}", f"user{i}", f"secret{i}"] for i in range(7)]
+    assert server._exports == {}
+
+    response = request(server, "export_rows", cursor=reply["cursor"])
+    assert not response["ok"] and response["code"] == "export_expired"
+
+
+def test_agent_vault_reads_the_export_batch_by_batch(server, monkeypatch):
+    monkeypatch.setattr(agent, "EXPORT_BATCH", 2)
+    sent = []
+
+    class Client:
+        def request(self, cmd, **params):
+            sent.append(params)
+            return request(server, cmd, **params)["result"]
+
+    vault = AgentVault("test", server.vault.directory)
+    vault.client = Client()
+    rows, total = vault.export_rows()
+    assert len(list(rows)) == 7
+    assert len(sent) == 4 and sent[0] == {}
+
+
+def test_abandoned_exports_are_bounded(server, monkeypatch):
+    monkeypatch.setattr(agent, "EXPORT_BATCH", 1)
+    cursors = [request(server, "export_rows")["result"]["cursor"] for _ in range(agent.EXPORT_CURSORS + 2)]
+    assert list(server._exports) == cursors[2:]
+    request(server, "lock")
+    assert server._exports == {}
+
+
+def test_error_replies(server):
+    response = request(server, "frobnicate")
+    assert response == {"ok": False, "error": "未知的命令：frobnicate", "id": 1}
+    response = request(server, "get", name="missing")
+    assert not response["ok"] and response["id"] == 1
+
+    assert request(server, "lock")["ok"]
+    response = request(server, "get", name="entry1")
+    assert response["code"] == "locked"
+    response = request(server, "unlock", password="wrong")
+    assert response["code"] == "wrong_password"
+    assert request(server, "unlock", password="pw")["ok"]
+    assert request(server, "get", name="entry1")["result"]["password"] == "secret1"
+
+
+def test_malformed_request_does_not_break_the_server(server):
+    response = asyncio.run(server.respond(b"{not json", None))
+    assert not response["ok"]
+    assert request(server, "status")["result"]["entries"] == 7
+
+
+def test_peer_allowed(monkeypatch):
+    assert peer_allowed(None)
+    left, right = socket.socketpair(socket.AF_UNIX)
+    try:
+        assert peer_allowed(left)
+        if hasattr(socket, "SO_PEERCRED"):
+            uid = os.getuid()
+            monkeypatch.setattr(os, "getuid", lambda: uid + 1)
+            assert not peer_allowed(left)
+    finally:
+        left.close()
+        right.close()
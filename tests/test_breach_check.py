@@ -0,0 +1,73 @@
+import os
+
+from breach_check import BreachCorpus, check_entries, sha1_hex
+from entry_store import LazyEntries
+
+
+def write_corpus(path, counts, newline=b"\n"):
+    lines = sorted(sha1_hex(password.encode()) + b":%d" % count for password, count in counts.items())
+    with open(path, "wb") as f:
+        f.write(newline.join(lines) + newline)
+
+
+def test_lookup_with_crlf_lines(tmp_path):
+    path = str(tmp_path / "pwned.txt")
+    counts = {f"password{i}": i + 1 for i in range(200)}
+    write_corpus(path, counts, b"\r\n")
+    corpus = BreachCorpus(path)
+    try:
+        for password, count in counts.items():
+            assert corpus.count(sha1_hex(password.encode())) == count
+        assert corpus.count(sha1_hex(b"not leaked")) == 0
+        digests = [sha1_hex(b"password7"), sha1_hex(b"unique"), sha1_hex(b"password7")]
+        assert corpus.lookup_many(digests) == {sha1_hex(b"password7"): 8}
+    finally:
+        corpus.close()
+
+
+def test_empty_corpus(tmp_path):
+    path = str(tmp_path / "pwned.txt")
+    open(path, "wb").close()
+    corpus = BreachCorpus(path)
+    assert corpus.count(sha1_hex(b"password")) == 0
+    corpus.close()
+
+
+def test_index_is_rebuilt_when_corpus_changes(tmp_path):
+    path = str(tmp_path / "pwned.txt")
+    write_corpus(path, {"old": 3})
+    BreachCorpus(path).close()
+    assert os.path.exists(path + ".idx")
+
+    write_corpus(path, {"new": 5, "another": 1, "old": 4})
+    corpus = BreachCorpus(path)
+    try:
+        assert corpus.count(sha1_hex(b"new")) == 5
+        assert corpus.count(sha1_hex(b"old")) == 4
+    finally:
+        corpus.close()
+
+    with open(path + ".idx", "r+b") as f:  # 损坏的索引同样重建
+        f.truncate(10)
+    corpus = BreachCorpus(path)
+    assert corpus.count(sha1_hex(b"another")) == 1
+    corpus.close()
+
+
+def test_check_entries(tmp_path, crypto):
+    path = str(tmp_path / "pwned.txt")
+    write_corpus(path, {"123456": 100, "hunter2": 7})
+    entries = LazyEntries(crypto)
+    entries["mail"] = ("alice", "hunter2")
+    entries["bank"] = ("bob", "correct horse battery staple")
+    entries["shop"] = ("carol", "123456")
+    entries.cache.clear()
+    corpus = BreachCorpus(path)
+    progress = []
+    try:
+        found = check_entries(entries, corpus, progress=lambda done, total: progress.append(done), batch_size=2)
+    finally:
+        corpus.close()
+    assert found == {"mail": 7, "shop": 100}
+    assert progress == [2, 3]
+    assert len(entries.cache) == 0  # 明文不进入缓存
@@ -0,0 +1,105 @@
+import os
+
+from cryptography.fernet import Fernet
+
+from categories import HEALTH_CATEGORY, RESERVED_SUFFIX, CategoryStore
+from master_key import VaultHeader
+from vault_manager import Vault
+
+RENAMED = HEALTH_CATEGORY + RESERVED_SUFFIX
+
+
+def test_reserved_name_is_renamed_in_store():
+    store = CategoryStore()
+    store.assign("mail", HEALTH_CATEGORY)
+    assert HEALTH_CATEGORY not in store
+    assert store.category_of("mail") == RENAMED
+    store.add_category("工作")
+    assert store.rename_category("工作", HEALTH_CATEGORY) is False  # 已有改名后的同名分组
+    assert store.rename_category(RENAMED, "旧") is True
+    assert store.rename_category("工作", HEALTH_CATEGORY) is True
+    assert list(store) == ["全部", "未分组", "旧", RENAMED]
+    assert HEALTH_CATEGORY not in store
+
+
+def test_import_and_add_cannot_create_reserved_category(tmp_path):
+    VaultHeader(os.path.join(tmp_path, "vault.header")).create("pw", Fernet.generate_key(), target=0)
+    vault = Vault("test", str(tmp_path)).unlock("pw")
+    vault.add("mail", "alice", "secret", HEALTH_CATEGORY)
+    secret = vault.entries.encrypt_password("secret")
+    vault.import_items([("bank", "bob", secret, HEALTH_CATEGORY)])
+    vault.storage.add_category(HEALTH_CATEGORY)
+    assert HEALTH_CATEGORY not in vault.categories
+    assert vault.get("bank") == ("bob", "secret", RENAMED)
+    vault.unload()
+
+    vault = Vault("test", str(tmp_path)).unlock("pw")
+    assert [category for category in vault.categories if category.startswith(HEALTH_CATEGORY)] == [RENAMED]
+    assert list(vault.categories[RENAMED]) == ["mail", "bank"]
+    vault.unload()
+
+
+def test_all_category_is_virtual():
+    store = CategoryStore()
+    store.assign("mail", "工作")
+    store.assign("bank", "全部")  # 放入 "全部" 即未分组
+    assert store.category_of("bank") == "未分组"
+    assert set(store["全部"]) == {"mail", "bank"}
+    store.remove("mail")
+    assert list(store["全部"]) == ["bank"]
+    assert store.to_json()["全部"] == []
+
+
+def test_move_keeps_one_owner_and_order():
+    store = CategoryStore()
+    for name in ("a", "b", "c"):
+        store.assign(name, "工作")
+    store.assign("b", "家庭")
+    store.assign("a", "工作")  # 留在原位
+    assert list(store["工作"]) == ["a", "c"]
+    assert list(store["家庭"]) == ["b"]
+    assert store.category_of("b") == "家庭"
+    assert store.category_of("missing") == "未分组"
+
+
+def test_rename_keeps_members_and_position():
+    store = CategoryStore()
+    store.assign("mail", "工作")
+    store.add_category("家庭")
+    assert store.rename_category("工作", "公司") is True
+    assert list(store) == ["全部", "未分组", "公司", "家庭"]
+    assert store.category_of("mail") == "公司"
+    assert list(store["公司"]) == ["mail"]
+    assert store.rename_category("公司", "家庭") is False  # 目标已存在
+    assert store.rename_category("missing", "新") is False
+    assert store.rename_category("全部", "新") is False
+    assert store.rename_category("未分组", "新") is False
+
+
+def test_delete_moves_members_and_ids_are_not_reused():
+    store = CategoryStore()
+    old_id = store.add_category("工作")
+    store.assign("mail", "工作")
+    assert store.delete_category("全部") is False
+    assert store.delete_category("未分组") is False
+    assert store.delete_category("工作") is True
+    assert store.delete_category("工作") is False
+    assert "工作" not in store
+    assert store.category_of("mail") == "未分组"
+
+    # 重新添加同名分组得到新的编号和空的成员，已删除的编号不再使用
+    new_id = store.add_category("工作")
+    assert new_id != old_id
+    assert list(store["工作"]) == []
+    store.assign("bank", "工作")
+    assert store.category_of("bank") == "工作"
+    assert store.category_of("mail") == "未分组"
+
+
+def test_json_round_trip_and_legacy_duplicates():
+    data = {"全部": ["mail", "bank"], "未分组": [], "工作": ["mail", "bank"], "家庭": ["bank", "home"]}
+    store = CategoryStore.from_json(data)
+    assert store.category_of("bank") == "工作"  # 出现在多个分组时以第一个为准
+    assert store.category_of("home") == "家庭"
+    assert CategoryStore.from_json(store.to_json()).to_json() == store.to_json()
+    assert store.to_json() == {"全部": [], "未分组": [], "工作": ["mail", "bank"], "家庭": ["home"]}
@@ -0,0 +1,34 @@
+import io
+import json
+
+from cryptography.fernet import InvalidToken
+
+from cli import CommandError, run_batch
+from master_key import WrongPassword
+
+
+def test_batch_errors_only_fail_their_line():
+    def handle(cmd, params):
+        if cmd == "sync":
+            raise WrongPassword("主密码错误")
+        if cmd == "sync-status":
+            raise InvalidToken
+        if cmd == "get":
+            raise CommandError("条目不存在")
+        return params["value"]
+
+    lines = [json.dumps(request) for request in [
+        {"id": 1, "cmd": "sync", "path": "other"},
+        {"id": 2, "cmd": "sync-status"},
+        {"id": 3, "cmd": "get"},
+        {"id": 4, "cmd": "echo", "value": 42},
+    ]] + ["not json"]
+    out = io.StringIO()
+    run_batch(handle, lines, out)
+    responses = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [response.get("id") for response in responses] == [1, 2, 3, 4, None]
+    assert responses[0]["code"] == "wrong_password"
+    assert not responses[1]["ok"] and responses[1]["error"]
+    assert responses[2] == {"id": 3, "ok": False, "error": "条目不存在"}
+    assert responses[3] == {"id": 4, "ok": True, "result": 42}
+    assert not responses[4]["ok"]
@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+pytest.importorskip("PyQt5")
+
+from categories import CategoryStore  # noqa: E402
+from entry_model import ENTRY_NAME_ROLE, EntryListModel  # noqa: E402
+from storage import ENTRY_ADDED, ENTRY_CHANGED, ENTRY_REMOVED  # noqa: E402
+
+
+def names(model):
+    return [model.data(model.index(row), ENTRY_NAME_ROLE) for row in range(model.rowCount())]
+
+
+def category_model(store, category, batch_size=256):
+    model = EntryListModel(batch_size=batch_size)
+    model.set_store({}, store)
+    model.set_names(store[category], category=category)
+    return model
+
+
+def test_category_view_follows_changes():
+    store = CategoryStore()
+    for name in ("a", "b", "c"):
+        store.assign(name, "工作")
+    model = category_model(store, "工作")
+    inserted, removed = [], []
+    model.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+    model.rowsRemoved.connect(lambda parent, first, last: removed.append((first, last)))
+
+    # 存储先更新分组成员，再发出通知
+    store.assign("d", "工作")
+    store.assign("x", "家庭")
+    model.apply_changes([(ENTRY_ADDED, "d", "工作"), (ENTRY_ADDED, "x", "家庭")])
+    assert names(model) == ["a", "b", "c", "d"]
+    assert inserted == [(3, 3)]
+
+    store.remove("b")
+    model.apply_changes([(ENTRY_REMOVED, "b", "工作")])
+    assert names(model) == ["a", "c", "d"]
+    assert removed == [(1, 1)]
+
+    store.assign("a", "家庭")  # 移到其他分组
+    model.apply_changes([(ENTRY_CHANGED, "a", "家庭", "a", "工作")])
+    assert names(model) == ["c", "d"]
+
+    store.remove("c")
+    store.assign("c2", "工作")  # 改名后排在分组末尾
+    model.apply_changes([(ENTRY_CHANGED, "c2", "工作", "c", "工作")])
+    assert names(model) == ["d", "c2"]
+
+
+def test_category_view_not_fully_loaded_waits_for_fetch():
+    store = CategoryStore()
+    for index in range(5):
+        store.assign(f"e{index}", "工作")
+    model = category_model(store, "工作", batch_size=2)
+    assert names(model) == ["e0", "e1"]
+    store.assign("new", "工作")
+    model.apply_changes([(ENTRY_ADDED, "new", "工作")])
+    assert names(model) == ["e0", "e1"]  # 随滚动加载
+    while model.canFetchMore():
+        model.fetchMore()
+    assert names(model) == ["e0", "e1", "e2", "e3", "e4", "new"]
+
+
+def test_search_results_follow_renames_and_removals_only():
+    model = EntryListModel()
+    model.set_store({}, CategoryStore())
+    model.set_names(["a", "b", "c"], header="查询结果")
+    changed = []
+    model.dataChanged.connect(lambda first, last: changed.append(first.row()))
+
+    model.apply_changes([(ENTRY_ADDED, "d", "工作")])
+    model.apply_changes([(ENTRY_CHANGED, "b2", "工作", "b", "工作")])
+    assert changed == [2]  # 标题行占第 0 行
+    model.apply_changes([(ENTRY_REMOVED, "a", "工作"), (ENTRY_REMOVED, "missing", "工作")])
+    assert names(model)[1:] == ["b2", "c"]
+    assert model.name_at(0) is None
+
+
+def test_cross_vault_results_only_change_rows_of_that_vault():
+    model = EntryListModel()
+    model.set_names([("one", "mail"), ("two", "mail")], vaults={"one": None, "two": None})
+    model.apply_changes([(ENTRY_REMOVED, "mail", "工作")], vault_name="two")
+    assert [model.name_at(row) for row in range(model.rowCount())] == [("one", "mail")]
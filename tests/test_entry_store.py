@@ -0,0 +1,75 @@
+import threading
+
+from entry_store import LazyEntries, PlaintextCache
+
+
+def test_cache_evicts_least_recently_used():
+    cache = PlaintextCache(maxsize=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    assert cache.get("a") == "1"
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert len(cache) == 2
+
+
+def test_cache_expires_entries():
+    cache = PlaintextCache(ttl=-1)
+    cache.put("a", "1")
+    assert cache.get("a") is None
+    cache.put("b", "2")
+    cache.purge_expired()
+    assert len(cache) == 0
+
+
+def test_cache_is_safe_across_threads():
+    cache = PlaintextCache(maxsize=64)
+    errors = []
+
+    def worker(offset):
+        try:
+            for i in range(20000):
+                key = (offset + i) % 200
+                if cache.get(key) is None:
+                    cache.put(key, str(key))
+                if i % 100 == 0:
+                    cache.purge_expired()
+                    cache.discard(key)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(offset,)) for offset in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(cache) <= 64
+
+
+def entries_with(crypto, *names):
+    entries = LazyEntries(crypto)
+    for name in names:
+        entries.set_encrypted(name, "user", "secret")
+    return entries
+
+
+def test_unique_names_continue_after_existing_suffixes(crypto):
+    entries = entries_with(crypto, "mail", "mail_1", "mail_7", "bank")
+    assert entries.unique_names(["mail", "mail", "bank", "home"]) == ["mail_8", "mail_9", "bank_1", "home"]
+    assert entries.unique_name("home") == "home"  # 分配过但未写入的名称不占用
+
+
+def test_unique_names_within_one_batch(crypto):
+    entries = entries_with(crypto)
+    assert entries.unique_names(["a", "a", "a_1", "a"]) == ["a", "a_1", "a_1_1", "a_2"]
+
+
+def test_unique_names_counter_follows_later_writes(crypto):
+    entries = entries_with(crypto, "mail")
+    assert entries.unique_name("mail") == "mail_1"
+    entries.set_encrypted("mail_5", "user", "secret")  # 建立计数器之后写入的名称也计入
+    assert entries.unique_name("mail") == "mail_6"
+    del entries["mail_5"]
+    assert entries.unique_name("mail") == "mail_7"  # 计数器只增不减，分配出去的名称也计入
+    assert entries.unique_name("mail_x") == "mail_x"
@@ -0,0 +1,74 @@
+import json
+import os
+
+import pytest
+from cryptography.fernet import Fernet
+
+from importer import ImportCancelled, iter_records, read_import_file
+from master_key import VaultHeader
+from vault_manager import Vault
+
+
+def write(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return str(path)
+
+
+def test_browser_csv_formats(tmp_path):
+    chrome = write(tmp_path / "chrome.csv", "name,url,username,password,note\n"
+                                           "mail,https://mail.example.com,alice,pw1,\n"
+                                           ",https://bank.example.com/login,bob,pw2,\n"
+                                           "empty,https://x.example.com,carol,,\n")
+    assert list(iter_records(chrome)) == [("mail", "alice", "pw1", ""), ("bank.example.com", "bob", "pw2", "")]
+
+    firefox = write(tmp_path / "firefox.csv", "url,username,password,httpRealm\nshop.example.com,dave,pw3,\n")
+    assert list(iter_records(firefox)) == [("shop.example.com", "dave", "pw3", "")]
+
+    bitwarden = write(tmp_path / "bitwarden.csv",
+                      "folder,favorite,type,name,notes,fields,reprompt,login_uri,login_username,login_password\n"
+                      "工作,,login,VPN,,,,https://vpn.example.com, erin ,pw4\n")
+    assert list(iter_records(bitwarden)) == [("VPN", "erin", "pw4", "工作")]
+
+
+def test_own_export_layouts(tmp_path):
+    csv_path = write(tmp_path / "export.csv", "\ufeff分组,名称,账号,密码\n家庭,router,admin,pw5\n")
+    assert list(iter_records(csv_path)) == [("router", "admin", "pw5", "家庭")]
+
+    jsonl_path = write(tmp_path / "export.jsonl", json.dumps({"分组": "工作", "名称": "git", "账号": "f", "密码": "pw6"},
+                                                              ensure_ascii=False) + "\n\n")
+    assert list(iter_records(jsonl_path)) == [("git", "f", "pw6", "工作")]
+
+
+def test_unknown_formats_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        list(iter_records(write(tmp_path / "data.txt", "")))
+    with pytest.raises(ValueError):
+        list(iter_records(write(tmp_path / "data.csv", "title,comment\nmail,hello\n")))
+
+
+def test_read_import_file_encrypts_in_batches(tmp_path, crypto):
+    path = write(tmp_path / "many.csv", "name,username,password\n" + "".join(f"e{i},u{i},p{i}\n" for i in range(10)))
+    progress = []
+    items = read_import_file(path, crypto, progress=lambda done, total: progress.append(done), batch_size=4)
+    assert progress == [4, 8]
+    assert [item[0] for item in items] == [f"e{i}" for i in range(10)]
+    assert crypto.cipher.decrypt(items[3][2].encode()) == b"p3"
+
+    with pytest.raises(ImportCancelled):
+        read_import_file(path, crypto, cancelled=lambda: True, batch_size=4)
+
+
+def test_import_items_renames_duplicates_in_one_commit(tmp_path):
+    VaultHeader(os.path.join(tmp_path, "vault.header")).create("pw", Fernet.generate_key(), target=0)
+    vault = Vault("test", str(tmp_path)).unlock("pw")
+    vault.add("mail", "alice", "old", "工作")
+    path = write(tmp_path / "import.csv", "name,username,password,folder\nmail,bob,new,\nmail,carol,newer,家庭\n")
+    changes = []
+    vault.storage.on_change = changes.append
+    assert vault.import_items(vault.read_import(path)) == 2
+    assert len(changes) == 1  # 一次提交
+    assert vault.get("mail") == ("alice", "old", "工作")
+    assert vault.get("mail_1") == ("bob", "new", "未分组")
+    assert vault.get("mail_2") == ("carol", "newer", "家庭")
+    vault.unload()
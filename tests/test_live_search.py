@@ -0,0 +1,66 @@
+import os
+import threading
+import time
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+pytest.importorskip("PyQt5")
+
+from PyQt5.QtCore import QCoreApplication  # noqa: E402
+
+from live_search import LiveSearch  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+def wait_for(app, condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.005)
+    return condition()
+
+
+def test_typing_is_debounced(app):
+    queries = []
+    search = LiveSearch(lambda query, cancelled: queries.append(query) or [query], debounce_ms=20)
+    results = []
+    search.results_ready.connect(lambda generation, query, names: results.append((query, names)))
+    for text in ("g", "gi", " git "):
+        search.schedule(text)
+    assert wait_for(app, lambda: results)
+    assert queries == ["git"]
+    assert results == [("git", ["git"])]
+    search.shutdown()
+
+
+def test_newer_query_cancels_the_running_one(app):
+    started, release = threading.Event(), threading.Event()
+    seen = []
+
+    def slow_search(query, cancelled):
+        if query == "old":
+            started.set()
+            release.wait(5)
+            seen.append(cancelled())
+        return [query]
+
+    search = LiveSearch(slow_search)
+    results = []
+    search.results_ready.connect(lambda generation, query, names: results.append(query))
+    search.search_now("old")
+    assert started.wait(5)
+    search.search_now("new")
+    release.set()
+    assert wait_for(app, lambda: results)
+    assert seen == [True]
+    assert results == ["new"]  # 作废的查询不发出结果
+
+    search.search_now("   ")  # 空查询不提交
+    search.cancel()
+    search.shutdown()
+    assert results == ["new"]
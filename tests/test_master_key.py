@@ -0,0 +1,99 @@
+import os
+
+import pytest
+from cryptography.fernet import Fernet
+
+from crypto_pool import BatchCipher
+from master_key import VaultHeader, WrongPassword, calibrate, derive_key
+from storage import BACKENDS
+from vault_manager import Vault
+from vault_sync import VaultSync
+
+
+def new_vault(directory, backend="json", password="correct horse"):
+    # 派生参数取最低强度，测试不必等标定
+    VaultHeader(os.path.join(directory, "vault.header")).create(password, Fernet.generate_key(), target=0)
+    vault = Vault("test", directory, backend).unlock(password)
+    vault.add("mail", "alice", "secret1", "工作")
+    vault.add("bank", "bob", "secret2")
+    return vault
+
+
+def test_calibrate_has_a_floor():
+    assert calibrate("pbkdf2", target=0)["iterations"] >= 600_000
+    assert calibrate("scrypt", target=0)["n"] >= 2 ** 14
+
+
+def test_derive_key_depends_on_password_and_salt():
+    params = {"name": "pbkdf2", "salt": "c2FsdHNhbHRzYWx0c2FsdA==", "iterations": 1000}
+    assert derive_key("pw", params) == derive_key("pw", params)
+    assert derive_key("pw", params) != derive_key("other", params)
+    assert derive_key("pw", params) != derive_key("pw", {**params, "salt": "b3RoZXJzYWx0b3RoZXJzYQ=="})
+
+
+def test_unlock_checks_password(tmp_path):
+    new_vault(str(tmp_path)).unload()
+    with pytest.raises(WrongPassword):
+        Vault("test", str(tmp_path)).unlock("wrong")
+    vault = Vault("test", str(tmp_path)).unlock("correct horse")
+    assert vault.get("mail") == ("alice", "secret1", "工作")
+    vault.unload()
+
+
+def test_change_master_password_keeps_entries(tmp_path):
+    vault = new_vault(str(tmp_path))
+    vault.header.create("new password", vault.crypto.key, target=0)
+    vault.unload()
+    with pytest.raises(WrongPassword):
+        Vault("test", str(tmp_path)).unlock("correct horse")
+    vault = Vault("test", str(tmp_path)).unlock("new password")
+    assert vault.get("bank") == ("bob", "secret2", "未分组")
+    vault.unload()
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_rotate_data_key(tmp_path, backend):
+    vault = new_vault(str(tmp_path), backend)
+    old_key = vault.crypto.key
+    new_crypto = BatchCipher(Fernet.generate_key())
+    vault.header.rotate(vault.key_cache.get(), vault.storage, new_crypto)
+    vault.unload()
+    new_crypto.shutdown()
+
+    vault = Vault("test", str(tmp_path), backend).unlock("correct horse")
+    assert vault.crypto.key == new_crypto.key != old_key
+    assert vault.get("mail") == ("alice", "secret1", "工作")
+    assert "next_key" not in vault.header.data
+    vault.unload()
+
+
+def test_unlock_finishes_interrupted_rotation(tmp_path):
+    # 条目已用新密钥写完，头部还没把 next_key 设为正式密钥
+    vault = new_vault(str(tmp_path))
+    kek = vault.key_cache.get()
+    new_crypto = BatchCipher(Fernet.generate_key())
+    vault.header.data["next_key"] = Fernet(kek).encrypt(new_crypto.key).decode()
+    vault.header._save()
+    vault.storage.rekey(new_crypto)
+    vault.unload()
+    new_crypto.shutdown()
+
+    vault = Vault("test", str(tmp_path)).unlock("correct horse")
+    assert vault.get("bank") == ("bob", "secret2", "未分组")
+    assert "next_key" not in VaultHeader(str(tmp_path / "vault.header")).load().data
+    vault.unload()
+
+
+def test_rotate_data_key_reencrypts_sync_state(tmp_path):
+    vault = new_vault(str(tmp_path))
+    state = VaultSync(vault)
+    state.refresh()
+    state.save()
+    new_crypto = BatchCipher(Fernet.generate_key())
+    vault.header.rotate(vault.key_cache.get(), vault.storage, new_crypto)
+    vault.unload()
+    new_crypto.shutdown()
+
+    vault = Vault("test", str(tmp_path)).unlock("correct horse")
+    assert VaultSync(vault).replica == state.replica
+    vault.unload()
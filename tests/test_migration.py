@@ -0,0 +1,95 @@
+import json
+import os
+import sqlite3
+
+from conftest import json_storage
+from sqlite_backend import SqliteBackend
+from storage import migrate_backend, open_backend
+
+
+def write_json_vault(directory, crypto):
+    storage = json_storage(directory, crypto)
+    storage.load()
+    storage.add_category("个人")
+    storage.put("mail", ("alice", "secret1"), "工作")
+    storage.put("bank", ("bob", "secret2"), "个人")
+    storage.compact()
+    mtimes = storage.entries.mtimes()
+    storage.close()
+    return mtimes
+
+
+def test_legacy_snapshot_is_converted(tmp_path, crypto):
+    # 旧版 entries.dat：每个条目是一个加密的 [账号, 密码]，分组文件带有 "全部" 列表
+    legacy = {name: crypto.cipher.encrypt(json.dumps([account, password]).encode()).decode()
+              for name, account, password in [("mail", "alice", "secret1"), ("bank", "bob", "secret2")]}
+    with open(tmp_path / "entries.dat", "w") as f:
+        json.dump(legacy, f)
+    with open(tmp_path / "categories.dat", "w") as f:
+        json.dump({"全部": ["mail", "bank"], "工作": ["mail"], "未分组": ["bank"]}, f)
+
+    entries, categories = json_storage(tmp_path, crypto).load()
+    assert entries["mail"] == ("alice", "secret1")
+    assert categories.category_of("bank") == "未分组"
+    with open(tmp_path / "entries.dat") as f:
+        assert json.load(f)["version"] == 2
+
+    entries, categories = json_storage(tmp_path, crypto).load()
+    assert entries["bank"] == ("bob", "secret2")
+    assert list(categories["工作"]) == ["mail"]
+
+
+def test_json_to_sqlite_and_back(tmp_path, crypto):
+    directory = str(tmp_path)
+    mtimes = write_json_vault(directory, crypto)
+
+    storage, source = open_backend(crypto, "sqlite", directory=directory)
+    assert source is not None
+    migrate_backend(source, storage)
+    entries, categories = storage.load()
+    assert entries["bank"] == ("bob", "secret2")
+    assert list(categories) == ["全部", "未分组", "个人", "工作"]
+    assert entries.mtimes() == mtimes
+    # 旧格式的文件改名保留，不再被当作有效的数据
+    assert not os.path.exists(os.path.join(directory, "entries.dat"))
+    assert os.path.exists(os.path.join(directory, "entries.dat.migrated"))
+    storage.put("mail", ("alice", "changed"), "工作")
+    storage.close()
+
+    # 再选择 JSON 格式时从 SQLite 转换回来，得到的是最新的数据
+    storage, source = open_backend(crypto, "json", directory=directory)
+    assert isinstance(source, SqliteBackend)
+    migrate_backend(source, storage)
+    entries, categories = storage.load()
+    assert entries["mail"] == ("alice", "changed")
+    assert not os.path.exists(os.path.join(directory, "vault.db"))
+    storage.close()
+
+
+def test_sqlite_without_mtime_column(tmp_path, crypto):
+    path = str(tmp_path / "vault.db")
+    db = sqlite3.connect(path)
+    db.executescript("""
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        CREATE TABLE categories (position INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE);
+        CREATE TABLE entries (name TEXT PRIMARY KEY, category TEXT NOT NULL, account TEXT NOT NULL,
+                              secret TEXT NOT NULL);
+    """)
+    account, secret = crypto.encrypt_many(["alice", "secret1"])
+    db.execute("INSERT INTO categories (name) VALUES ('工作')")
+    db.execute("INSERT INTO entries VALUES ('mail', '工作', ?, ?)", (account, secret))
+    db.commit()
+    db.close()
+
+    storage = SqliteBackend(crypto, path)
+    entries, categories = storage.load()
+    assert entries["mail"] == ("alice", "secret1")
+    assert entries.mtime("mail") is None
+    storage.put("bank", ("bob", "secret2"), "工作")
+    storage.close()
+
+    storage = SqliteBackend(crypto, path)
+    entries, categories = storage.load()
+    assert entries.mtime("bank") is not None
+    assert list(categories["工作"]) == ["mail", "bank"]
+    storage.close()
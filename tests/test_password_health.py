@@ -0,0 +1,70 @@
+import math
+
+import pytest
+
+from entry_store import LazyEntries
+from password_health import PasswordHealth, account_key, estimate_bits
+from storage import ENTRY_ADDED, ENTRY_CHANGED, ENTRY_REMOVED
+
+
+def test_estimate_bits_of_patterns():
+    lower = math.log2(26)
+    assert estimate_bits("") == 0.0
+    assert estimate_bits("aaaa") == pytest.approx(lower + 3)
+    assert estimate_bits("abcdef") == pytest.approx(lower + 5)
+    assert estimate_bits("qwer") == pytest.approx(lower + 3)  # 键盘相邻
+    assert estimate_bits("password") == pytest.approx(1.0)  # 词表第 1 个
+    assert estimate_bits("P@ssw0rd") == pytest.approx(1.0)  # 替换字符后同样命中
+    assert estimate_bits("1999") == pytest.approx(math.log2(200))
+    assert estimate_bits("password1999") < 20
+    assert estimate_bits("Xk9#mQ2$vL7&") > 60
+
+
+def test_account_key_ignores_suffix_and_punctuation():
+    assert account_key("My-Mail_2", " Alice ") == account_key("mymail", "alice")
+    assert account_key("mail_x", "alice") != account_key("mail", "alice")
+
+
+def scored(crypto, passwords):
+    entries = LazyEntries(crypto)
+    for name, (account, password) in passwords.items():
+        entries[name] = (account, password)
+    return entries, PasswordHealth(entries).analyze()
+
+
+def test_analyze_reports_reused_weak_and_duplicates(crypto):
+    entries, health = scored(crypto, {
+        "mail": ("alice", "Xk9#mQ2$vL7&"),
+        "bank": ("bob", "Xk9#mQ2$vL7&"),
+        "shop": ("carol", "password"),
+        "Mail_2": ("Alice", "Zr8!pW4@tN6*"),
+    })
+    assert health.reused() == [["bank", "mail"]]
+    assert health.weak() == ["shop"]
+    assert health.duplicates() == [["Mail_2", "mail"]]
+    assert health.issues("mail") == "2 个条目使用同一密码，疑似重复账号"
+    assert health.issues("missing") == ""
+    assert health.flagged() == ["bank", "mail", "shop", "Mail_2"]
+    assert health.summary() == {"reused": 2, "weak": 1, "duplicates": 2}
+
+
+def test_update_rescores_only_changed_entries(crypto):
+    entries, health = scored(crypto, {
+        "mail": ("alice", "Xk9#mQ2$vL7&"),
+        "bank": ("bob", "Xk9#mQ2$vL7&"),
+    })
+    entries["shop"] = ("carol", "password")
+    health.update([(ENTRY_ADDED, "shop", "工作")])
+    assert health.weak() == ["shop"]
+
+    # 改名并换了密码：原名称的记录移除，重复使用的分组解散
+    del entries["bank"]
+    entries["bank2"] = ("bob", "Zr8!pW4@tN6*")
+    health.update([(ENTRY_CHANGED, "bank2", "工作", "bank", "工作")])
+    assert health.reused() == []
+    assert health.issues("bank") == ""
+
+    del entries["shop"]
+    health.update([(ENTRY_REMOVED, "shop", "工作")])
+    assert health.flagged() == []
+    assert health.summary() == {"reused": 0, "weak": 0, "duplicates": 0}
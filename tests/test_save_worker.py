@@ -0,0 +1,85 @@
+import os
+import threading
+import time
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+pytest.importorskip("PyQt5")
+
+from PyQt5.QtCore import QCoreApplication, Qt  # noqa: E402
+
+from save_worker import SaveWorker  # noqa: E402
+
+
+class Storage:
+    def __init__(self, fail=0):
+        self.on_dirty = None
+        self.flushes = 0
+        self.fail = fail
+        self.flushed = threading.Event()
+
+    def flush(self):
+        self.flushes += 1
+        self.flushed.set()
+        if self.fail:
+            self.fail -= 1
+            raise OSError("disk full")
+
+
+@pytest.fixture
+def app():
+    return QCoreApplication.instance() or QCoreApplication([])
+
+
+def test_burst_of_changes_is_written_once(app):
+    storage = Storage()
+    worker = SaveWorker(storage, delay=0.05, max_delay=1.0)
+    statuses = []
+    worker.status_changed.connect(statuses.append, Qt.DirectConnection)
+    worker.start()
+    for _ in range(20):
+        storage.on_dirty()
+    assert storage.flushed.wait(5)
+    time.sleep(0.1)
+    assert storage.flushes == 1
+    assert statuses == ["saving", "saved"]
+    worker.stop()
+    assert storage.flushes == 1  # 没有排队的修改时退出不再写入
+
+
+def test_max_delay_bounds_a_long_burst(app):
+    storage = Storage()
+    worker = SaveWorker(storage, delay=0.2, max_delay=0.3)
+    worker.start()
+    start = time.monotonic()
+    while not storage.flushed.is_set() and time.monotonic() - start < 5:
+        storage.on_dirty()  # 持续修改，delay 永远等不到
+        time.sleep(0.02)
+    assert storage.flushed.is_set()
+    assert time.monotonic() - start < 1.0
+    worker.stop()
+
+
+def test_stop_flushes_pending_changes(app):
+    storage = Storage()
+    worker = SaveWorker(storage, delay=60, max_delay=60)
+    worker.start()
+    storage.on_dirty()
+    worker.stop()
+    assert storage.flushes == 1
+    assert worker.isFinished()
+
+
+def test_failed_write_is_reported_and_retried(app):
+    storage = Storage(fail=1)
+    worker = SaveWorker(storage, delay=0.01)
+    errors = []
+    worker.failed.connect(errors.append, Qt.DirectConnection)
+    worker.start()
+    storage.on_dirty()
+    assert storage.flushed.wait(5)
+    storage.on_dirty()
+    worker.stop()
+    assert [str(e) for e in errors] == ["disk full"]
+    assert storage.flushes == 2
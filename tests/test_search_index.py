@@ -0,0 +1,54 @@
+from search_index import SearchIndex, scan
+
+
+def build(items):
+    index = SearchIndex()
+    for name, account in items:
+        index.add(name, account)
+    return index
+
+
+ITEMS = [("GitHub", "octo@example.com"), ("gitlab", "me"), ("my git server", "admin"), ("Bank", "github-user"),
+         ("git", "x"), ("ab", "github")]
+
+
+def test_ranking():
+    # 完全相同 > 名称前缀 > 名称包含 > 账号包含，同级按位置和名称长度
+    index = build(ITEMS)
+    assert index.search("git") == ["git", "GitHub", "gitlab", "my git server", "ab", "Bank"]
+    assert index.search("git", limit=2) == ["git", "GitHub"]
+    assert index.search("GI") == index.search("gi")  # 短查询走扫描，结果排序相同
+    assert scan([ITEMS], "git") == index.search("git")
+
+
+def test_removed_entries_are_not_returned():
+    index = build(ITEMS)
+    index.remove("GitHub")
+    index.remove("missing")
+    assert "GitHub" not in index.search("git")
+    assert "GitHub" not in index.search("gi")
+    assert len(index) == len(ITEMS) - 1
+    # 再次加入、修改账号后按新账号查找，旧账号的倒排表中的编号已失效
+    index.add("GitHub", "hub@example.com")
+    index.add("Bank", "teller")
+    assert "GitHub" in index.search("hub@")
+    assert "Bank" not in index.search("github-user")
+
+
+def test_rebuild_after_many_removals():
+    index = build((f"entry{i:05d}", f"user{i}") for i in range(3000))
+    for i in range(2000):
+        index.remove(f"entry{i:05d}")
+    assert index._dead < 2000  # 空号过多时已整体重建
+    assert len(index) == 1000
+    assert index.search("entry0200") == [f"entry0200{i}" for i in range(10)]
+    assert index.search("user1999") == []
+
+
+def test_prefix():
+    index = build(ITEMS)
+    assert index.prefix("git") == ["git", "GitHub", "gitlab"]
+    assert index.prefix("GI", limit=1) == ["git"]
+    assert index.prefix("serv") == []  # 只在名称开头，账号不算
+    index.remove("gitlab")
+    assert index.prefix("gitl") == []
@@ -0,0 +1,55 @@
+import os
+
+from conftest import json_storage
+
+
+def write_entries(directory, crypto, count=3):
+    storage = json_storage(directory, crypto)
+    storage.load()
+    for index in range(count):
+        storage.put(f"entry{index}", (f"user{index}", f"password{index}"), "工作")
+    storage.close()
+    return os.path.join(directory, "entries.journal")
+
+
+def test_journal_replay(tmp_path, crypto):
+    write_entries(tmp_path, crypto)
+    entries, categories = json_storage(tmp_path, crypto).load()
+    assert entries["entry1"] == ("user1", "password1")
+    assert list(categories["工作"]) == ["entry0", "entry1", "entry2"]
+
+
+def test_torn_final_record_is_truncated(tmp_path, crypto):
+    journal = write_entries(tmp_path, crypto)
+    size = os.path.getsize(journal)
+    with open(journal, "ab") as f:
+        f.write(b"gAAAAABtorn")  # 崩溃时写了一半的最后一行，没有换行
+
+    storage = json_storage(tmp_path, crypto)
+    entries, categories = storage.load()
+    assert sorted(entries) == ["entry0", "entry1", "entry2"]
+    assert storage.damaged_journal is None
+    assert os.path.getsize(journal) == size
+
+    # 截掉之后可以继续追加
+    storage.put("entry3", ("user3", "password3"), "工作")
+    assert sorted(json_storage(tmp_path, crypto).load()[0]) == ["entry0", "entry1", "entry2", "entry3"]
+
+
+def test_damaged_record_in_the_middle_keeps_journal(tmp_path, crypto):
+    journal = write_entries(tmp_path, crypto)
+    with open(journal, "rb") as f:
+        lines = f.readlines()
+    lines[1] = b"not a record\n"
+    damaged = b"".join(lines)
+    with open(journal, "wb") as f:
+        f.write(damaged)
+
+    storage = json_storage(tmp_path, crypto)
+    entries, categories = storage.load()
+    # 其余记录照常应用，原日志原样移到一旁，不截断
+    assert sorted(entries) == ["entry0", "entry2"]
+    assert storage.damaged_journal is not None
+    with open(storage.damaged_journal, "rb") as f:
+        assert f.read() == damaged
+    assert sorted(json_storage(tmp_path, crypto).load()[0]) == ["entry0", "entry2"]
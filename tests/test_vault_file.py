@@ -0,0 +1,90 @@
+import os
+
+from conftest import json_storage
+from sqlite_backend import SqliteBackend
+from storage import migrate_backend, open_backend
+from vault_file import ChunkedStorage
+
+
+def test_chunked_roundtrip_reads_chunks_on_demand(tmp_path, crypto):
+    path = str(tmp_path / "vault.pwv")
+    storage = ChunkedStorage(crypto, path, chunk_entries=4)
+    storage.load()
+    storage.put_many([(f"entry{index:02d}", f"user{index}", crypto.cipher.encrypt(b"pw").decode(),
+                       "工作" if index % 2 else "个人") for index in range(20)])
+    storage.compact()
+    mtimes = storage.entries.mtimes()
+    storage.close()
+
+    storage = ChunkedStorage(crypto, path, chunk_entries=4)
+    entries, categories = storage.load()
+    assert len(entries) == 20
+    assert entries.mtimes() == mtimes  # 写入时间在索引中，不必读块
+    assert entries.account("entry03") == "user3"
+    assert entries.password("entry03") == "pw"
+    assert len(entries._chunk_of) == 16  # 只读入了 entry03 所在的块
+    assert list(categories["工作"])[:2] == ["entry01", "entry03"]
+    storage.close()
+
+
+def test_json_to_chunked_to_sqlite(tmp_path, crypto):
+    directory = str(tmp_path)
+    storage = json_storage(directory, crypto)
+    storage.load()
+    storage.put("mail", ("alice", "secret1"), "工作")
+    storage.put("bank", ("bob", "secret2"), "个人")
+    mtimes = storage.entries.mtimes()
+    storage.close()
+
+    storage, source = open_backend(crypto, "chunked", directory=directory)
+    migrate_backend(source, storage)
+    storage.close()
+    assert os.path.exists(os.path.join(directory, "entries.journal.migrated"))
+
+    # 省略格式时选择已有的 vault.pwv
+    storage, source = open_backend(crypto, directory=directory)
+    assert isinstance(storage, ChunkedStorage) and source is None
+    entries, categories = storage.load()
+    assert entries["mail"] == ("alice", "secret1")
+    assert entries.mtimes() == mtimes
+    storage.close()
+
+    storage, source = open_backend(crypto, "sqlite", directory=directory)
+    assert isinstance(source, ChunkedStorage)
+    migrate_backend(source, storage)
+    entries, categories = storage.load()
+    assert entries["bank"] == ("bob", "secret2")
+    assert categories.category_of("bank") == "个人"
+    assert entries.mtimes() == mtimes
+    assert not os.path.exists(os.path.join(directory, "vault.pwv"))
+    storage.close()
+    assert isinstance(open_backend(crypto, directory=directory)[0], SqliteBackend)
+
+
+def test_compaction_releases_loaded_chunks(tmp_path, crypto):
+    path = str(tmp_path / "vault.pwv")
+    storage = ChunkedStorage(crypto, path, chunk_entries=4)
+    entries, categories = storage.load()
+    storage.put_many([(f"entry{index:02d}", f"user{index}", crypto.cipher.encrypt(b"pw").decode(), "工作")
+                      for index in range(20)])
+    storage.compact()
+    # 合并后记录重新指向新文件中的块，不再常驻内存
+    assert all(record.secret is None for record in entries.records.values())
+    assert len(entries._chunk_of) == 20
+    assert entries.password("entry05") == "pw"
+    assert len(entries._chunk_of) == 16
+
+    storage.put("entry05", ("changed", "new"), "工作")
+    storage.put("extra", ("someone", "pw2"), "个人")
+    storage.compact()
+    assert entries["entry05"] == ("changed", "new")
+    assert entries.account("extra") == "someone"
+    assert sorted(name for name, account in entries.iter_accounts())[:2] == ["entry00", "entry01"]
+    assert entries.search("user1") == ["entry01"] + [f"entry{index}" for index in range(10, 20)]
+    storage.close()
+
+    storage = ChunkedStorage(crypto, path, chunk_entries=4)
+    entries, categories = storage.load()
+    assert entries["entry05"] == ("changed", "new")
+    assert len(entries) == 21
+    storage.close()
@@ -0,0 +1,160 @@
+import os
+import shutil
+import time
+
+import pytest
+from cryptography.fernet import Fernet
+
+from master_key import VaultHeader
+from vault_manager import Vault
+from vault_sync import CONFLICT_SUFFIX, OURS, THEIRS, VaultSync, merge_categories, merge_entries, sync_vaults
+
+
+def v(account, digest, mtime, category="工作"):
+    return account, category, digest, mtime
+
+
+BASE = {"mail": v("alice", "d1", 1.0)}
+
+
+def merge(ours, theirs, prefer="newer", base=BASE):
+    names = set(base) | set(ours) | set(theirs)
+    return merge_entries(base, ours, theirs, names, prefer)
+
+
+def test_one_side_changed():
+    merged, conflicts = merge({"mail": v("alice", "d1", 1.0)}, {"mail": v("alice", "d2", 2.0)})
+    assert merged["mail"] == (v("alice", "d2", 2.0), (THEIRS, "mail"))
+    assert conflicts == []
+
+
+def test_delete_and_modify_keeps_modification():
+    merged, conflicts = merge({}, {"mail": v("alice", "d2", 2.0)})
+    assert merged["mail"][1] == (THEIRS, "mail")
+    assert conflicts == [{"name": "mail", "kind": "delete/modify", "kept": THEIRS}]
+
+    merged, conflicts = merge({}, {"mail": v("alice", "d1", 1.0)})
+    assert merged["mail"] is None  # 另一方没改，删除生效
+    assert conflicts == []
+
+
+def test_different_fields_merge_without_conflict():
+    merged, conflicts = merge({"mail": v("alice2", "d1", 2.0)}, {"mail": v("alice", "d2", 3.0)})
+    assert merged["mail"][0] == v("alice2", "d2", 3.0)
+    assert merged["mail"][1] == (THEIRS, "mail")  # 密码取自修改了密码的一方
+    assert conflicts == []
+
+
+@pytest.mark.parametrize("prefer, ours_mtime, kept", [
+    ("newer", 3.0, OURS),
+    ("newer", 2.0, THEIRS),
+    ("ours", 2.0, OURS),
+    ("theirs", 3.0, THEIRS),
+])
+def test_password_conflict_keeps_a_copy(prefer, ours_mtime, kept):
+    ours, theirs = v("alice", "ours", ours_mtime), v("alice", "theirs", 2.5)
+    merged, conflicts = merge({"mail": ours}, {"mail": theirs}, prefer)
+    winner, loser = (ours, theirs) if kept == OURS else (theirs, ours)
+    copy = "mail" + CONFLICT_SUFFIX
+    assert merged["mail"] == (winner[:3] + (max(ours_mtime, 2.5),), (kept, "mail"))
+    assert merged[copy] == (loser, (THEIRS if kept == OURS else OURS, "mail"))
+    assert conflicts == [{"name": "mail", "kind": "modify/modify", "fields": ["password"], "kept": kept,
+                          "copy": copy}]
+
+
+def test_add_add_conflict_copy_name_is_unique():
+    ours = {"new": v("a", "x", 2.0), "new" + CONFLICT_SUFFIX: v("b", "y", 1.0)}
+    theirs = {"new": v("a", "z", 3.0)}
+    merged, conflicts = merge(ours, theirs, base={})
+    assert conflicts[0]["kind"] == "add/add"
+    assert conflicts[0]["copy"] == f"new{CONFLICT_SUFFIX}_2"
+    assert merged["new"][1] == (THEIRS, "new")
+
+
+def test_merge_categories():
+    assert merge_categories(["a", "b"], ["a", "c"], ["b", "d"]) == ["c", "d"]
+    assert merge_categories([], ["a"], ["a", "b"]) == ["a", "b"]
+
+
+def replicas(tmp_path, password="pw"):
+    a_dir, b_dir = str(tmp_path / "a"), str(tmp_path / "b")
+    os.makedirs(a_dir)
+    VaultHeader(os.path.join(a_dir, "vault.header")).create(password, Fernet.generate_key(), target=0)
+    vault = Vault("a", a_dir).unlock(password)
+    for index in range(10):
+        vault.add(f"entry{index}", f"user{index}", f"secret{index}", "工作")
+    state = VaultSync(vault)
+    state.refresh()
+    state.save()
+    vault.unload()
+    shutil.copytree(a_dir, b_dir)
+    return Vault("a", a_dir).unlock(password), Vault("b", b_dir).unlock(password)
+
+
+@pytest.mark.parametrize("later", ["a", "b"])
+def test_sync_prefers_the_later_write(tmp_path, later):
+    a, b = replicas(tmp_path)
+    first, second = (b, a) if later == "a" else (a, b)
+    first.update("entry1", "entry1", "user1", "earlier", "工作")
+    time.sleep(0.01)
+    second.update("entry1", "entry1", "user1", "later", "工作")
+    a.delete("entry2")
+    b.add("fresh", "new", "secret")
+
+    report = sync_vaults(a, b)
+    for vault in (a, b):
+        assert vault.get("entry1")[1] == "later"
+        assert vault.get("entry1" + CONFLICT_SUFFIX)[1] == "earlier"
+        assert "entry2" not in vault.entries
+        assert vault.get("fresh")[1] == "secret"
+    assert a.entries.mtime("entry1") == b.entries.mtime("entry1")
+    assert report["conflicts"][0]["kept"] == ("ours" if later == "a" else "theirs")
+
+    # 再同步一次没有任何差异
+    assert sync_vaults(a, b)["compared"] == 0
+    a.unload()
+    b.unload()
+
+
+def test_sync_after_rotating_the_data_key(tmp_path, capsys):
+    from cli import main
+    from crypto_pool import BatchCipher
+
+    a, b = replicas(tmp_path)
+    assert sync_vaults(a, b)["written"] == {"ours": 0, "theirs": 0}
+    b.unload()
+    new_crypto = BatchCipher(Fernet.generate_key())
+    a.header.rotate(a.key_cache.get(), a.storage, new_crypto)
+    a.unload()
+    new_crypto.shutdown()
+
+    password_file = tmp_path / "password"
+    password_file.write_text("pw\n")
+    assert main(["--dir", str(tmp_path / "a"), "--password-file", str(password_file), "--json", "sync-status"]) == 0
+    # 另一个副本仍是原来的数据密钥，不能再同步，报告错误而不是抛出异常
+    assert main(["--dir", str(tmp_path / "a"), "--password-file", str(password_file), "sync",
+                 str(tmp_path / "b")]) == 1
+    assert "数据密钥不同" in capsys.readouterr().err
+
+    # 更换后复制出的副本可以继续同步
+    shutil.rmtree(tmp_path / "b")
+    shutil.copytree(tmp_path / "a", tmp_path / "b")
+    a, b = Vault("a", str(tmp_path / "a")).unlock("pw"), Vault("b", str(tmp_path / "b")).unlock("pw")
+    b.update("entry1", "entry1", "user1", "changed", "工作")
+    assert sync_vaults(a, b)["written"] == {"ours": 1, "theirs": 0}
+    assert a.get("entry1")[1] == "changed"
+    a.unload()
+    b.unload()
+
+
+def test_sync_state_under_a_stale_key_is_rebuilt(tmp_path):
+    a, b = replicas(tmp_path)
+    with open(a.path("sync.dat"), "wb") as f:
+        f.write(Fernet(Fernet.generate_key()).encrypt(b"{}"))
+    b.update("entry1", "entry1", "user1", "changed", "工作")
+    report = sync_vaults(a, b)
+    # 没有基准，双方都有的不同版本按写入时间取较新的一方
+    assert a.get("entry1")[1] == "changed"
+    assert report["conflicts"][0]["kind"] == "add/add"
+    a.unload()
+    b.unload()
@@ -1,35 +1,90 @@
+import os
 import sys
+from functools import lru_cache
 
 from PyQt5.QtGui import QIcon
 from PyQt5.QtWidgets import (
-    QWidget, QVBoxLayout, QLineEdit, QPushButton,
-    QListWidget, QHBoxLayout, QDesktopWidget, QSplitter, QApplication
+    QWidget, QVBoxLayout, QLineEdit, QPushButton, QLabel, QToolButton, QMenu, QComboBox, QCheckBox,
+    QListWidget, QListView, QHBoxLayout, QDesktopWidget, QSplitter, QApplication
 )
 from PyQt5.QtCore import Qt
 
+from entry_model import EntryListModel
+
+ICON_DIR = "ico"
+
+
+@lru_cache(maxsize=None)
+def icon(name):
+    # 图标在第一次用到时才从磁盘读取，之后复用同一个 QIcon
+    return QIcon(os.path.join(ICON_DIR, name))
+
 
 class PasswordManagerUI(QWidget):
     def __init__(self):
         super().__init__()
 
         self.category_list = QListWidget(self)
-        self.entry_list = QListWidget(self)
+        self.entry_model = EntryListModel(self)
+        self.entry_list = QListView(self)
+        self.entry_list.setModel(self.entry_model)
+        self.entry_list.setUniformItemSizes(True)  # 行高一致，滚动时无需逐行测量
         self.search_input = QLineEdit(self)
+        self.search_all_checkbox = QCheckBox('全部保险库', self)  # 同时搜索其他已解锁的保险库
+        self.breach_filter_checkbox = QCheckBox('只显示已泄露的密码', self)  # 检查过泄露的密码后才显示
+        self.breach_filter_checkbox.setVisible(False)
 
-        self.add_account_button = QPushButton(QIcon("ico/add.ico"), '添加账号', self)
-        self.search_button = QPushButton(QIcon("ico/search.ico"), '搜索', self)
-        self.export_button = QPushButton(QIcon("ico/export.ico"), '导出', self)
-        self.add_category_button = QPushButton(QIcon("ico/add.ico"), '添加分组', self)
+        # 保险库切换和管理
+        self.vault_combo = QComboBox(self)
+        self.vault_button = QToolButton(self)
+        self.vault_button.setText('保险库')
+        self.vault_button.setPopupMode(QToolButton.InstantPopup)
+        self.vault_menu = QMenu(self)
+        self.add_vault_action = self.vault_menu.addAction('添加保险库…')
+        self.remove_vault_action = self.vault_menu.addAction('移除当前保险库')
+        self.lock_vault_action = self.vault_menu.addAction('锁定当前保险库')
+        self.vault_button.setMenu(self.vault_menu)
+
+        # 图标在窗口显示后由 load_icons() 设置，不占用启动时间
+        self.add_account_button = QPushButton('添加账号', self)
+        self.search_button = QPushButton('搜索', self)
+        self.import_button = QPushButton('导入', self)
+        self.export_button = QPushButton('导出', self)
+        self.add_category_button = QPushButton('添加分组', self)
+        self.status_label = QLabel(self)  # 保存状态
+
+        # 主密码相关操作
+        self.security_button = QToolButton(self)
+        self.security_button.setText('安全')
+        self.security_button.setPopupMode(QToolButton.InstantPopup)
+        self.security_menu = QMenu(self)
+        self.change_password_action = self.security_menu.addAction('修改主密码')
+        self.rotate_key_action = self.security_menu.addAction('更换数据密钥')
+        self.breach_check_action = self.security_menu.addAction('检查泄露的密码…')
+        self.security_button.setMenu(self.security_menu)
 
         self.initUI()
 
+    def load_icons(self):
+        self.add_account_button.setIcon(icon("add.ico"))
+        self.search_button.setIcon(icon("search.ico"))
+        self.import_button.setIcon(icon("add.ico"))
+        self.export_button.setIcon(icon("export.ico"))
+        self.add_category_button.setIcon(icon("add.ico"))
+        self.setWindowIcon(icon("icon.ico"))
+
     def initUI(self):
         # 顶部按钮布局
         top_layout = QHBoxLayout()
+        top_layout.addWidget(self.vault_combo)
+        top_layout.addWidget(self.vault_button)
         top_layout.addWidget(self.add_account_button)
         top_layout.addWidget(self.search_input)
+        top_layout.addWidget(self.search_all_checkbox)
         top_layout.addWidget(self.search_button)
+        top_layout.addWidget(self.import_button)
         top_layout.addWidget(self.export_button)
+        top_layout.addWidget(self.security_button)
 
         # 左侧分类栏
         category_layout = QVBoxLayout()
@@ -38,6 +93,7 @@ class PasswordManagerUI(QWidget):
 
         # 右侧账户信息栏
         entry_layout = QVBoxLayout()
+        entry_layout.addWidget(self.breach_filter_checkbox)
         entry_layout.addWidget(self.entry_list)
 
         # 主布局，使用 QSplitter 实现左右布局
@@ -54,6 +110,7 @@ class PasswordManagerUI(QWidget):
         main_layout = QVBoxLayout()
         main_layout.addLayout(top_layout)
         main_layout.addWidget(splitter)
+        main_layout.addWidget(self.status_label)
 
         self.setLayout(main_layout)
         self.setWindowTitle('PwManager')
@@ -71,4 +128,5 @@ if __name__ == '__main__':
     app = QApplication(sys.argv)
     ex = PasswordManagerUI()
     ex.show()
+    ex.load_icons()
     sys.exit(app.exec_())
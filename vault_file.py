@@ -0,0 +1,308 @@
+import base64
+import binascii
+import json
+import mmap
+import struct
+import sys
+import threading
+import zlib
+
+from entry_store import EntryRecord, LazyEntries
+from profiling import TRACER, timed
+from storage import VaultStorage, atomic_write
+
+MAGIC = b"PWMV"
+FORMAT_VERSION = 1
+CODECS = ("zlib", "zstd")
+HEADER = struct.Struct("<4sBBI")  # 魔数、版本、压缩算法、索引长度
+CHUNK = struct.Struct("<I")  # 块内压缩部分的长度
+ENTRY = struct.Struct("<II")  # 块内每个条目：账号长度、密码密文长度
+_FROM_URLSAFE = bytes.maketrans(b"-_", b"+/")
+_TO_URLSAFE = bytes.maketrans(b"+/", b"-_")
+
+
+def _token_bytes(token):
+    # Fernet 密文（urlsafe base64 字符串）-> 原始字节
+    return binascii.a2b_base64(token.encode().translate(_FROM_URLSAFE))
+
+
+def _token_text(data):
+    return binascii.b2a_base64(data, newline=False).translate(_TO_URLSAFE).decode()
+
+
+def _codec(name):
+    # 返回 (压缩, 解压)；zstd 需要可选依赖 zstandard，用到时才导入
+    if name == "zlib":
+        return (lambda data: zlib.compress(data, 6)), zlib.decompress
+    if name == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor().compress, zstandard.ZstdDecompressor().decompress
+    raise ValueError(f"未知的压缩算法：{name}")
+
+
+class ChunkedEntries(LazyEntries):
+    """
+    分块文件的条目集合：加载时只有名称（来自索引），账号和密码的密文在第一次用到时按块读出，
+    同一块的条目一起解密、解压并填入记录。之后被修改或删除的条目不再从块中读取。
+    合并重写文件后，与新文件内容相同的记录重新清空、指向新文件中的块（见 ChunkedStorage._remap）；
+    块号在各次重写之间不重复，按旧块号读出的内容不会填进记录。
+    """
+
+    def __init__(self, crypto, storage, cache=None):
+        super().__init__(crypto, cache)
+        self.storage = storage
+        self._chunk_of = {}  # 尚未读入的名称 -> 块号
+
+    def add_name(self, name, chunk, mtime=None):
+        name = sys.intern(name)
+        self.records[name] = EntryRecord(None, None, mtime)
+        self._chunk_of[name] = chunk
+
+    def _record(self, name):
+        record = self.records[name]
+        tried = set()
+        while record.secret is None:
+            chunk = self._chunk_of.get(name)
+            if chunk is None or chunk in tried:
+                break
+            tried.add(chunk)
+            self._load_chunks([chunk])  # 读的同时文件被重写时这一块读不到，按新的块号再读
+        return record
+
+    def _load_chunks(self, chunks):
+        for chunk in sorted(chunks):
+            rows = self.storage.read_chunk(chunk)
+            with self._index_lock:
+                for name, account, secret in rows:
+                    if self._chunk_of.get(name) == chunk:
+                        del self._chunk_of[name]
+                        record = self.records[name]
+                        record.account = account
+                        record.secret = secret
+
+    def load_all(self):
+        self._load_chunks(set(self._chunk_of.values()))
+
+    @property
+    def index(self):
+        # 建立索引时持有 _index_lock，要先在锁外读入全部块
+        self.load_all()
+        return super().index
+
+    def account(self, name):
+        return self._record(name).account
+
+    def secret(self, name):
+        return self._record(name).secret
+
+    def iter_accounts(self):
+        self.load_all()
+        return super().iter_accounts()
+
+    def iter_account_batches(self, batch_size=4096):
+        # 已读入的条目直接用，其余逐块读出，不写回记录；期间文件被重写时接着读新的块，跳过已产生的名称
+        records = list(self.records.items())
+        batch = [(name, record.account) for name, record in records if record.secret is not None]
+        seen = {name for name, account in batch}
+        yield batch
+        done = set()
+        while True:
+            chunks = sorted(set(self._chunk_of.values()) - done)
+            if not chunks:
+                break
+            for chunk in chunks:
+                done.add(chunk)
+                batch = [(name, account) for name, account, secret in self.storage.read_chunk(chunk)
+                         if self._chunk_of.get(name) == chunk and name not in seen]
+                seen.update(name for name, account in batch)
+                yield batch
+
+    def snapshot(self):
+        self.load_all()
+        return super().snapshot()
+
+    def set_encrypted(self, name, account, secret, password=None, mtime=None):
+        # 先作废块中的旧值，正在读块的线程就不会再覆盖新值
+        self._chunk_of.pop(name, None)
+        super().set_encrypted(name, account, secret, password, mtime)
+
+    def __delitem__(self, name):
+        super().__delitem__(name)
+        self._chunk_of.pop(name, None)
+
+
+class ChunkedStorage(VaultStorage):
+    """
+    二进制分块文件后端（vault.pwv），修改仍先追加到加密的日志（vault.pwv.journal），日志过长时重写整个文件。
+
+    文件格式：头部 HEADER，之后是加密的索引，再之后是各个块。
+    索引为 {"categories": [分组名], "chunks": [[偏移, 长度, 分组, [名称]]], "mtimes": {名称: 写入时间}}，
+    偏移从索引之后算起（旧文件的索引中没有 mtimes）；
+    每个块只含同一分组的最多 chunk_entries 个条目，按索引中的名称顺序排列：
+    CHUNK + 压缩的（ENTRY + 账号）序列 + 各条目密码密文的原始字节（密文无法压缩，不再经过压缩）。
+    索引和块再用 Fernet 加密，文件中保存 Fernet 密文的原始字节而不是 base64；
+    块内的密码仍是单独加密的 Fernet 密文，解密一个块不会让整块的密码明文留在内存中。
+    文件用 mmap 只读映射，打开分组或读取一个密码时只解密用到的块。
+    """
+
+    def __init__(self, crypto, path="vault.pwv", journal_path=None, codec="zlib", chunk_entries=256,
+                 compact_min_records=500):
+        super().__init__(crypto, entries_path=path, categories_path=None,
+                         journal_path=journal_path or path + ".journal", compact_min_records=compact_min_records)
+        if codec not in CODECS:
+            raise ValueError(f"未知的压缩算法：{codec}")
+        self.codec = codec
+        self.chunk_entries = chunk_entries
+        self._map = None
+        self._map_lock = threading.Lock()
+        self._chunks = {}  # 块号 -> (文件偏移, 长度, [名称])
+        self._next_chunk = 0  # 块号一直递增，重写文件后旧块号不会指向新文件中的块
+        self._decompress = None
+
+    def new_entries(self):
+        return ChunkedEntries(self.crypto, self)
+
+    def _encrypt(self, data):
+        return base64.urlsafe_b64decode(self.crypto.cipher.encrypt(data))
+
+    def _decrypt(self, data):
+        return self.crypto.cipher.decrypt(base64.urlsafe_b64encode(data))
+
+    def _pack_chunk(self, compress, accounts, secrets, names):
+        header = bytearray()
+        tail = []
+        for name in names:
+            account = accounts[name].encode()
+            secret = _token_bytes(secrets[name])
+            header += ENTRY.pack(len(account), len(secret))
+            header += account
+            tail.append(secret)
+        header = compress(bytes(header))
+        return b"".join([CHUNK.pack(len(header)), header, *tail])
+
+    def _open_map(self):
+        # 在 _map_lock 内调用：映射文件并解密索引，返回索引和块数据的起始位置；文件不存在时返回 None
+        self._close_map()
+        try:
+            with open(self.entries_path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return None
+        magic, version, codec, index_length = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != FORMAT_VERSION or codec >= len(CODECS):
+            raise ValueError(f"{self.entries_path} 不是可识别的保险库文件")
+        self._decompress = _codec(CODECS[codec])[1]
+        # 密钥不对时在这里抛出 InvalidToken
+        index = json.loads(self._decompress(self._decrypt(self._map[HEADER.size:HEADER.size + index_length])))
+        return index, HEADER.size + index_length
+
+    def _add_chunks(self, index, data_start):
+        # 在 _map_lock 内调用：登记索引中的块，返回 [(块号, 分组, [名称])]
+        result = []
+        for offset, length, category, names in index["chunks"]:
+            names = [sys.intern(name) for name in names]
+            chunk = self._next_chunk
+            self._next_chunk += 1
+            self._chunks[chunk] = (data_start + offset, length, names)
+            result.append((chunk, category, names))
+        return result
+
+    def _read_snapshot(self):
+        with self._map_lock:
+            opened = self._open_map()
+            if opened is None:
+                return False
+            index, data_start = opened
+            chunks = self._add_chunks(index, data_start)
+
+        mtimes = index.get("mtimes", {})
+        for category in index["categories"]:
+            self.categories.add_category(category)
+        for chunk, category, names in chunks:
+            for name in names:
+                self.entries.add_name(name, chunk, mtimes.get(name))
+                self.categories.assign(name, category)
+        return False
+
+    @timed("io.read_chunk")
+    def read_chunk(self, chunk):
+        # 返回块中的 [(名称, 账号, 加密的密码)]；文件已被重写时返回空列表（此前所有块都已读入）
+        with self._map_lock:
+            if self._map is None or chunk not in self._chunks:
+                return []
+            offset, length, names = self._chunks[chunk]
+            data = self._map[offset:offset + length]
+        data = self._decrypt(data)
+        TRACER.count("chunks decrypted")
+        header_length, = CHUNK.unpack_from(data)
+        header = self._decompress(data[CHUNK.size:CHUNK.size + header_length])
+        rows = []
+        position = 0
+        secret_position = CHUNK.size + header_length
+        for name in names:
+            account_length, secret_length = ENTRY.unpack_from(header, position)
+            position += ENTRY.size
+            account = header[position:position + account_length].decode()
+            position += account_length
+            secret = _token_text(data[secret_position:secret_position + secret_length])
+            secret_position += secret_length
+            rows.append((name, account, secret))
+        return rows
+
+    def _write_snapshot(self, accounts, secrets, categories, mtimes):
+        compress = _codec(self.codec)[0]
+        chunks = []
+        blobs = []
+        offset = 0
+        for category, names in categories.items():
+            names = [name for name in names if name in accounts]
+            for start in range(0, len(names), self.chunk_entries):
+                batch = names[start:start + self.chunk_entries]
+                blob = self._encrypt(self._pack_chunk(compress, accounts, secrets, batch))
+                chunks.append([offset, len(blob), category, batch])
+                blobs.append(blob)
+                offset += len(blob)
+        index = {"categories": list(categories), "chunks": chunks, "mtimes": mtimes}
+        index = self._encrypt(compress(json.dumps(index).encode()))
+        data = b"".join([HEADER.pack(MAGIC, FORMAT_VERSION, CODECS.index(self.codec), len(index)), index, *blobs])
+        # 写快照前所有块都已读入内存；先解除映射，Windows 上映射中的文件不能被替换
+        with self._map_lock:
+            self._close_map()
+        atomic_write(self.entries_path, data)
+        self._remap(accounts, secrets)
+
+    def _remap(self, accounts, secrets):
+        # 重新映射刚写出的文件，与文件内容相同的记录清空，之后用到时再按块读出，内存回到只有名称的状态；
+        # 写快照之后又被修改的记录保留。修改在 state_lock 内应用（或与合并在同一线程中），这里同样持有它
+        with self._map_lock:
+            chunks = self._add_chunks(*self._open_map())
+        entries = self.entries
+        with self.state_lock, entries._index_lock:
+            for chunk, category, names in chunks:
+                for name in names:
+                    record = entries.records.get(name)
+                    if record is not None and record.secret == secrets[name] and record.account == accounts[name]:
+                        record.account = None
+                        record.secret = None
+                        entries._chunk_of[name] = chunk
+        TRACER.count("records released", len(entries._chunk_of))
+
+    def compact(self):
+        # 新文件要包含全部条目，先读入还没读过的块
+        self.entries.load_all()
+        super().compact()
+
+    def rekey(self, new_crypto):
+        with self.flush_lock:
+            self.entries.load_all()
+            super().rekey(new_crypto)
+
+    def _close_map(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._chunks = {}
+
+    def close(self):
+        with self._map_lock:
+            self._close_map()
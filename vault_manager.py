@@ -0,0 +1,327 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cryptography.fernet import Fernet, InvalidToken
+
+from categories import ALL_CATEGORY, UNGROUPED_CATEGORY, CategoryStore, category_name
+from crypto_pool import BatchCipher
+from master_key import KeyCache, VaultHeader
+from profiling import StartupProfile
+from storage import atomic_write, migrate_backend, open_backend
+
+REGISTRY_PATH = "vaults.json"
+DEFAULT_VAULT = "默认"
+
+
+class Vault:
+    """
+    一个保险库：目录 directory 中的 vault.header 和存储文件（格式见 storage.open_backend）。
+    只有解锁后才有 crypto / storage 和加载的条目、分组；unload() 写完排队的修改后关闭存储、
+    丢弃条目和全部密钥，之后需要重新输入主密码。
+    条目的读取、增删改、搜索、导入导出也在这里，不依赖 Qt，图形界面和命令行（cli.py）共用。
+    """
+    remote = False  # 通过代理进程访问时为 True（见 agent_client.AgentVault），此时本进程没有密钥
+
+    def __init__(self, name, directory=".", backend=None, key_timeout=300):
+        self.name = name
+        self.directory = directory
+        self.backend = backend  # BACKENDS 之一，省略时按已有的文件自动选择
+        self.header = VaultHeader(self.path("vault.header"))
+        self.key_cache = KeyCache(key_timeout)  # 派生密钥，确认主密码时在有效期内不必重新派生
+        self.crypto = None
+        self.storage = None
+        self.entries = {}
+        self.categories = CategoryStore()
+        self.save_worker = None  # 由界面在加载完成后创建
+        self.breached = None  # 泄露检查的结果 {名称: 出现次数}，尚未检查时为 None
+        self.health = None  # password_health.PasswordHealth，第一次打开 "密码健康" 时建立
+        self.last_used = time.monotonic()
+
+    def path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    @property
+    def loaded(self):
+        return self.storage is not None
+
+    def touch(self):
+        self.last_used = time.monotonic()
+
+    def load_legacy_key(self):
+        # 旧版本把密钥明文保存在 secret.key 中；设置主密码时沿用它作为数据密钥，条目不必重新加密
+        try:
+            with open(self.path("secret.key"), "rb") as key_file:
+                return key_file.read()
+        except FileNotFoundError:
+            return Fernet.generate_key()
+
+    def needs_password(self):
+        # 解锁是否需要输入主密码；代理进程已解锁时不需要
+        return True
+
+    def unlock(self, password, profile=None):
+        # 在后台线程执行：从主密码派生密钥（按标定的参数，约 0.5 秒），再读取保险库；主密码错误时抛出 WrongPassword
+        profile = profile or StartupProfile()
+        legacy = False
+        with profile.phase("kdf"):
+            if self.header.exists():
+                kek, data_key = self.header.load().unlock(password)
+            else:
+                legacy = os.path.exists(self.path("secret.key"))
+                data_key = self.load_legacy_key()
+                kek = self.header.create(password, data_key)
+        self.key_cache.put(kek)
+        try:
+            self.open(data_key, profile)
+        except InvalidToken:
+            # 上次更换数据密钥时条目已用新密钥写完、头部还没更新
+            next_key = self.header.pending_key(kek)
+            if next_key is None:
+                raise
+            self.open(next_key, profile)
+            self.header.finish_rotation(kek, next_key)
+        if legacy:
+            os.remove(self.path("secret.key"))  # 数据密钥已由主密码保护，不再留明文副本
+        self.touch()
+        return self
+
+    def open(self, key, profile=None):
+        # 成功读取后才设置 crypto / storage，失败时保险库仍是未加载状态
+        from vault_sync import SYNC_FILE
+
+        crypto = BatchCipher(key)
+        storage, migrate_from = open_backend(crypto, self.backend, directory=self.directory)
+        storage.keyed_files.append(self.path(SYNC_FILE))
+        try:
+            with (profile or StartupProfile()).phase("decrypt"):
+                if migrate_from is not None:
+                    migrate_backend(migrate_from, storage)
+                entries, categories = storage.load()
+        except BaseException:
+            storage.close()
+            crypto.shutdown()
+            raise
+        self.crypto, self.storage = crypto, storage
+        self.entries, self.categories = entries, categories
+
+    def get(self, name):
+        # 返回 (账号, 密码, 分组)，条目不存在时抛出 KeyError
+        account, password = self.entries[name]
+        return account, password, self.categories.category_of(name)
+
+    def search(self, query, limit=None, cancelled=None):
+        # 按相关度排序的条目名称；没有建立索引时逐批扫描，不为一次查询建立整个索引
+        return self.entries.search(query, limit, cancelled)
+
+    def _category(self, category):
+        # 省略分组或选择 "全部" 时归入 "未分组"，新分组先单独记录，与分组列表中的顺序一致
+        if not category or category == ALL_CATEGORY:
+            category = UNGROUPED_CATEGORY
+        category = category_name(category)
+        if category not in self.categories:
+            self.storage.add_category(category)
+        return category
+
+    def add(self, name, account, password, category=None):
+        # 名称重复时自动加 _N 后缀，返回实际使用的名称
+        name = self.entries.unique_name(name)
+        self.storage.put(name, (account, password), self._category(category))
+        return name
+
+    def update(self, original_name, name, account, password, category=None):
+        # 改名时旧条目与分组归属在同一条记录里移除
+        if original_name not in self.entries:
+            raise KeyError(original_name)
+        self.storage.put(name, (account, password), self._category(category), old_name=original_name)
+
+    def delete(self, name):
+        if name not in self.entries:
+            raise KeyError(name)
+        self.storage.delete(name)
+
+    def read_import(self, path, progress=None, cancelled=None):
+        # 可在后台线程执行：解析文件并批量加密密码，返回 [(名称, 账号, 密文, 分组)]，还没有写入
+        from importer import read_import_file
+
+        return read_import_file(path, self.crypto, progress, cancelled)
+
+    def import_items(self, items):
+        # 与已有条目和文件内部重名的名称一次性批量处理，作为一次提交写入；返回导入的条数
+        names = self.entries.unique_names(name for name, account, secret, category in items)
+        items = [(unique_name, account, secret, category or UNGROUPED_CATEGORY)
+                 for unique_name, (name, account, secret, category) in zip(names, items)]
+        self.storage.put_many(items)
+        return len(items)
+
+    def export_rows(self):
+        # 在修改条目的线程中调用：复制各分组的名称列表，返回 (逐批解密的行, 总行数)，行可在后台线程中消费
+        from exporter import iter_export_rows, snapshot_categories
+
+        category_names = snapshot_categories(self.categories)
+        total = sum(len(names) for category, names in category_names)
+        return iter_export_rows(self.entries, category_names), total
+
+    def export(self, path, progress=None, cancelled=None):
+        # 格式由扩展名决定（见 exporter.EXPORT_FORMATS）；返回导出的行数
+        from exporter import export_rows
+
+        rows, total = self.export_rows()
+        export_rows(path, rows, total, progress, cancelled)
+        return total
+
+    def purge_caches(self):
+        if self.storage is not None:
+            self.entries.cache.purge_expired()
+        self.key_cache.purge_expired()
+
+    def lock(self):
+        # 用户要求锁定：丢弃密钥，之后需要重新输入主密码
+        self.unload()
+
+    def unload(self, flush=True):
+        # 写入失败时抛出异常，保险库保持加载状态；flush 为 False 时丢弃尚未写入的修改
+        if self.save_worker is not None:
+            self.save_worker.stop()
+        if self.storage is not None:
+            try:
+                if flush:
+                    self.storage.flush()
+            except BaseException:
+                if self.save_worker is not None:
+                    self.save_worker.start()
+                raise
+            self.storage.close()
+            self.storage = None
+        if self.crypto is not None:
+            self.crypto.shutdown()
+            self.crypto = None
+        self.save_worker = None
+        self.breached = None
+        self.health = None
+        self.entries = {}
+        self.categories = CategoryStore()
+        self.key_cache.clear()
+
+
+class VaultManager:
+    """
+    已登记的保险库（vaults.json，没有时只有当前目录中的默认保险库）。
+    保险库在第一次切换过去时才解锁和加载；unload_idle 卸载空闲超过 idle_timeout 秒的非当前保险库并丢弃其密钥；
+    search 在线程池中并行搜索所有已加载的保险库。
+    """
+
+    def __init__(self, path=REGISTRY_PATH, backend=None, key_timeout=300, idle_timeout=900, agent=None):
+        self.path = path
+        self.key_timeout = key_timeout
+        self.idle_timeout = idle_timeout
+        self.vaults = {}  # 名称 -> Vault，按登记顺序
+        self._executor = None
+        try:
+            with open(path, "r") as f:
+                items = json.load(f)["vaults"]
+        except FileNotFoundError:
+            items = [{"name": DEFAULT_VAULT, "directory": "."}]
+        for item in items:
+            vault = Vault(item["name"], item["directory"], item.get("backend"), key_timeout)
+            self.vaults[vault.name] = vault
+        # --backend 只作用于默认保险库
+        default = self.vaults.get(DEFAULT_VAULT)
+        if default is not None and backend is not None:
+            default.backend = backend
+        # agent 为代理进程的套接字路径（空字符串表示按目录确定），启动时打开的第一个保险库改为通过代理进程访问
+        if agent is not None:
+            from agent_client import AgentVault
+
+            first = next(iter(self.vaults.values()))
+            self.vaults[first.name] = AgentVault(first.name, first.directory, agent or None, key_timeout)
+
+    def __iter__(self):
+        return iter(self.vaults.values())
+
+    def __len__(self):
+        return len(self.vaults)
+
+    def __getitem__(self, name):
+        return self.vaults[name]
+
+    def names(self):
+        return list(self.vaults)
+
+    def loaded(self):
+        return [vault for vault in self.vaults.values() if vault.loaded]
+
+    def save(self):
+        items = []
+        for vault in self.vaults.values():
+            item = {"name": vault.name, "directory": vault.directory}
+            if vault.backend is not None and vault.name != DEFAULT_VAULT:
+                item["backend"] = vault.backend
+            items.append(item)
+        atomic_write(self.path, json.dumps({"vaults": items}, ensure_ascii=False, indent=2))
+
+    def register(self, name, directory, backend=None):
+        if not name or name in self.vaults:
+            raise ValueError(f"保险库名称为空或已存在：{name}")
+        directory = os.path.abspath(directory)
+        if any(os.path.abspath(vault.directory) == directory for vault in self.vaults.values()):
+            raise ValueError(f"目录已登记为其他保险库：{directory}")
+        vault = self.vaults[name] = Vault(name, directory, backend, self.key_timeout)
+        self.save()
+        return vault
+
+    def unregister(self, name):
+        # 只从列表中移除，保险库文件保留
+        if len(self.vaults) <= 1:
+            raise ValueError("至少要保留一个保险库")
+        self.vaults[name].unload()
+        del self.vaults[name]
+        self.save()
+
+    def unload_idle(self, active=None, now=None):
+        # 返回已卸载的保险库名称；写入失败的保留到下次再试
+        now = time.monotonic() if now is None else now
+        unloaded = []
+        for vault in self.loaded():
+            if vault is active or now - vault.last_used < self.idle_timeout:
+                continue
+            try:
+                vault.unload()
+            except Exception:
+                continue
+            unloaded.append(vault.name)
+        return unloaded
+
+    def purge_caches(self):
+        for vault in self.vaults.values():
+            vault.purge_caches()
+
+    def search(self, query, limit=None, cancelled=None):
+        """
+        并行搜索所有已加载的保险库，返回 [(保险库名称, 条目名称)]，按保险库的登记顺序排列，每个保险库内按相关度排序。
+        已建立索引的保险库直接查索引，其余逐批扫描（见 LazyEntries.search），不会为此解密并常驻整个保险库。
+        """
+        vaults = self.loaded()
+        if not vaults:
+            return []
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1),
+                                                thread_name_prefix="vault-search")
+        futures = [(vault.name, self._executor.submit(vault.entries.search, query, limit, cancelled))
+                   for vault in vaults]
+        results = []
+        for name, future in futures:
+            try:
+                names = future.result()
+            except Exception:
+                continue  # 搜索期间被卸载的保险库
+            results.extend((name, entry) for entry in names)
+        return results
+
+    def close(self):
+        for vault in self.loaded():
+            vault.unload()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,531 @@
+"""
+在不同机器上的同一个保险库副本之间同步：直接合并两个目录（cli.py sync），或导出只含变化条目的同步包，
+带到另一台机器上导入（cli.py sync-export / sync-import）。
+
+每个副本在目录中的 sync.dat 里记录每个条目的版本 (账号, 分组, 密码的 HMAC, 修改时间)，以及与每个对端
+上次同步后双方共同的状态（三方合并的基准）。比较两份状态时先比较 Merkle 摘要（MerkleTree），只展开哈希
+不同的子树；需要合并的条目按基准逐字段三方合并，双方改得不同的字段按 prefer 取一方并报告冲突，
+被放弃的密码另存为 "名称（冲突）"。
+同步包中的条目仍是用数据密钥加密的记录，只有同一个保险库的副本（数据密钥相同）之间可以同步。
+"""
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import platform
+import time
+import zlib
+from functools import partial
+
+from cryptography.fernet import InvalidToken
+
+from categories import ALL_CATEGORY, UNGROUPED_CATEGORY
+from profiling import TRACER, timed
+from storage import atomic_write
+
+SYNC_FILE = "sync.dat"
+BUNDLE_FORMAT = "pwmanager-sync"
+BUNDLE_VERSION = 1
+FANOUT = 16
+DEPTH = 3  # 16 ** 3 = 4096 个叶子桶，10 万条目时每桶约 25 个
+ACCOUNT, CATEGORY, DIGEST, MTIME = range(4)  # 版本中各字段的位置
+FIELDS = ("account", "category", "password")
+PREFER = ("newer", "ours", "theirs")
+OURS, THEIRS = "ours", "theirs"
+CONFLICT_SUFFIX = "（冲突）"
+MAX_EXPORTS = 4  # 发给未知对端的同步包最多保留几份基准
+
+
+class SyncError(Exception):
+    pass
+
+
+def sync_key(crypto):
+    # 由数据密钥派生，只有同一个保险库的副本算出的密码 HMAC 相同
+    key = crypto.key if isinstance(crypto.key, bytes) else crypto.key.encode()
+    return hmac.new(key, b"pwmanager sync", hashlib.sha256).digest()
+
+
+def _password_digest(key, password):
+    # 在加解密线程中执行：明文（bytes）-> HMAC，明文不返回
+    return hmac.new(key, password, hashlib.sha256).hexdigest()[:32]
+
+
+def _token_id(secret):
+    # 密文的指纹：密文不变时不必重新解密
+    return hashlib.blake2b(secret.encode(), digest_size=8).hexdigest()
+
+
+def content_hash(name, version):
+    # 修改时间不参与：内容相同的条目在两边视为相同
+    data = "\0".join((name,) + tuple(version[:MTIME])).encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(data, digest_size=16).digest(), "big")
+
+
+def same(a, b):
+    # 两个版本（可以为 None，表示不存在）内容是否相同
+    if a is None or b is None:
+        return a is b
+    return a[:MTIME] == b[:MTIME]
+
+
+class MerkleTree:
+    """
+    条目版本的 Merkle 摘要：名称按哈希分到 FANOUT ** DEPTH 个叶子桶，叶子是桶内条目内容哈希的哈希，
+    每 FANOUT 个子节点合成一个父节点。diff 从根开始只展开哈希不同的子树，返回不同的叶子桶；
+    两个保险库只有少数条目不同时，只需比较这些桶里的条目。
+    """
+
+    def __init__(self, versions):
+        count = FANOUT ** DEPTH
+        self.buckets = [[] for _ in range(count)]
+        sums = [0] * count
+        for name, version in versions.items():
+            bucket = zlib.crc32(name.encode("utf-8")) % count
+            self.buckets[bucket].append(name)
+            sums[bucket] += content_hash(name, version)
+        # 叶子是桶内内容哈希之和（与顺序无关，不必排序）
+        level = [(total % (1 << 128)).to_bytes(16, "big") for total in sums]
+        self.levels = [level]  # levels[0] 为叶子，levels[-1] 为 [根]
+        while len(level) > 1:
+            level = [hashlib.blake2b(b"".join(level[i:i + FANOUT]), digest_size=16).digest()
+                     for i in range(0, len(level), FANOUT)]
+            self.levels.append(level)
+
+    @property
+    def root(self):
+        return self.levels[-1][0].hex()
+
+    def diff(self, other):
+        # 返回 (哈希不同的叶子桶编号, 比较过的节点数)
+        examined = 1
+        if self.levels[-1][0] == other.levels[-1][0]:
+            return [], examined
+        frontier = [0]
+        for depth in range(len(self.levels) - 2, -1, -1):
+            level, other_level = self.levels[depth], other.levels[depth]
+            children = []
+            for node in frontier:
+                for child in range(node * FANOUT, node * FANOUT + FANOUT):
+                    examined += 1
+                    if level[child] != other_level[child]:
+                        children.append(child)
+            frontier = children
+        TRACER.count("sync nodes examined", examined)
+        return frontier, examined
+
+    def names(self, buckets):
+        return {name for bucket in buckets for name in self.buckets[bucket]}
+
+
+def differing_names(ours, theirs):
+    # 两份版本中内容不同的条目名称，以及比较过的 Merkle 节点数
+    ours_tree, theirs_tree = MerkleTree(ours), MerkleTree(theirs)
+    buckets, examined = ours_tree.diff(theirs_tree)
+    names = ours_tree.names(buckets) | theirs_tree.names(buckets)
+    return {name for name in names if not same(ours.get(name), theirs.get(name))}, examined
+
+
+def _merge_fields(base, ours, theirs, prefer):
+    # 逐字段三方合并，返回 (版本, 冲突的字段, 冲突时选中的一方)
+    winner = OURS if prefer == OURS or (prefer == "newer" and ours[MTIME] >= theirs[MTIME]) else THEIRS
+    preferred = ours if winner == OURS else theirs
+    values, conflicted = [], []
+    for field in (ACCOUNT, CATEGORY, DIGEST):
+        if ours[field] == theirs[field]:
+            value = ours[field]
+        elif base is not None and ours[field] == base[field]:
+            value = theirs[field]
+        elif base is not None and theirs[field] == base[field]:
+            value = ours[field]
+        else:
+            value = preferred[field]
+            conflicted.append(FIELDS[field])
+        values.append(value)
+    return tuple(values) + (max(ours[MTIME], theirs[MTIME]),), conflicted, winner
+
+
+def merge_entries(base, ours, theirs, names, prefer="newer"):
+    """
+    三方合并 names 中的条目。返回 ({名称: (版本, (来源, 来源中的名称)) 或 None 表示删除}, [冲突])，
+    来源 OURS / THEIRS 是密码密文取自的一方。只有一方修改时采用修改；一方删除、另一方修改时保留修改；
+    双方都修改时逐字段合并，密码冲突时被放弃的一方另存为 "名称（冲突）"。
+    """
+    merged, conflicts = {}, []
+    taken = None
+    for name in sorted(names):
+        b, o, t = base.get(name), ours.get(name), theirs.get(name)
+        if same(o, t) or same(t, b):
+            merged[name] = None if o is None else (o, (OURS, name))
+            continue
+        if same(o, b):
+            merged[name] = None if t is None else (t, (THEIRS, name))
+            continue
+        if o is None or t is None:
+            side = THEIRS if o is None else OURS
+            merged[name] = (t, (THEIRS, name)) if o is None else (o, (OURS, name))
+            conflicts.append({"name": name, "kind": "delete/modify", "kept": side})
+            continue
+        version, fields, winner = _merge_fields(b, o, t, prefer)
+        side = OURS if version[DIGEST] == o[DIGEST] else THEIRS
+        merged[name] = (version, (side, name))
+        conflict = {"name": name, "kind": "add/add" if b is None else "modify/modify", "fields": fields,
+                    "kept": winner}
+        if "password" in fields:
+            if taken is None:
+                taken = set(ours) | set(theirs) | set(merged)
+            copy = f"{name}{CONFLICT_SUFFIX}"
+            suffix = 1
+            while copy in taken:
+                suffix += 1
+                copy = f"{name}{CONFLICT_SUFFIX}_{suffix}"
+            taken.add(copy)
+            loser, loser_side = (t, THEIRS) if side == OURS else (o, OURS)
+            merged[copy] = (loser, (loser_side, name))
+            conflict["copy"] = copy
+        if fields:
+            conflicts.append(conflict)
+    return merged, conflicts
+
+
+def merge_categories(base, ours, theirs):
+    # 分组列表的三方合并：一方删除、另一方未新建的分组删除，双方新建的都保留，顺序以本方为准
+    base, ours_set, theirs_set = set(base), set(ours), set(theirs)
+    result = [c for c in ours if c in theirs_set or c not in base]
+    return result + [c for c in theirs if c not in ours_set and c not in base]
+
+
+class VaultSync:
+    """
+    一个已解锁保险库的同步状态，压缩后用数据密钥加密保存在目录中的 sync.dat：
+    replica 是本副本的编号（目录被复制到别处后重新生成），entries 为 {名称: [密文指纹, 版本]}，
+    bases 为 {对端编号: {"entries", "categories", "root", "time"}}。
+    修改时间是存储中记录的条目写入时间（LazyEntries.mtime），合并写入的条目沿用合并结果的时间，
+    两边记录的相同；只有没有记录时间的旧数据才用 refresh 第一次发现条目变化的时间。
+    """
+
+    def __init__(self, vault):
+        if vault.crypto is None:
+            raise SyncError("同步需要在本进程中解锁保险库")
+        self.vault = vault
+        self.path = vault.path(SYNC_FILE)
+        self.key = sync_key(vault.crypto)
+        self.fingerprint = hashlib.sha256(self.key).hexdigest()[:16]
+        location = [platform.node(), os.path.abspath(vault.directory)]
+        state = self._load()
+        copied = state.get("location") != location
+        if copied:
+            # 目录是复制来的（或第一次同步）：作为新的副本；密文指纹和版本仍然有效，
+            # 与其他对端的基准属于原来的目录，复制前最后记录的状态就是与原副本共同的基准
+            state = {"replica": os.urandom(8).hex(), "entries": state.get("entries", {}), "bases": {},
+                     "origin": state.get("replica"), "categories": state.get("categories", [])}
+        self.location = location
+        self.replica = state["replica"]
+        self._entries = {name: [token, tuple(version)] for name, (token, version) in state["entries"].items()}
+        self.bases = {peer: self._expand(base) for peer, base in state["bases"].items()}
+        if copied and state["origin"] is not None:
+            self.set_base(state["origin"], self.versions(), state["categories"])
+
+    def _load(self):
+        try:
+            with open(self.path, "rb") as f:
+                return json.loads(zlib.decompress(self.vault.crypto.cipher.decrypt(f.read())).decode("utf-8"))
+        except FileNotFoundError:
+            return {}
+        except InvalidToken:
+            # 用更换前的数据密钥加密（例如更换中途退出）：状态都可以重建，按第一次同步处理，
+            # 与各对端的下一次同步没有基准，双方都有的不同修改会作为冲突报告
+            TRACER.count("sync state discarded")
+            return {}
+
+    def _expand(self, base):
+        # 基准保存为与当前条目的差异（同步后通常为空），读取时还原
+        entries = {name: version for name, (token, version) in self._entries.items()}
+        for name in base.pop("missing"):
+            del entries[name]
+        entries.update((name, tuple(version)) for name, version in base.pop("changed").items())
+        return {**base, "entries": entries}
+
+    def _compress(self, base):
+        current = self.versions()
+        entries = base["entries"]
+        compressed = {key: value for key, value in base.items() if key != "entries"}
+        compressed["changed"] = {name: version for name, version in entries.items() if current.get(name) != version}
+        compressed["missing"] = [name for name in current if name not in entries]
+        return compressed
+
+    def save(self):
+        state = {"replica": self.replica, "location": self.location, "entries": self._entries,
+                 "categories": self.categories(),
+                 "bases": {peer: self._compress(base) for peer, base in self.bases.items()}}
+        data = zlib.compress(json.dumps(state, ensure_ascii=False).encode("utf-8"), 1)
+        atomic_write(self.path, self.vault.crypto.cipher.encrypt(data))
+
+    def categories(self):
+        return [category for category in self.vault.categories.keys()
+                if category not in (ALL_CATEGORY, UNGROUPED_CATEGORY)]
+
+    @timed("sync.refresh")
+    def refresh(self, batch_size=4096):
+        # 返回当前的 {名称: 版本}；只解密密文变化了的条目
+        entries, categories = self.vault.entries, self.vault.categories
+        accounts = dict(entries.iter_accounts())
+        names = list(accounts)
+        now = time.time()
+        state, changed = {}, []
+        for start in range(0, len(names), batch_size):
+            for name, secret in entries.secrets(names[start:start + batch_size]):
+                token = _token_id(secret)
+                old = self._entries.get(name)
+                if old is None or old[0] != token:
+                    changed.append((name, token, secret))
+                    continue
+                version = old[1]
+                category = categories.category_of(name)
+                if version[ACCOUNT] != accounts[name] or version[CATEGORY] != category:
+                    # 删除分组时条目移入 "未分组" 不经过 put，没有新的写入时间，用发现变化的时间
+                    mtime = entries.mtime(name)
+                    if mtime is None or mtime <= version[MTIME]:
+                        mtime = now
+                    version = (accounts[name], category, version[DIGEST], mtime)
+                state[name] = [token, version]
+        digests = self.vault.crypto.decrypt_map(partial(_password_digest, self.key),
+                                                (secret for name, token, secret in changed))
+        for (name, token, secret), digest in zip(changed, digests):
+            version = (accounts[name], categories.category_of(name), digest)
+            old = self._entries.get(name)
+            mtime = entries.mtime(name)
+            if mtime is None:
+                # 旧数据没有写入时间：只是重新加密（例如更换了数据密钥）时保留原来的修改时间
+                mtime = old[1][MTIME] if old is not None and old[1][:MTIME] == version else now
+            state[name] = [token, version + (mtime,)]
+        self._entries = state
+        TRACER.count("sync entries rehashed", len(changed))
+        return self.versions()
+
+    def versions(self):
+        return {name: version for name, (token, version) in self._entries.items()}
+
+    def base(self, peer):
+        base = self.bases.get(peer)
+        if base is None:
+            return {}, []
+        return dict(base["entries"]), base["categories"]
+
+    def find_base(self, root, peer):
+        # 按 Merkle 根查找同步包所基于的状态；发给未知对端的基准找到后改记在对端名下
+        for key, base in list(self.bases.items()):
+            if base["root"] == root and (key == peer or key.startswith("export:")):
+                if key != peer:
+                    del self.bases[key]
+                    self.bases[peer] = base
+                return self.base(peer)
+        return None
+
+    def set_base(self, peer, versions, categories, root=None):
+        self.bases[peer] = {"entries": versions, "categories": list(categories),
+                            "root": root or MerkleTree(versions).root, "time": time.time()}
+        exports = sorted((base["time"], key) for key, base in self.bases.items() if key.startswith("export:"))
+        for _, key in exports[:-MAX_EXPORTS]:
+            del self.bases[key]
+
+    def apply(self, merged, categories, fetch):
+        """
+        把合并结果中与本保险库当前不同的条目写入，条目和删除各作为一次提交；
+        fetch(来源, 名称列表) 返回来源一方的 {名称: 密文}。返回写入和删除的条目数。
+        """
+        storage = self.vault.storage
+        puts, deletes = [], []
+        for name, item in merged.items():
+            current = self._entries.get(name)
+            if item is None:
+                if current is not None:
+                    deletes.append(name)
+                continue
+            version, (side, source) = item
+            if current is not None and same(current[1], version):
+                current[1] = version  # 内容相同，统一修改时间
+                continue
+            puts.append((name, version, side, source))
+        secrets = {side: fetch(side, [source for name, version, s, source in puts if s == side])
+                   for side in {side for name, version, side, source in puts}}
+        existing = set(self.vault.categories.keys())
+        for category in categories:
+            if category not in existing:
+                storage.add_category(category)
+        storage.put_many([(name, version[ACCOUNT], secrets[side][source], version[CATEGORY], version[MTIME])
+                          for name, version, side, source in puts])
+        storage.delete_many(deletes)
+        for name, version, side, source in puts:
+            self._entries[name] = [_token_id(secrets[side][source]), version]
+        for name in deletes:
+            del self._entries[name]
+        used = {version[CATEGORY] for token, version in self._entries.values()}
+        for category in self.categories():
+            if category not in categories and category not in used:
+                storage.delete_category(category)
+        return len(puts) + len(deletes)
+
+
+def _report(examined, compared, conflicts, written, root):
+    return {"examined_nodes": examined, "compared": compared, "written": written, "conflicts": conflicts,
+            "root": root}
+
+
+@timed("sync.vaults")
+def sync_vaults(vault, other, prefer="newer"):
+    # 直接同步两个已解锁的保险库（例如两个本地目录），双方写入同样的合并结果
+    ours, theirs = VaultSync(vault), VaultSync(other)
+    if ours.fingerprint != theirs.fingerprint:
+        raise SyncError("两个保险库的数据密钥不同，只能同步同一个保险库的副本")
+    if ours.replica == theirs.replica:
+        raise SyncError("不能与自身同步")
+    ours_versions, theirs_versions = ours.refresh(), theirs.refresh()
+    # 通常双方记录的基准相同；只有一方有时（一方是另一方复制来的）用这一方的
+    ours_base, theirs_base = ours.bases.get(theirs.replica), theirs.bases.get(ours.replica)
+    if ours_base is None:
+        base, base_categories = theirs.base(ours.replica)
+    elif theirs_base is None or theirs_base["root"] == ours_base["root"]:
+        base, base_categories = ours.base(theirs.replica)
+    else:
+        base, base_categories = {}, []  # 双方记录的基准不一致（例如一方的 sync.dat 被删除），按首次同步处理
+    names, examined = differing_names(ours_versions, theirs_versions)
+    merged, conflicts = merge_entries(base, ours_versions, theirs_versions, names, prefer)
+    categories = merge_categories(base_categories, ours.categories(), theirs.categories())
+    # 先取出双方需要的密文：本方写入后，对方要复制的本方原来的密文就不在了
+    sources = {OURS: vault.entries, THEIRS: other.entries}
+    needed = {OURS: [], THEIRS: []}
+    for item in merged.values():
+        if item is not None:
+            side, source = item[1]
+            needed[side].append(source)
+    secrets = {side: dict(sources[side].secrets(names)) for side, names in needed.items()}
+
+    def fetch(side, names):
+        return {name: secrets[side][name] for name in names}
+
+    written = {OURS: ours.apply(merged, categories, fetch), THEIRS: theirs.apply(merged, categories, fetch)}
+    final = ours.versions()
+    root = MerkleTree(final).root
+    ours.set_base(theirs.replica, final, categories, root)
+    theirs.set_base(ours.replica, final, categories, root)
+    ours.save()
+    theirs.save()
+    return _report(examined, len(names), conflicts, written, root)
+
+
+@timed("sync.export")
+def export_bundle(vault, path, peer=None, full=False):
+    """
+    导出同步包：相对于与 peer 上次同步的基准变化了的条目（full 时为全部条目）。
+    peer 省略时取唯一一个同步过的对端，没有时导出全部条目。
+    文件为 gzip 压缩的 JSON 行：第一行是不含条目内容的头部，之后每行是一个用数据密钥加密的条目记录。
+    """
+    state = VaultSync(vault)
+    versions = state.refresh()
+    categories = state.categories()
+    peers = [key for key in state.bases if not key.startswith("export:")]
+    if peer is None and len(peers) == 1 and not full:
+        peer = peers[0]
+    base = None if full or peer is None else state.bases.get(peer)
+    tree = MerkleTree(versions)
+    if base is None:
+        changed, deleted, examined = list(versions), [], 0
+    else:
+        base_versions = state.base(peer)[0]
+        names, examined = differing_names(versions, base_versions)
+        changed = sorted(name for name in names if name in versions)
+        deleted = sorted(name for name in names if name not in versions)
+    secrets = dict(vault.entries.secrets(changed))
+    records = [json.dumps({"name": name, "version": versions[name], "secret": secrets[name]}, ensure_ascii=False)
+               for name in changed]
+    records += [json.dumps({"name": name, "deleted": True}, ensure_ascii=False) for name in deleted]
+    header = {"format": BUNDLE_FORMAT, "version": BUNDLE_VERSION, "replica": state.replica, "to": peer,
+              "key": state.fingerprint, "base": None if base is None else base["root"], "root": tree.root,
+              "categories": vault.crypto.cipher.encrypt(json.dumps(categories).encode()).decode(),
+              "records": len(records), "created": time.time()}
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write(json.dumps(header) + "\n")
+        for token in vault.crypto.encrypt_many(records):
+            f.write(token + "\n")
+    state.set_base(peer or f"export:{tree.root}", versions, categories, tree.root)
+    state.save()
+    return {"path": path, "changed": len(changed), "deleted": len(deleted), "full": base is None,
+            "examined_nodes": examined, "root": tree.root}
+
+
+def read_bundle(vault, path, fingerprint):
+    # 返回 (头部, [记录])；记录解密后为 {"name", "version", "secret"} 或 {"name", "deleted": True}
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            header = json.loads(f.readline())
+        except (ValueError, OSError):
+            raise SyncError(f"不是同步包：{path}")
+        if not isinstance(header, dict) or header.get("format") != BUNDLE_FORMAT:
+            raise SyncError(f"不是同步包：{path}")
+        if header["version"] > BUNDLE_VERSION:
+            raise SyncError("同步包由更新的版本导出")
+        if header["key"] != fingerprint:
+            raise SyncError("同步包来自数据密钥不同的保险库，只能同步同一个保险库的副本")
+        tokens = [line.rstrip("\n") for line in f if line.strip()]
+    if len(tokens) != header["records"]:
+        raise SyncError("同步包不完整")
+    records = [json.loads(data) for data in vault.crypto.decrypt_many(tokens)]
+    header["categories"] = json.loads(vault.crypto.cipher.decrypt(header["categories"].encode()))
+    return header, records
+
+
+@timed("sync.import")
+def import_bundle(vault, path, prefer="newer"):
+    # 导入同步包并与本保险库三方合并；之后以对方导出时的状态作为与它同步的基准
+    state = VaultSync(vault)
+    header, records = read_bundle(vault, path, state.fingerprint)
+    peer = header["replica"]
+    if peer == state.replica:
+        raise SyncError("这是本副本导出的同步包")
+    if header["to"] not in (None, state.replica):
+        raise SyncError("同步包是发给另一个副本的")
+    if header["base"] is None:
+        base, base_categories = state.base(peer)
+        theirs = {}
+    else:
+        found = state.find_base(header["base"], peer)
+        if found is None and state.bases.get(peer, {}).get("root") == header["root"]:
+            return _report(0, 0, [], 0, MerkleTree(state.refresh()).root)  # 已经导入过
+        if found is None:
+            raise SyncError("找不到同步包所基于的同步状态，请让对方导出完整的同步包（--full）")
+        base, base_categories = found
+        theirs = dict(base)
+    bundle_secrets = {}
+    for record in records:
+        if record.get("deleted"):
+            theirs.pop(record["name"], None)
+        else:
+            theirs[record["name"]] = tuple(record["version"])
+            bundle_secrets[record["name"]] = record["secret"]
+    if MerkleTree(theirs).root != header["root"]:
+        raise SyncError("同步包与其所基于的状态合起来和对方的摘要不一致")
+    ours = state.refresh()
+    names, examined = differing_names(ours, theirs)
+    merged, conflicts = merge_entries(base, ours, theirs, names, prefer)
+    categories = merge_categories(base_categories, state.categories(), header["categories"])
+
+    def fetch(side, names):
+        if side == OURS:
+            return dict(vault.entries.secrets(names))
+        return {name: bundle_secrets[name] for name in names}
+
+    written = state.apply(merged, categories, fetch)
+    state.set_base(peer, theirs, header["categories"], header["root"])
+    state.save()
+    return _report(examined, len(names), conflicts, written, MerkleTree(state.versions()).root)
+
+
+def status(vault):
+    # 本副本的编号、Merkle 根和同步过的对端
+    state = VaultSync(vault)
+    versions = state.refresh()
+    state.save()
+    return {"replica": state.replica, "entries": len(versions), "root": MerkleTree(versions).root,
+            "peers": {peer: {"root": base["root"], "time": base["time"]} for peer, base in state.bases.items()}}